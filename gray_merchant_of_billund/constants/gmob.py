@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 from gray_merchant_of_billund.utils.path import posix_path
@@ -13,9 +14,52 @@ REBRICKABLE_SETS_CSV_FILE = posix_path(RESOURCES_DIR, "sets.csv.gz")
 PERSONAL_COLLECTION_FILE = posix_path(RESOURCES_DIR, "personal_collection.txt")
 BOOTSTRAP_FILE = posix_path(RESOURCES_DIR, "bootstrap.txt")
 
-CACHE_DIR = posix_path(APPLICATION_DIR, "cache")
+CACHE_DIR = os.environ.get(
+    "GMOB_CACHE_DIR", posix_path(APPLICATION_DIR, "cache")
+)
 IMMUTABLE_STORAGE_DIR = posix_path(CACHE_DIR, "immutable")
-MUTABLE_STORAGE_DIR = posix_path(CACHE_DIR, "mutable")
+# the hot tier: latest snapshots, manifests, the blobs that snapshots of both
+# tiers share, and the tables derived from them (e.g. on an SSD). Not tmpfs:
+# nothing here can be lost, cold snapshots are unreadable without the blobs
+MUTABLE_STORAGE_DIR = os.environ.get(
+    "GMOB_HOT_STORAGE_DIR", posix_path(CACHE_DIR, "mutable")
+)
+# the cold tier: older snapshots, compressed (e.g. on a larger disk)
+COLD_STORAGE_DIR = os.environ.get(
+    "GMOB_COLD_STORAGE_DIR", posix_path(CACHE_DIR, "cold")
+)
+LOCK_DIR = posix_path(MUTABLE_STORAGE_DIR, "locks")
+EXPIRABLE_SQLITE_FILE = posix_path(MUTABLE_STORAGE_DIR, "expirable.sqlite3")
+# one of: "pickle" (a file per snapshot), "sharded" (a file per snapshot,
+# in hash-sharded and monthly directories), "sqlite" (a single file),
+# "tiered" (the latest snapshots as "pickle", older ones as "sharded" in
+# COLD_STORAGE_DIR)
+EXPIRABLE_STORAGE_BACKEND = "pickle"
+HOT_TIER_SNAPSHOTS = 2  # per store key
+COLD_TIER_COMPRESSION = "zstd"
+EXPIRABLE_CACHE_MAX_ITEMS = 4096
+EXPIRABLE_CACHE_MAX_SIZE = 256 * 2**20  # B, of serialized snapshots
+# one of: None, "zlib", "zstd" (needs zstandard, falls back to zlib)
+SNAPSHOT_COMPRESSION = None
+SNAPSHOT_COMPRESSION_LEVEL = 3
+COMPRESSION_DICTIONARY_DIR = posix_path(CACHE_DIR, "dictionaries")
+# one of: "record" (compact, versioned, for model objects), "pickle"
+SNAPSHOT_FORMAT = "record"
+# store identical price guide months once, shared by all snapshots
+SNAPSHOT_DEDUPLICATION = True
+BLOB_STORAGE_DIR = posix_path(MUTABLE_STORAGE_DIR, "blobs")
+BLOB_CACHE_MAX_ITEMS = 65536
+BLOB_CACHE_MAX_SIZE = 64 * 2**20  # B
+# unreferenced blobs stored (or stored again) more recently are not swept:
+# the snapshot referencing them may be still being written
+BLOB_SWEEP_GRACE_PERIOD = 60 * 60  # s
+PRICE_HISTORY_FILE = posix_path(MUTABLE_STORAGE_DIR, "price_history.npz")
+# rows appended by saves since the table was written, merged into it past
+PRICE_HISTORY_LOG_MAX_SIZE = 4 * 2**20  # B
+# raw scraped pages, the latest one per URL, to parse them again offline
+RESPONSE_CACHE_FILE = posix_path(COLD_STORAGE_DIR, "responses.sqlite3")
+RESPONSE_CACHE_COMPRESSION = "zstd"
+RESPONSE_CACHE_COMPRESSION_LEVEL = 9
 
 PLOT_DIR = posix_path(APPLICATION_DIR, "plots")
 
@@ -34,6 +78,29 @@ BRICKLINK_BOX_HISTORY_COMPLETE_URL = (
 )
 BRICKLINK_LOGIN_ENDPOINT = BRICKLINK_URL + "ajax/renovate/loginandout.ajax"
 BRICKLINK_SLEEP_TIMEOUT = 4 * 60  # s
+BRICKLINK_RATE = 6 / 60  # requests/s
+BRICKLINK_BURST = 3  # requests
+# the slowest it gets after repeated soft-bans
+BRICKLINK_MIN_RATE = 1 / BRICKLINK_SLEEP_TIMEOUT  # requests/s
+# attempts of a set while hard-banned (Access Forbidden), each one slower
+BRICKLINK_FORBIDDEN_MAX_ATTEMPTS = 3
+
+# threads loading stored items, while others scrape the missing ones
+INDEXER_LOAD_WORKERS = 16
+# at exit, how long a stale-while-revalidate refresh still running may take
+# to be saved: the queued ones are given up
+INDEXER_REFRESH_EXIT_TIMEOUT = 30  # s
+
+# background refresher (tasks/refresh_expiring.py), per website
+REFRESHER_REQUESTS_PER_HOUR = 45
+REFRESHER_IDLE_TIMEOUT = 10 * 60  # s
+REFRESHER_RETRY_TIMEOUT = 60 * 60  # s
+
+# catalogue crawls (tasks/crawl_catalogue.py)
+CRAWL_QUEUE_FILE = posix_path(CACHE_DIR, "crawl.sqlite3")
+CRAWL_MAX_ATTEMPTS = 5
+CRAWL_RETRY_TIMEOUT = 5 * 60  # s, doubled at every failed attempt
+CRAWL_REPORT_EVERY = 25  # items
 
 BRICKSET_URL = "https://brickset.com/"
 BRICKSET_SET_URL = BRICKSET_URL + "sets/{num}/"
@@ -48,6 +115,23 @@ BRICKSET_FIELDS = [
 
 LEGO_SET_SHOP_URL = "https://www.lego.com/product/{shortnum}"
 
+# HTTP connections kept alive by the session shared by all scrapers
+HTTP_POOL_MAXSIZE = 4  # per host
+HTTP_POOL_SIZES = {BRICKLINK_URL: 2, BRICKSET_URL: 8}  # per host prefix
+# token buckets per host prefix: (rate, burst, min_rate), see above
+HTTP_RATE_LIMITS = {
+    BRICKLINK_URL: (BRICKLINK_RATE, BRICKLINK_BURST, BRICKLINK_MIN_RATE)
+}
+# of the full rate, regained by a rate limited host at every success
+HTTP_RATE_RECOVERY = 0.05
+# quick retries of failed connections, before execute_http_request's ones
+HTTP_CONNECT_RETRIES = 2
+# requests of a URL within this window share a single fetch, and parse
+HTTP_COALESCING_WINDOW = 60  # s, 0 to share concurrent requests only
+# asyncio fetches: as many requests at a time per host as HTTP_POOL_SIZES
+ASYNC_FETCH_MAX_ATTEMPTS = 5
+ASYNC_BACKOFF_MAX = 60  # s, pause after repeated 429 or 5xx responses
+
 DEFAULT_DATE_FORMAT = "%d-%m-%Y, %H:%M:%S"
 
 TOR_CONTROLLER_PORT = 9051
@@ -1,27 +1,44 @@
-import time
-from typing import List, Optional
+from functools import partial
+from typing import Dict, List, Optional
 
-import requests
 from pyquery import PyQuery  # type: ignore
 
 from gray_merchant_of_billund.constants.gmob import (
+    BRICKLINK_FORBIDDEN_MAX_ATTEMPTS,
     BRICKLINK_SET_SHOP_URL,
-    BRICKLINK_SLEEP_TIMEOUT,
 )
-from gray_merchant_of_billund.indexer.bricklink_prices import get_price_guide
+from gray_merchant_of_billund.indexer.bricklink_prices import (
+    get_price_guide,
+    is_bricklink_page,
+    parse_price_guide,
+)
 from gray_merchant_of_billund.model.bricklink_price import PriceGuide
 from gray_merchant_of_billund.model.bricklink_set import (
     BricklinkIndex,
     BricklinkSet,
 )
-from gray_merchant_of_billund.model.exception import BricklinkQuotaError
+from gray_merchant_of_billund.model.exception import (
+    BricklinkForbiddenError,
+    BricklinkQuotaError,
+)
 from gray_merchant_of_billund.model.rebrickable_set import (
     RebrickableIndex,
     RebrickableSet,
 )
-from gray_merchant_of_billund.storage.expirable import load
+from gray_merchant_of_billund.storage.expirable import load, load_or_build
+from gray_merchant_of_billund.storage.manifest import (
+    ExpiryStatus,
+    expiry_statuses,
+)
+from gray_merchant_of_billund.storage.response_cache import (
+    RawResponse,
+    response_cache,
+)
 from gray_merchant_of_billund.utils.log import get_logger
-from gray_merchant_of_billund.utils.utils_request import execute_http_request
+from gray_merchant_of_billund.utils.utils_request import (
+    execute_coalesced_http_request,
+    get_shared_session,
+)
 
 log = get_logger()
 
@@ -30,19 +47,49 @@ def get_bricklink_index(
     index: RebrickableIndex, time_to_live_ms: Optional[int] = None
 ) -> BricklinkIndex:
     sets: List[BricklinkSet] = []
+    statuses: Dict[str, ExpiryStatus] = expiry_statuses(
+        BricklinkSet,
+        (lego_set.store_key for lego_set in index),
+        time_to_live_ms,
+    )
     for lego_set in index:
-        bricklink_set: Optional[BricklinkSet] = load(
-            BricklinkSet, lego_set.store_key, time_to_live_ms
-        )
+        bricklink_set: Optional[BricklinkSet] = None
+        if statuses[lego_set.store_key] is ExpiryStatus.HIT:
+            bricklink_set = load(
+                BricklinkSet, lego_set.store_key, time_to_live_ms
+            )
         if not bricklink_set:
-            bricklink_set = _get_bricklink_set(lego_set)
-            bricklink_set.save()
-            time.sleep(BRICKLINK_SLEEP_TIMEOUT)
+            # another process may be fetching it already: wait for it
+            bricklink_set, _ = load_or_build(
+                BricklinkSet,
+                lego_set.store_key,
+                time_to_live_ms,
+                partial(_get_bricklink_set, lego_set),
+            )
         sets.append(bricklink_set)
     return BricklinkIndex(sets)
 
 
 def _get_bricklink_set(lego_set: RebrickableSet) -> BricklinkSet:
+    # Requests are rate limited, slower and slower while banned. Soft-bans
+    # wear off, hard-bans may not: past BRICKLINK_FORBIDDEN_MAX_ATTEMPTS,
+    # BricklinkForbiddenError is raised.
+    forbidden: int = 0
+    while True:
+        try:
+            return _fetch_bricklink_set(lego_set)
+        except BricklinkQuotaError:
+            log.warning("Soft-banned. Retrying...")
+        except BricklinkForbiddenError:
+            forbidden += 1
+            if forbidden >= BRICKLINK_FORBIDDEN_MAX_ATTEMPTS:
+                raise
+            log.warning("Access forbidden. Retrying...")
+
+
+def _fetch_bricklink_set(lego_set: RebrickableSet) -> BricklinkSet:
+    # raises BricklinkQuotaError when soft-banned, BricklinkForbiddenError
+    # when hard-banned
     lego_set_url: str = BRICKLINK_SET_SHOP_URL.format(num=lego_set.num)
     log.info(f"Getting info from {lego_set_url}...")
     headers = {
@@ -51,11 +98,53 @@ def _get_bricklink_set(lego_set: RebrickableSet) -> BricklinkSet:
         "Chrome/24.0.1312.27 "
         "Safari/537.17"
     }
-    response = execute_http_request(
-        requests.get,  # session.get
+    response: RawResponse = execute_coalesced_http_request(
+        get_shared_session().get,
         lego_set_url,
         headers=headers,
+        cache_if=is_bricklink_page,
+    )
+    price_guide: PriceGuide = get_price_guide(
+        lego_set.link_bricklink_set_history
+    )
+    price_guide_box: PriceGuide = get_price_guide(
+        lego_set.link_bricklink_box_history
     )
+    return _parse_bricklink_set(
+        lego_set, response, price_guide, price_guide_box
+    )
+
+
+def reparse_bricklink_set(lego_set: RebrickableSet) -> Optional[BricklinkSet]:
+    # from the response cache, as of when the shop page was fetched
+    shop_url: str = BRICKLINK_SET_SHOP_URL.format(num=lego_set.num)
+    history_urls: List[str] = [
+        lego_set.link_bricklink_set_history,
+        lego_set.link_bricklink_box_history,
+    ]
+    # a page linked twice is parsed once
+    responses: Dict[str, Optional[RawResponse]] = {
+        url: response_cache.get(url) for url in [shop_url, *history_urls]
+    }
+    if any(response is None for response in responses.values()):
+        return None
+    price_guides: Dict[str, PriceGuide] = {
+        url: parse_price_guide(PyQuery(responses[url].content))  # type: ignore
+        for url in set(history_urls)
+    }
+    return _parse_bricklink_set(
+        lego_set,
+        responses[shop_url],  # type: ignore
+        *(price_guides[url] for url in history_urls),
+    )
+
+
+def _parse_bricklink_set(
+    lego_set: RebrickableSet,
+    response: RawResponse,
+    price_guide: PriceGuide,
+    price_guide_box: PriceGuide,
+) -> BricklinkSet:
     pq = PyQuery(response.content)
 
     my_inventory = pq("#_idAddToMyInvLink").parent()
@@ -73,20 +162,14 @@ def _get_bricklink_set(lego_set: RebrickableSet) -> BricklinkSet:
         on_wanted = int(on_wanted.split(" ")[1])
     except ValueError:  # TODO
         on_wanted = 0
-    try:
-        price_guide: PriceGuide = get_price_guide(
-            lego_set.link_bricklink_set_history
-        )
-        price_guide_box: PriceGuide = get_price_guide(
-            lego_set.link_bricklink_box_history
-        )
-    except BricklinkQuotaError:
-        # handle soft-ban
-        log.warning("Soft-banned. Sleeping...")
-        time.sleep(BRICKLINK_SLEEP_TIMEOUT)
-        return _get_bricklink_set(lego_set)
+    # the snapshot of the shop page: reparsing it rewrites the same snapshot
     return BricklinkSet(
-        lego_set, for_sale, on_wanted, price_guide, price_guide_box
+        lego_set,
+        for_sale,
+        on_wanted,
+        price_guide,
+        price_guide_box,
+        response.fetched_ms,
     )
 
 
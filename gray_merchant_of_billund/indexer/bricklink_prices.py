@@ -1,9 +1,10 @@
 import time
+from functools import partial
 from typing import List, Optional, Sequence
 
-import requests
 from pyquery import PyQuery  # type: ignore
 
+from gray_merchant_of_billund.constants.gmob import HTTP_COALESCING_WINDOW
 from gray_merchant_of_billund.model.bricklink_price import (
     BricklinkAggregatePrices,
     BricklinkAggregateSelling,
@@ -13,14 +14,34 @@ from gray_merchant_of_billund.model.bricklink_price import (
     BricklinkMarketEntry,
     PriceGuide,
 )
-from gray_merchant_of_billund.model.exception import BricklinkQuotaError
+from gray_merchant_of_billund.model.exception import (
+    BricklinkForbiddenError,
+    BricklinkQuotaError,
+)
+from gray_merchant_of_billund.storage.response_cache import RawResponse
 from gray_merchant_of_billund.utils.log import get_logger
-from gray_merchant_of_billund.utils.utils_request import execute_http_request
+from gray_merchant_of_billund.utils.single_flight import SingleFlight
+from gray_merchant_of_billund.utils.utils_request import (
+    execute_http_request,
+    get_shared_session,
+    penalize_host,
+)
 
 log = get_logger()
 
 
+price_guides = SingleFlight(HTTP_COALESCING_WINDOW)
+
+
 def get_price_guide(lego_set_url) -> PriceGuide:
+    # e.g. the set and box price guides of a set are the same page: it's
+    # fetched and parsed once
+    return price_guides.do(
+        lego_set_url, partial(_get_price_guide, lego_set_url)
+    )
+
+
+def _get_price_guide(lego_set_url) -> PriceGuide:
     log.debug(f"Processing history at {lego_set_url}...")
     headers = {
         "User-Agent": "Mozilla/5.0 (X11; Linux i686) "
@@ -28,22 +49,36 @@ def get_price_guide(lego_set_url) -> PriceGuide:
         "Chrome/24.0.1312.27 "
         "Safari/537.17"
     }
-    response = execute_http_request(
-        requests.get,  # session.get
+    response: RawResponse = execute_http_request(
+        get_shared_session().get,
         lego_set_url,
         headers=headers,
+        cache_if=is_bricklink_page,
     )
     pq = PyQuery(response.content)
 
     if "Quota Exceeded" in pq.text():
         # handle soft-ban
+        penalize_host(lego_set_url)
         raise BricklinkQuotaError()
 
     if "Access Forbidden" in pq.text():
         # this seems a hard-ban
         log.error("Access Forbidden. You may want to change your IP...")
-        raise BricklinkQuotaError()
+        penalize_host(lego_set_url)
+        raise BricklinkForbiddenError()
+
+    return parse_price_guide(pq)
+
+
+def is_bricklink_page(content: bytes) -> bool:
+    # soft-ban and hard-ban pages are not worth caching
+    return b"Quota Exceeded" not in content and (
+        b"Access Forbidden" not in content
+    )
+
 
+def parse_price_guide(pq: PyQuery) -> PriceGuide:
     aggregate_prices_fields = [
         "Total Qty:",
         "Min Price:",
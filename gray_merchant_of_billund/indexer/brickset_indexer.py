@@ -1,11 +1,14 @@
-from typing import Dict, List, Optional
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Union
 
-import requests
 from pyquery import PyQuery  # type: ignore
 
 from gray_merchant_of_billund.constants.gmob import (
     BRICKSET_FIELDS,
     BRICKSET_SET_URL,
+    BRICKSET_URL,
+    HTTP_POOL_SIZES,
 )
 from gray_merchant_of_billund.model.brickset_set import (
     BricksetIndex,
@@ -15,64 +18,169 @@ from gray_merchant_of_billund.model.rebrickable_set import (
     RebrickableIndex,
     RebrickableSet,
 )
-from gray_merchant_of_billund.storage.expirable import load
+from gray_merchant_of_billund.storage.expirable import load, load_or_build
+from gray_merchant_of_billund.storage.manifest import (
+    ExpiryStatus,
+    expiry_statuses,
+)
+from gray_merchant_of_billund.storage.response_cache import (
+    RawResponse,
+    response_cache,
+)
 from gray_merchant_of_billund.utils.log import get_logger
-from gray_merchant_of_billund.utils.utils_request import execute_http_request
+from gray_merchant_of_billund.utils.utils_async_request import AsyncFetcher
+from gray_merchant_of_billund.utils.utils_request import (
+    execute_coalesced_http_request,
+    get_shared_session,
+)
 
 log = get_logger()
 
+BRICKSET_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux i686) AppleWebKit/537.17 (KHTML, like Gecko) Chrome/24.0.1312.27 Safari/537.17"
+}
+
+BricksetResult = Union[BricksetSet, BaseException]
+
 
 def get_brickset_index(
     index: RebrickableIndex, time_to_live_ms: Optional[int] = None
 ) -> BricksetIndex:
-    sets: List[BricksetSet] = []
+    sets: Dict[str, BricksetSet] = {}
+    statuses: Dict[str, ExpiryStatus] = expiry_statuses(
+        BricksetSet,
+        (lego_set.store_key for lego_set in index),
+        time_to_live_ms,
+    )
+    to_fetch: List[RebrickableSet] = []
     for lego_set in index:
-        brickset_set: Optional[BricksetSet] = load(
-            BricksetSet, lego_set.store_key, time_to_live_ms
+        brickset_set: Optional[BricksetSet] = None
+        if statuses[lego_set.store_key] is ExpiryStatus.HIT:
+            brickset_set = load(
+                BricksetSet, lego_set.store_key, time_to_live_ms
+            )
+        if brickset_set:
+            sets[lego_set.store_key] = brickset_set
+        else:
+            to_fetch.append(lego_set)
+    if to_fetch:
+        for brickset_set in get_brickset_sets(to_fetch, time_to_live_ms):
+            sets[brickset_set.store_key] = brickset_set
+    return BricksetIndex([sets[lego_set.store_key] for lego_set in index])
+
+
+def get_brickset_sets(
+    lego_sets: Sequence[RebrickableSet],
+    time_to_live_ms: Optional[int] = None,
+    save: bool = True,
+    on_set: Optional[Callable[[RebrickableSet, BricksetResult], None]] = None,
+) -> List[BricksetSet]:
+    # Fetches lego_sets concurrently, in order, saving each one as soon as
+    # it's parsed: a set in lego_sets twice is fetched once, and one that
+    # another process is fetching is waited for. on_set gets every set (or
+    # its error) as soon as it's done, from the event loop thread. On
+    # errors, raises the first one once the others are done.
+    log.info(f"Fetching {len(lego_sets)} sets from Brickset...")
+    results: List[BricksetResult] = asyncio.run(
+        _fetch_brickset_sets(lego_sets, time_to_live_ms, save, on_set)
+    )
+    errors: List[BaseException] = [
+        result for result in results if isinstance(result, BaseException)
+    ]
+    if errors:
+        log.error(f"Unable to fetch {len(errors)} sets from Brickset.")
+        raise errors[0]
+    return results  # type: ignore
+
+
+async def _fetch_brickset_sets(
+    lego_sets: Sequence[RebrickableSet],
+    time_to_live_ms: Optional[int],
+    save: bool,
+    on_set: Optional[Callable[[RebrickableSet, BricksetResult], None]],
+) -> List[BricksetResult]:
+    loop = asyncio.get_running_loop()
+
+    async def fetch(
+        fetcher: AsyncFetcher, lego_set: RebrickableSet
+    ) -> BricksetSet:
+        try:
+            brickset_set: BricksetSet = await build(fetcher, lego_set)
+        except Exception as exc:
+            if on_set is not None:
+                on_set(lego_set, exc)
+            raise
+        if on_set is not None:
+            on_set(lego_set, brickset_set)
+        return brickset_set
+
+    async def build(
+        fetcher: AsyncFetcher, lego_set: RebrickableSet
+    ) -> BricksetSet:
+        if not save:
+            return await fetch_and_parse(fetcher, lego_set)
+
+        def locked_build() -> BricksetSet:
+            # in the key lock, on a builder thread: fetched on the loop
+            return asyncio.run_coroutine_threadsafe(
+                fetch_and_parse(fetcher, lego_set), loop
+            ).result()
+
+        # single flight: one another process is fetching is waited for
+        brickset_set, _ = await loop.run_in_executor(
+            builder,
+            load_or_build,
+            BricksetSet,
+            lego_set.store_key,
+            time_to_live_ms,
+            locked_build,
         )
-        if not brickset_set:
-            brickset_set = _get_brickset_set(lego_set)
-            brickset_set.save()
-        sets.append(brickset_set)
-    return BricksetIndex(sets)
+        return brickset_set
+
+    async def fetch_and_parse(
+        fetcher: AsyncFetcher, lego_set: RebrickableSet
+    ) -> BricksetSet:
+        response: RawResponse = await fetcher.get(
+            BRICKSET_SET_URL.format(num=lego_set.num),
+            BRICKSET_HEADERS,
+            cache_if=_is_brickset_set_page,
+        )
+        # parsing would block the event loop
+        return await loop.run_in_executor(
+            None, _parse_brickset_set, lego_set, response
+        )
+
+    unique_sets: Dict[str, RebrickableSet] = {
+        lego_set.store_key: lego_set for lego_set in lego_sets
+    }
+    # the threads waiting for the key locks, apart from the default
+    # executor parsing for them
+    with ThreadPoolExecutor(
+        HTTP_POOL_SIZES[BRICKSET_URL], thread_name_prefix="brickset-build"
+    ) as builder:
+        async with AsyncFetcher() as fetcher:
+            results: List[BricksetResult] = await asyncio.gather(
+                *(
+                    fetch(fetcher, lego_set)
+                    for lego_set in unique_sets.values()
+                ),
+                return_exceptions=True,
+            )
+    by_key: Dict[str, BricksetResult] = dict(zip(unique_sets, results))
+    return [by_key[lego_set.store_key] for lego_set in lego_sets]
 
 
 def _get_brickset_set(lego_set: RebrickableSet) -> BricksetSet:
     lego_set_url = BRICKSET_SET_URL.format(num=lego_set.num)
     log.debug(lego_set_url)
-    headers = {
-        "User-Agent": "Mozilla/5.0 (X11; Linux i686) AppleWebKit/537.17 (KHTML, like Gecko) Chrome/24.0.1312.27 Safari/537.17"
-    }
     try:
-        response = execute_http_request(
-            requests.get, lego_set_url, headers=headers
-        )
-        pq = PyQuery(response.content)
-        labels = [item.text for item in pq(".featurebox dl dt")]
-        raw_values = [item for item in pq(".featurebox dl dd")]
-        values = []
-        for value in raw_values:
-            if value.text is None:  # value is a link
-                links = pq(value)("a")
-                for link in links.items():
-                    values.append(link.text())
-                    break  # only get the first link
-            else:
-                values.append(value.text)
-        info: Dict[str, str] = {
-            label: value
-            for label, value in zip(labels, values)
-            if label in BRICKSET_FIELDS
-        }
-        return BricksetSet(
-            lego_set,
-            info.get("Theme", ""),
-            int(info.get("Minifigs", "0")) if "Minifigs" in info else 0,
-            info.get("Designer", ""),
-            info.get("RRP", ""),
-            info.get("Price per piece", ""),
-            info.get("Dimensions", ""),
+        response: RawResponse = execute_coalesced_http_request(
+            get_shared_session().get,
+            lego_set_url,
+            headers=BRICKSET_HEADERS,
+            cache_if=_is_brickset_set_page,
         )
+        return _parse_brickset_set(lego_set, response)
     except Exception as exc:
         log.exception(
             "Unable to fetch data.\nPlease check your Internet connection and the availability of the site."
@@ -81,3 +189,50 @@ def _get_brickset_set(lego_set: RebrickableSet) -> BricksetSet:
             f"Okay, merchant, we've had a problem here.\n{type(exc).__name__}: {str(exc)}"
         )
         raise exc
+
+
+def reparse_brickset_set(lego_set: RebrickableSet) -> Optional[BricksetSet]:
+    # from the response cache, as of when the page was fetched
+    response: Optional[RawResponse] = response_cache.get(
+        BRICKSET_SET_URL.format(num=lego_set.num)
+    )
+    if response is None:
+        return None
+    return _parse_brickset_set(lego_set, response)
+
+
+def _is_brickset_set_page(content: bytes) -> bool:
+    return b"featurebox" in content
+
+
+def _parse_brickset_set(
+    lego_set: RebrickableSet, response: RawResponse
+) -> BricksetSet:
+    pq = PyQuery(response.content)
+    labels = [item.text for item in pq(".featurebox dl dt")]
+    raw_values = [item for item in pq(".featurebox dl dd")]
+    values = []
+    for value in raw_values:
+        if value.text is None:  # value is a link
+            links = pq(value)("a")
+            for link in links.items():
+                values.append(link.text())
+                break  # only get the first link
+        else:
+            values.append(value.text)
+    info: Dict[str, str] = {
+        label: value
+        for label, value in zip(labels, values)
+        if label in BRICKSET_FIELDS
+    }
+    # the snapshot of the page: reparsing it rewrites the same snapshot
+    return BricksetSet(
+        lego_set,
+        info.get("Theme", ""),
+        int(info.get("Minifigs", "0")) if "Minifigs" in info else 0,
+        info.get("Designer", ""),
+        info.get("RRP", ""),
+        info.get("Price per piece", ""),
+        info.get("Dimensions", ""),
+        response.fetched_ms,
+    )
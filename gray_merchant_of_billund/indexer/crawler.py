@@ -0,0 +1,137 @@
+import time
+from functools import partial
+from typing import Callable, Dict, NamedTuple, Optional, Type
+
+from gray_merchant_of_billund.constants.gmob import CRAWL_REPORT_EVERY
+from gray_merchant_of_billund.indexer.bricklink_indexer import (
+    _fetch_bricklink_set,
+)
+from gray_merchant_of_billund.indexer.brickset_indexer import _get_brickset_set
+from gray_merchant_of_billund.model.bricklink_set import BricklinkSet
+from gray_merchant_of_billund.model.brickset_set import BricksetSet
+from gray_merchant_of_billund.model.exception import BricklinkQuotaError
+from gray_merchant_of_billund.model.rebrickable_set import (
+    RebrickableIndex,
+    RebrickableSet,
+)
+from gray_merchant_of_billund.storage.crawl_queue import (
+    CrawlQueue,
+    CrawlState,
+)
+from gray_merchant_of_billund.storage.expirable import (
+    Expirable,
+    load_or_build,
+)
+from gray_merchant_of_billund.storage.manifest import (
+    ExpiryStatus,
+    expiry_statuses,
+)
+from gray_merchant_of_billund.utils.log import get_logger
+from gray_merchant_of_billund.utils.time import HOUR, SECOND, now
+
+log = get_logger()
+
+
+class CrawlSource(NamedTuple):
+    expirable_cls: Type[Expirable]
+    fetch: Callable[[RebrickableSet], Expirable]
+
+
+CRAWL_SOURCES: Dict[str, CrawlSource] = {
+    # soft-bans raise, so that the crawler can postpone the set: hard-bans
+    # count as failed attempts
+    "bricklink": CrawlSource(BricklinkSet, _fetch_bricklink_set),
+    "brickset": CrawlSource(BricksetSet, _get_brickset_set),
+}
+
+
+def crawl(
+    source_name: str,
+    index: RebrickableIndex,
+    time_to_live_ms: Optional[int] = None,
+    queue: Optional[CrawlQueue] = None,
+    report_every: int = CRAWL_REPORT_EVERY,
+) -> Dict[CrawlState, int]:
+    # Fetches every set of index not stored yet (or expired), through a
+    # durable queue: an interrupted crawl resumes where it stopped, and
+    # with time_to_live_ms, sets crawled by previous crawls are crawled
+    # again once expired. Returns the final queue counts.
+    source: CrawlSource = CRAWL_SOURCES[source_name]
+    queue = queue or CrawlQueue(source_name)
+    added: int = queue.enqueue(lego_set.store_key for lego_set in index)
+    resumed: int = queue.resume()
+    expired: int = 0
+    if time_to_live_ms is not None:
+        statuses: Dict[str, ExpiryStatus] = expiry_statuses(
+            source.expirable_cls,
+            queue.store_keys(CrawlState.DONE),
+            time_to_live_ms,
+        )
+        expired = queue.requeue(
+            store_key
+            for store_key, status in statuses.items()
+            if status is not ExpiryStatus.HIT
+        )
+    log.info(
+        f"Crawling {source_name}: {added} sets added, {resumed} interrupted "
+        f"ones resumed, {expired} expired ones requeued, "
+        f"{_counts_str(queue.counts())}."
+    )
+    started_ms: int = now()
+    crawled: int = 0
+    while True:
+        store_key: Optional[str] = queue.claim()
+        if store_key is None:
+            next_attempt_ms: Optional[int] = queue.next_attempt_ms()
+            if next_attempt_ms is None:
+                break
+            time.sleep(max(next_attempt_ms - now(), 0) / SECOND)
+            continue
+        if store_key not in index:
+            queue.fail(store_key, "Not in the index.")
+            continue
+        try:
+            load_or_build(
+                source.expirable_cls,
+                store_key,
+                time_to_live_ms,
+                partial(source.fetch, index[store_key]),
+            )
+        except BricklinkQuotaError:
+            # the rate limiter slows down the next requests already
+            log.warning("Soft-banned. Retrying later...")
+            queue.postpone(store_key, 0)
+            continue
+        except Exception as exc:
+            state: CrawlState = queue.fail(
+                store_key, f"{type(exc).__name__}: {exc}"
+            )
+            log.exception(f"Unable to crawl {store_key} ({state.value}).")
+            continue
+        queue.complete(store_key)
+        crawled += 1
+        if crawled % report_every == 0:
+            _report(source_name, queue, crawled, started_ms)
+    _report(source_name, queue, crawled, started_ms)
+    return queue.counts()
+
+
+def _report(
+    source_name: str, queue: CrawlQueue, crawled: int, started_ms: int
+) -> None:
+    counts: Dict[CrawlState, int] = queue.counts()
+    left: int = counts[CrawlState.PENDING] + counts[CrawlState.IN_PROGRESS]
+    elapsed_h: float = max(now() - started_ms, 1) / HOUR
+    rate: float = crawled / elapsed_h
+    eta: str = f", {left / rate:.1f} h left" if rate and left else ""
+    log.info(
+        f"Crawled {crawled} {source_name} sets in {elapsed_h:.2f} h "
+        f"({rate:.1f} sets/h{eta}): {_counts_str(counts)}."
+    )
+
+
+def _counts_str(counts: Dict[CrawlState, int]) -> str:
+    return ", ".join(
+        f"{count} {state.value.replace('_', ' ')}"
+        for state, count in counts.items()
+    )
@@ -1,10 +1,36 @@
+import atexit
+import queue
+import threading
 from abc import ABCMeta, abstractmethod
-from typing import List, Optional, Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import (
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+    Union,
+)
 
+from gray_merchant_of_billund.constants.gmob import (
+    BRICKLINK_URL,
+    HTTP_POOL_SIZES,
+    INDEXER_LOAD_WORKERS,
+    INDEXER_REFRESH_EXIT_TIMEOUT,
+)
 from gray_merchant_of_billund.indexer.bricklink_indexer import (
     _get_bricklink_set,
 )
-from gray_merchant_of_billund.indexer.brickset_indexer import _get_brickset_set
+from gray_merchant_of_billund.indexer.brickset_indexer import (
+    BricksetResult,
+    _get_brickset_set,
+    get_brickset_sets,
+)
 from gray_merchant_of_billund.model.bricklink_set import (
     BricklinkIndex,
     BricklinkSet,
@@ -18,27 +44,290 @@ from gray_merchant_of_billund.model.rebrickable_set import (
     RebrickableIndex,
     RebrickableSet,
 )
-from gray_merchant_of_billund.storage.expirable import load
+from gray_merchant_of_billund.storage.expirable import (
+    Expirable,
+    load,
+    load_as_of,
+    load_or_build,
+)
+from gray_merchant_of_billund.storage.manifest import (
+    ExpiryStatus,
+    expiry_statuses,
+)
+from gray_merchant_of_billund.utils.log import get_logger
+from gray_merchant_of_billund.utils.time import pretty_str
 from gray_merchant_of_billund.utils.utils_resources import (
     get_personal_collection,
     get_personal_index,
     get_rebrickable_index,
 )
 
+log = get_logger()
+# a stale item to refresh, and the future of its refreshed version
+Refresh = Tuple[RebrickableSet, Future]
+
 
 class ExpirableIndexer(metaclass=ABCMeta):
-    def __init__(self, time_to_live_ms: Optional[int] = None):
+    expirable_cls: Type[Expirable]
+    # HTTP requests made by build_from_rebrickable
+    requests_per_build: int = 1
+    # concurrent builds: as many as the connection pool of the host
+    fetch_workers: int = 1
+    items: List[BricksetSet]
+
+    def __init__(
+        self,
+        time_to_live_ms: Optional[int] = None,
+        as_of: Optional[int] = None,
+        stale_while_revalidate: bool = False,
+        on_item: Optional[Callable[[Expirable], None]] = None,
+    ):
         self.time_to_live_ms: Optional[int] = time_to_live_ms
+        # a past timestamp (ms): index what was stored then, never fetch
+        self.as_of: Optional[int] = as_of
+        # serve expired items right away and refresh them in the background
+        self.stale_while_revalidate: bool = stale_while_revalidate
+        self.stale_keys: Set[str] = set()
+        # called with every item as soon as it's loaded or built, from the
+        # pool threads: in completion order, not in the index one
+        self.on_item: Optional[Callable[[Expirable], None]] = on_item
+        self._refresher: Optional[threading.Thread] = None
+        self._refresh_queue: "queue.Queue[Optional[Refresh]]" = queue.Queue()
+        self._refreshes: Dict[str, Future] = {}
 
-    def _fetch_items(self, index: RebrickableIndex) -> Sequence[BricksetSet]:
-        index_items: List[BricksetSet] = []
-        for lego_set in index:
-            expirable_item: Optional[BricksetSet] = self.load_from_storage(
-                lego_set
+    def _fetch_items(self, index: RebrickableIndex) -> List[BricksetSet]:
+        # Stored items are loaded by a wide pool, while a narrow one builds
+        # the missing ones from the start, see _build_all. Items keep the
+        # index order. On errors, raises the one of the first failed set,
+        # once all the others are done (and saved).
+        if self.as_of is not None:
+            return self._load_items_as_of(index, self.as_of)
+        # decide hits, expired and misses in one read: only hits get loaded
+        statuses: Dict[str, ExpiryStatus] = expiry_statuses(
+            self.expirable_cls,
+            (lego_set.store_key for lego_set in index),
+            self.time_to_live_ms,
+        )
+        lego_sets: List[RebrickableSet] = list(index)
+        name: str = type(self).__name__
+        with ThreadPoolExecutor(
+            INDEXER_LOAD_WORKERS, thread_name_prefix=f"{name}-load"
+        ) as loader, ThreadPoolExecutor(
+            self.fetch_workers, thread_name_prefix=f"{name}-fetch"
+        ) as fetcher:
+            futures: List[Optional[Future]] = [
+                self._notified(
+                    loader.submit(self._load_stored, lego_set, status)
+                )
+                if self._loads_stored(status)
+                else None
+                for lego_set, status in (
+                    (lego_set, statuses[lego_set.store_key])
+                    for lego_set in lego_sets
+                )
+            ]
+            self._build_missing(fetcher, lego_sets, futures)
+            for position, lego_set in enumerate(lego_sets):
+                status: ExpiryStatus = statuses[lego_set.store_key]
+                if not self._loads_stored(status):
+                    continue
+                future: Future = futures[position]  # type: ignore
+                if future.exception() is not None:
+                    continue
+                if future.result():
+                    if status is ExpiryStatus.EXPIRED:
+                        self.stale_keys.add(lego_set.store_key)
+                        self.refresh(lego_set)
+                    continue
+                # stored items failing to load get built too
+                futures[position] = None
+            self._build_missing(fetcher, lego_sets, futures)
+            results: List[Union[BricksetSet, BaseException]] = [
+                future.exception() or future.result()  # type: ignore
+                for future in futures
+            ]
+        errors: List[BaseException] = [
+            result for result in results if isinstance(result, BaseException)
+        ]
+        if errors:
+            log.error(f"Unable to index {len(errors)} {name} items.")
+            raise errors[0]
+        if self.stale_keys:
+            log.info(
+                f"Refreshing {len(self.stale_keys)} stale "
+                f"{self.expirable_cls.__name__} items in the background..."
+            )
+        return results  # type: ignore
+
+    def _build_missing(
+        self,
+        fetcher: ThreadPoolExecutor,
+        lego_sets: Sequence[RebrickableSet],
+        futures: List[Optional[Future]],
+    ) -> None:
+        # fills the positions without a future
+        positions: List[int] = [
+            position
+            for position, future in enumerate(futures)
+            if future is None
+        ]
+        if not positions:
+            return
+        built: List[Future] = self._build_all(
+            fetcher, [lego_sets[position] for position in positions]
+        )
+        for position, future in zip(positions, built):
+            futures[position] = self._notified(future)
+
+    def _build_all(
+        self, fetcher: ThreadPoolExecutor, lego_sets: Sequence[RebrickableSet]
+    ) -> List[Future]:
+        # the futures of the built lego_sets, in order: one build per set
+        return [
+            fetcher.submit(self._load_or_build, lego_set)
+            for lego_set in lego_sets
+        ]
+
+    def _notified(self, future: Future) -> Future:
+        if self.on_item is not None:
+            future.add_done_callback(self._notify)
+        return future
+
+    def _notify(self, future: Future) -> None:
+        if future.exception() is None and future.result():
+            self.on_item(future.result())  # type: ignore
+
+    def _loads_stored(self, status: ExpiryStatus) -> bool:
+        return status is ExpiryStatus.HIT or (
+            status is ExpiryStatus.EXPIRED and self.stale_while_revalidate
+        )
+
+    def _load_stored(
+        self, lego_set: RebrickableSet, status: ExpiryStatus
+    ) -> Optional[BricksetSet]:
+        if status is ExpiryStatus.HIT:
+            return self.load_from_storage(lego_set)
+        # expired: served as it is while refreshed, marked as such
+        expirable_item: Optional[BricksetSet] = load(
+            self.expirable_cls, lego_set.store_key, None
+        )
+        if expirable_item is not None:
+            expirable_item.stale = True
+        return expirable_item
+
+    def _load_or_build(self, lego_set: RebrickableSet) -> BricksetSet:
+        # another process may be fetching it already: wait for it
+        expirable_item, _ = load_or_build(
+            self.expirable_cls,
+            lego_set.store_key,
+            self.time_to_live_ms,
+            partial(self.build_from_rebrickable, lego_set),
+        )
+        return expirable_item
+
+    def refresh(self, lego_set: RebrickableSet) -> Future:
+        # One refresh at a time, like the foreground fetches, in a daemon
+        # thread: exiting doesn't wait for the queued refreshes, see
+        # _stop_refreshes.
+        if lego_set.store_key in self._refreshes:
+            return self._refreshes[lego_set.store_key]
+        if self._refresher is None:
+            self._refresher = threading.Thread(
+                target=self._run_refreshes,
+                name=f"{type(self).__name__}-refresh",
+                daemon=True,
             )
-            if not expirable_item:
-                expirable_item = self.build_from_rebrickable(lego_set)
-                expirable_item.save()
+            self._refresher.start()
+            atexit.register(self._stop_refreshes)
+        future: Future = Future()
+        self._refreshes[lego_set.store_key] = future
+        self._refresh_queue.put((lego_set, future))
+        return future
+
+    def _run_refreshes(self) -> None:
+        while True:
+            refresh: Optional[Refresh] = self._refresh_queue.get()
+            if refresh is None:
+                return
+            lego_set, future = refresh
+            if future.set_running_or_notify_cancel():
+                future.set_result(self._refresh(lego_set))
+
+    def _stop_refreshes(
+        self, timeout_s: float = INDEXER_REFRESH_EXIT_TIMEOUT
+    ) -> None:
+        # Gives up the queued refreshes (the next run, or
+        # tasks/refresh_expiring.py, gets them), and gives the running one
+        # timeout_s to be saved. Snapshots are written atomically: one cut
+        # short at exit is just missing.
+        if self._refresher is None:
+            return
+        atexit.unregister(self._stop_refreshes)
+        cancelled: int = sum(
+            future.cancel() for future in self._refreshes.values()
+        )
+        self._refresh_queue.put(None)
+        self._refresher.join(timeout_s)
+        name: str = self.expirable_cls.__name__
+        if self._refresher.is_alive():
+            log.warning(f"Gave up a {name} refresh after {timeout_s} s.")
+        if cancelled:
+            log.warning(f"Left {cancelled} stale {name} items unrefreshed.")
+        self._refresher = None
+
+    def _refresh(self, lego_set: RebrickableSet) -> Optional[BricksetSet]:
+        try:
+            return self._load_or_build(lego_set)
+        except Exception:
+            log.exception(f"Unable to refresh {lego_set.store_key}.")
+            return None
+
+    def wait_for_refreshes(self) -> int:
+        # swaps the refreshed items in, so that build() uses them
+        refreshed: Dict[str, BricksetSet] = {}
+        for store_key, future in self._refreshes.items():
+            expirable_item: Optional[BricksetSet] = (
+                None if future.cancelled() else future.result()
+            )
+            if expirable_item is not None:
+                refreshed[store_key] = expirable_item
+        self._stop_refreshes()
+        self._refreshes.clear()
+        self.items = [
+            refreshed.get(item.store_key, item) for item in self.items
+        ]
+        self.stale_keys.difference_update(refreshed)
+        return len(refreshed)
+
+    def _load_items_as_of(
+        self, index: RebrickableIndex, as_of: int
+    ) -> List[BricksetSet]:
+        index_items: List[BricksetSet] = []
+        with ThreadPoolExecutor(
+            INDEXER_LOAD_WORKERS,
+            thread_name_prefix=f"{type(self).__name__}-load",
+        ) as loader:
+            expirable_items: List[Optional[BricksetSet]] = [
+                future.result()
+                for future in [
+                    self._notified(
+                        loader.submit(
+                            load_as_of,
+                            self.expirable_cls,
+                            lego_set.store_key,
+                            as_of,
+                        )
+                    )
+                    for lego_set in index
+                ]
+            ]
+        for lego_set, expirable_item in zip(index, expirable_items):
+            if expirable_item is None:
+                log.warning(
+                    f"No {self.expirable_cls.__name__} {lego_set.store_key} "
+                    f"as of {pretty_str(as_of)}. Skipping."
+                )
+                continue
             index_items.append(expirable_item)
         return index_items
 
@@ -58,11 +347,22 @@ class ExpirableIndexer(metaclass=ABCMeta):
 
 
 class BricksetIndexer(ExpirableIndexer):
+    expirable_cls = BricksetSet
+    # a single batch at a time, concurrent itself: see _build_all
+    fetch_workers = 1
+
     def __init__(
-        self, index: RebrickableIndex, time_to_live_ms: Optional[int] = None
+        self,
+        index: RebrickableIndex,
+        time_to_live_ms: Optional[int] = None,
+        as_of: Optional[int] = None,
+        stale_while_revalidate: bool = False,
+        on_item: Optional[Callable[[Expirable], None]] = None,
     ):
-        super().__init__(time_to_live_ms)
-        self.items: Sequence[BricksetSet] = self._fetch_items(index)
+        super().__init__(
+            time_to_live_ms, as_of, stale_while_revalidate, on_item
+        )
+        self.items: List[BricksetSet] = self._fetch_items(index)
 
     def load_from_storage(
         self, rebrickable_set: RebrickableSet
@@ -76,16 +376,64 @@ class BricksetIndexer(ExpirableIndexer):
     ) -> BricksetSet:
         return _get_brickset_set(rebrickable_set)
 
+    def _build_all(
+        self, fetcher: ThreadPoolExecutor, lego_sets: Sequence[RebrickableSet]
+    ) -> List[Future]:
+        # the whole batch through the asyncio fetcher, under the limits of
+        # the Brickset host, each future set as soon as its set is done
+        futures: List[Future] = [Future() for _ in lego_sets]
+        fetcher.submit(self._fetch_all, lego_sets, futures)
+        return futures
+
+    def _fetch_all(
+        self, lego_sets: Sequence[RebrickableSet], futures: List[Future]
+    ) -> None:
+        # a set owned twice is in the index twice: fetched once, for both
+        pending: Dict[str, List[Future]] = {}
+        unique_sets: Dict[str, RebrickableSet] = {}
+        for lego_set, future in zip(lego_sets, futures):
+            if future.set_running_or_notify_cancel():
+                pending.setdefault(lego_set.store_key, []).append(future)
+                unique_sets.setdefault(lego_set.store_key, lego_set)
+
+        def on_set(lego_set: RebrickableSet, result: BricksetResult) -> None:
+            for future in pending.pop(lego_set.store_key, []):
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+        try:
+            get_brickset_sets(
+                list(unique_sets.values()), self.time_to_live_ms, on_set=on_set
+            )
+        except BaseException as exc:
+            # their errors are in their futures already: these never ran
+            for key_futures in pending.values():
+                for future in key_futures:
+                    future.set_exception(exc)
+
     def build(self) -> BricksetIndex:
         return BricksetIndex(self.items)
 
 
 class BricklinkIndexer(ExpirableIndexer):
+    expirable_cls = BricklinkSet
+    requests_per_build = 3  # shop page, set and box price guides
+    fetch_workers = HTTP_POOL_SIZES[BRICKLINK_URL]
+
     def __init__(
-        self, index: RebrickableIndex, time_to_live_ms: Optional[int] = None
+        self,
+        index: RebrickableIndex,
+        time_to_live_ms: Optional[int] = None,
+        as_of: Optional[int] = None,
+        stale_while_revalidate: bool = False,
+        on_item: Optional[Callable[[Expirable], None]] = None,
     ):
-        super().__init__(time_to_live_ms)
-        self.items: Sequence[BricklinkSet] = self._fetch_items(index)
+        super().__init__(
+            time_to_live_ms, as_of, stale_while_revalidate, on_item
+        )
+        self.items: List[BricklinkSet] = self._fetch_items(index)
 
     def load_from_storage(
         self, rebrickable_set: RebrickableSet
@@ -103,6 +451,72 @@ class BricklinkIndexer(ExpirableIndexer):
         return BricklinkIndex(self.items)
 
 
+class Indexes(NamedTuple):
+    bricklink: BricklinkIndex
+    brickset: BricksetIndex
+
+    @property
+    def stale_sets(self) -> List[Expirable]:
+        # served expired with stale_while_revalidate, see Expirable.stale
+        return [
+            lego_set
+            for index in (self.bricklink, self.brickset)
+            for lego_set in index
+            if lego_set.stale
+        ]
+
+
+def build_indexes(
+    index: RebrickableIndex,
+    bricklink_time_to_live_ms: Optional[int] = None,
+    brickset_time_to_live_ms: Optional[int] = None,
+    as_of: Optional[int] = None,
+    stale_while_revalidate: bool = False,
+    on_item: Optional[Callable[[Expirable], None]] = None,
+) -> Indexes:
+    # Builds both indexes at once: each website is scraped within the
+    # limits of its own host, so the slower one doesn't hold the other
+    # back. on_item gets every set of both as soon as it's ready, one at a
+    # time. On errors, raises the Bricklink one first, once both are done.
+    lock = threading.Lock()
+
+    def notify(item: Expirable) -> None:
+        with lock:
+            on_item(item)  # type: ignore
+
+    with ThreadPoolExecutor(2, thread_name_prefix="build_indexes") as pool:
+        indexers: List[Future] = [
+            pool.submit(
+                indexer_cls,
+                index,
+                time_to_live_ms,
+                as_of,
+                stale_while_revalidate,
+                notify if on_item is not None else None,
+            )
+            for indexer_cls, time_to_live_ms in (
+                (BricklinkIndexer, bricklink_time_to_live_ms),
+                (BricksetIndexer, brickset_time_to_live_ms),
+            )
+        ]
+        bricklink_indexer, brickset_indexer = [
+            future.result() for future in indexers
+        ]
+    return Indexes(bricklink_indexer.build(), brickset_indexer.build())
+
+
+def log_progress(total: int) -> Callable[[Expirable], None]:
+    # an on_item for build_indexes
+    done: Dict[str, int] = {}
+
+    def on_item(item: Expirable) -> None:
+        name: str = type(item).__name__
+        done[name] = done.get(name, 0) + 1
+        log.info(f"{name} {item.store_key} ready ({done[name]}/{total}).")
+
+    return on_item
+
+
 def main():
     rebrickable_index: RebrickableIndex = get_rebrickable_index()
     my_collection: CollectionIndex = get_personal_collection()
@@ -110,12 +524,8 @@ def main():
         my_collection,
         rebrickable_index,
     )
-    brickset_index: BricksetIndex = BricksetIndexer(my_index).build()
-    for brickset_set in brickset_index:
-        print(brickset_set)
-    bricklink_index: BricklinkIndex = BricklinkIndexer(my_index).build()
-    for bricklink_set in bricklink_index:
-        print(bricklink_set)
+    # every set as soon as it's ready, from either website
+    build_indexes(my_index, on_item=print)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,176 @@
+import threading
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from gray_merchant_of_billund.constants.gmob import (
+    REFRESHER_REQUESTS_PER_HOUR,
+)
+from gray_merchant_of_billund.indexer.expirable_indexer import (
+    BricklinkIndexer,
+)
+from gray_merchant_of_billund.indexer.refresher import Due, refresh_due
+from gray_merchant_of_billund.model.bricklink_set import BricklinkSet
+from gray_merchant_of_billund.model.rebrickable_set import RebrickableIndex
+from gray_merchant_of_billund.storage.expirable import load_recent
+from gray_merchant_of_billund.storage.manifest import (
+    Manifest,
+    ManifestEntry,
+    get_manifest,
+)
+from gray_merchant_of_billund.utils.log import get_logger
+from gray_merchant_of_billund.utils.time import DAY, MONTH, now
+
+log = get_logger()
+
+# Bricklink sets get their own refresh interval: the time their current
+# used average price or lots for sale take to move by TARGET_CHANGE,
+# judging by their latest snapshots. Due sets are refreshed by priority:
+# how overdue they are, times the expected price change in euros.
+HISTORY_SNAPSHOTS = 6
+TARGET_CHANGE = 0.1
+MIN_REFRESH_INTERVAL = 7 * DAY
+MAX_REFRESH_INTERVAL = 90 * DAY
+# assumed for sets without history, and also their interval
+DEFAULT_REFRESH_INTERVAL = MONTH
+
+
+class RefreshSchedule(NamedTuple):
+    creation_date_ms: int  # of the latest snapshot it is based on
+    interval_ms: int
+    weight: float  # expected change per month, in euros
+
+    def priority(self, now_ms: int) -> float:
+        overdue: float = (now_ms - self.creation_date_ms) / self.interval_ms
+        return overdue * self.weight
+
+
+def volatility(history: Sequence[BricklinkSet]) -> Optional[float]:
+    # relative change per month, between snapshots ordered oldest first
+    if len(history) < 2:
+        return None
+    elapsed_ms: int = (
+        history[-1].creation_date_ms - history[0].creation_date_ms
+    )
+    if elapsed_ms <= 0:
+        return None
+    change: float = sum(
+        max(
+            _relative_change(_used_avg_price(older), _used_avg_price(newer)),
+            _relative_change(older.for_sale, newer.for_sale),
+        )
+        for older, newer in zip(history, history[1:])
+    )
+    return change * MONTH / elapsed_ms
+
+
+def _used_avg_price(bricklink_set: BricklinkSet) -> Optional[float]:
+    aggregate = bricklink_set.price_guide.aggregate_current_used
+    return aggregate.avg_price if aggregate else None
+
+
+def _value(bricklink_set: BricklinkSet) -> float:
+    for aggregate in (
+        bricklink_set.price_guide.aggregate_current_used,
+        bricklink_set.price_guide.aggregate_current_new,
+    ):
+        if aggregate:
+            return aggregate.avg_price
+    return 0
+
+
+def _relative_change(older: Optional[float], newer: Optional[float]) -> float:
+    if older is None or newer is None:
+        # appearing or disappearing from the market is a big change
+        return 0 if older is newer else 1
+    return abs(newer - older) / max(abs(older), 1)
+
+
+def refresh_schedule(
+    history: Sequence[BricklinkSet],
+    target_change: float = TARGET_CHANGE,
+    min_interval_ms: int = MIN_REFRESH_INTERVAL,
+    max_interval_ms: int = MAX_REFRESH_INTERVAL,
+) -> RefreshSchedule:
+    change: Optional[float] = volatility(history)
+    if change is None:
+        change = target_change * MONTH / DEFAULT_REFRESH_INTERVAL
+    interval_ms: int = (
+        int(target_change * MONTH / change) if change else max_interval_ms
+    )
+    return RefreshSchedule(
+        history[-1].creation_date_ms,
+        min(max(interval_ms, min_interval_ms), max_interval_ms),
+        change * max(_value(history[-1]), 1),
+    )
+
+
+class RefreshScheduler:
+    def __init__(
+        self,
+        index: RebrickableIndex,
+        target_change: float = TARGET_CHANGE,
+        min_interval_ms: int = MIN_REFRESH_INTERVAL,
+        max_interval_ms: int = MAX_REFRESH_INTERVAL,
+    ):
+        self.index: RebrickableIndex = index
+        self.target_change: float = target_change
+        self.min_interval_ms: int = min_interval_ms
+        self.max_interval_ms: int = max_interval_ms
+        self.schedules: Dict[str, RefreshSchedule] = {}
+
+    def schedule(
+        self, store_key: str, entry: ManifestEntry
+    ) -> RefreshSchedule:
+        # recomputed only once a newer snapshot is saved
+        schedule: Optional[RefreshSchedule] = self.schedules.get(store_key)
+        if (
+            schedule is not None
+            and schedule.creation_date_ms == entry.creation_date_ms
+        ):
+            return schedule
+        history: List[BricklinkSet] = load_recent(
+            BricklinkSet, store_key, HISTORY_SNAPSHOTS
+        )
+        if not history:
+            schedule = RefreshSchedule(
+                entry.creation_date_ms, self.min_interval_ms, 0
+            )
+        else:
+            schedule = refresh_schedule(
+                history,
+                self.target_change,
+                self.min_interval_ms,
+                self.max_interval_ms,
+            )
+        self.schedules[store_key] = schedule
+        return schedule
+
+    def due(self) -> List[Due]:
+        # missing sets first, then by priority
+        manifest: Manifest = get_manifest(BricklinkSet)
+        now_ms: int = now()
+        due: List[Tuple[float, str, int]] = []
+        for lego_set in self.index:
+            entry: Optional[ManifestEntry] = manifest.get(lego_set.store_key)
+            if entry is None:
+                due.append((float("inf"), lego_set.store_key, 0))
+                continue
+            schedule = self.schedule(lego_set.store_key, entry)
+            if now_ms - entry.creation_date_ms >= schedule.interval_ms:
+                due.append(
+                    (
+                        schedule.priority(now_ms),
+                        lego_set.store_key,
+                        schedule.interval_ms,
+                    )
+                )
+        due.sort(key=lambda d: d[0], reverse=True)
+        return [(store_key, max_age_ms) for _, store_key, max_age_ms in due]
+
+    def run(
+        self,
+        requests_per_hour: int = REFRESHER_REQUESTS_PER_HOUR,
+        stop: Optional[threading.Event] = None,
+    ) -> None:
+        refresh_due(
+            BricklinkIndexer, self.index, self.due, requests_per_hour, stop
+        )
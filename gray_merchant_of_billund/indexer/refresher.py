@@ -0,0 +1,140 @@
+import threading
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple, Type
+
+from gray_merchant_of_billund.constants.gmob import (
+    REFRESHER_IDLE_TIMEOUT,
+    REFRESHER_REQUESTS_PER_HOUR,
+    REFRESHER_RETRY_TIMEOUT,
+)
+from gray_merchant_of_billund.indexer.expirable_indexer import (
+    ExpirableIndexer,
+)
+from gray_merchant_of_billund.model.rebrickable_set import (
+    RebrickableIndex,
+    RebrickableSet,
+)
+from gray_merchant_of_billund.storage.manifest import (
+    ManifestEntry,
+    expiring_soon,
+    get_manifest,
+)
+from gray_merchant_of_billund.utils.log import get_logger
+from gray_merchant_of_billund.utils.time import SECOND, now
+
+log = get_logger()
+
+# store_key, and the age (ms) from which to refresh it
+Due = Tuple[str, int]
+
+
+class RefreshTarget(NamedTuple):
+    indexer_cls: Type[ExpirableIndexer]
+    time_to_live_ms: int
+
+
+def refresh_one(
+    indexer_cls: Type[ExpirableIndexer],
+    lego_set: RebrickableSet,
+    max_age_ms: int,
+) -> bool:
+    # Refreshes a single item through its indexer, which sees it as expired
+    # once older than max_age_ms. Returns whether it was fetched here, and
+    # not by a report or another refresher.
+    latest: Optional[ManifestEntry] = get_manifest(
+        indexer_cls.expirable_cls
+    ).get(lego_set.store_key)
+    indexer: ExpirableIndexer = indexer_cls(  # type: ignore
+        RebrickableIndex([lego_set]), max_age_ms
+    )
+    return latest is None or (
+        indexer.items[0].creation_date_ms > latest.creation_date_ms
+    )
+
+
+def refresh_due(
+    indexer_cls: Type[ExpirableIndexer],
+    index: RebrickableIndex,
+    due: Callable[[], List[Due]],
+    requests_per_hour: int = REFRESHER_REQUESTS_PER_HOUR,
+    stop: Optional[threading.Event] = None,
+) -> None:
+    # Refreshes the first item listed by due, one at a time, spreading
+    # requests_per_hour evenly. Runs until stop is set.
+    stop = stop or threading.Event()
+    cls = indexer_cls.expirable_cls
+    interval_s: float = (
+        3600 * indexer_cls.requests_per_build / requests_per_hour
+    )
+    retry_after: Dict[str, int] = {}  # store_key -> ms
+    while not stop.is_set():
+        due_items: List[Due] = [
+            (store_key, max_age_ms)
+            for store_key, max_age_ms in due()
+            if retry_after.get(store_key, 0) <= now()
+        ]
+        if not due_items:
+            stop.wait(REFRESHER_IDLE_TIMEOUT)
+            continue
+        log.info(
+            f"{len(due_items)} {cls.__name__} items to refresh, "
+            f"one every {interval_s:.0f} s..."
+        )
+        store_key, max_age_ms = due_items[0]
+        try:
+            refreshed: bool = refresh_one(
+                indexer_cls, index[store_key], max_age_ms
+            )
+        except Exception:
+            log.exception(f"Unable to refresh {cls.__name__} {store_key}.")
+            retry_after[store_key] = now() + REFRESHER_RETRY_TIMEOUT * SECOND
+            refreshed = True  # the budget was spent anyway
+        if refreshed:
+            stop.wait(interval_s)
+
+
+def refresh_expiring(
+    target: RefreshTarget,
+    index: RebrickableIndex,
+    horizon_ms: int,
+    requests_per_hour: int = REFRESHER_REQUESTS_PER_HOUR,
+    stop: Optional[threading.Event] = None,
+) -> None:
+    # refreshes the items expiring within horizon_ms, the most urgent first
+    if horizon_ms >= target.time_to_live_ms:
+        raise ValueError("The horizon must be shorter than the TTL.")
+    max_age_ms: int = target.time_to_live_ms - horizon_ms
+
+    def due() -> List[Due]:
+        return [
+            (store_key, max_age_ms)
+            for store_key in expiring_soon(
+                target.indexer_cls.expirable_cls,
+                (lego_set.store_key for lego_set in index),
+                target.time_to_live_ms,
+                horizon_ms,
+            )
+        ]
+
+    refresh_due(target.indexer_cls, index, due, requests_per_hour, stop)
+
+
+def run_refreshers(
+    refreshers: List[Callable[[threading.Event], None]],
+    stop: Optional[threading.Event] = None,
+) -> None:
+    # one thread per refresher: each one has its own website and budget
+    stop = stop or threading.Event()
+    threads: List[threading.Thread] = [
+        threading.Thread(target=refresher, args=(stop,))
+        for refresher in refreshers
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        log.info("Stopping the refreshers...")
+        stop.set()
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,72 @@
+from typing import Callable, Dict, List, NamedTuple, Optional, Type
+
+from gray_merchant_of_billund.indexer.bricklink_indexer import (
+    reparse_bricklink_set,
+)
+from gray_merchant_of_billund.indexer.brickset_indexer import (
+    reparse_brickset_set,
+)
+from gray_merchant_of_billund.model.bricklink_set import BricklinkSet
+from gray_merchant_of_billund.model.brickset_set import BricksetSet
+from gray_merchant_of_billund.model.rebrickable_set import RebrickableSet
+from gray_merchant_of_billund.storage.backend import get_backend
+from gray_merchant_of_billund.storage.expirable import Expirable
+from gray_merchant_of_billund.storage.lock import key_lock
+from gray_merchant_of_billund.storage.manifest import (
+    ManifestEntry,
+    update_manifest,
+)
+from gray_merchant_of_billund.storage.serializer import dumps
+from gray_merchant_of_billund.utils.log import get_logger
+
+log = get_logger()
+
+
+class ReparseSource(NamedTuple):
+    expirable_cls: Type[Expirable]
+    # None when the pages of the set are not cached
+    reparse: Callable[[RebrickableSet], Optional[Expirable]]
+
+
+REPARSE_SOURCES: Dict[str, ReparseSource] = {
+    "bricklink": ReparseSource(BricklinkSet, reparse_bricklink_set),
+    "brickset": ReparseSource(BricksetSet, reparse_brickset_set),
+}
+
+
+def reparse(source_name: str, lego_set: RebrickableSet) -> bool:
+    # Rebuilds the item of lego_set from the response cache, without any
+    # request. Returns whether its pages were cached.
+    item: Optional[Expirable] = REPARSE_SOURCES[source_name].reparse(lego_set)
+    if item is None:
+        return False
+    save_reparsed(item)
+    return True
+
+
+def save_reparsed(item: Expirable) -> None:
+    # Items are dated when their pages were fetched: the snapshot parsed
+    # back then is rewritten in place, if still stored. A page fetched (or
+    # revalidated) after the latest snapshot makes a new latest one, while
+    # an older one stays unsaved: latest never goes back. Skips the side
+    # effects of item.save() (e.g. the price history table): rebuild them
+    # once the whole reparse is done.
+    cls: Type[Expirable] = type(item)
+    data: bytes = dumps(item)
+    backend = get_backend()
+    # no fetch saves the key meanwhile
+    with key_lock(cls, item.store_key):
+        creation_dates: List[int] = backend.creation_dates(cls, item.store_key)
+        if item.creation_date_ms in creation_dates:
+            backend.replace(cls, item.store_key, item.creation_date_ms, data)
+        elif not creation_dates or item.creation_date_ms > creation_dates[-1]:
+            backend.write(cls, item.store_key, item.creation_date_ms, data)
+        else:
+            log.debug(
+                f"Skipped reparsed {cls.__name__} {item.store_key}: its "
+                f"snapshot is no longer stored."
+            )
+            return
+        update_manifest(
+            cls, item.store_key, ManifestEntry.of(item.creation_date_ms, data)
+        )
@@ -1,5 +1,6 @@
+import os
 from pathlib import Path
-from typing import Dict, Generator, Sequence, Sized
+from typing import Dict, Generator, Optional, Sequence, Sized, Type
 
 from gray_merchant_of_billund.constants.gmob import (
     BRICKLINK_SET_HISTORY_COMPLETE_URL,
@@ -8,7 +9,19 @@ from gray_merchant_of_billund.constants.gmob import (
     IMMUTABLE_STORAGE_DIR,
     LEGO_SET_SHOP_URL,
 )
+from gray_merchant_of_billund.storage.record import (
+    Record,
+    register_record_type,
+)
 from gray_merchant_of_billund.storage.saveable import Saveable
+from gray_merchant_of_billund.storage.segment import (
+    Segment,
+    segment_path,
+    write_segment,
+)
+from gray_merchant_of_billund.utils.log import get_logger
+
+log = get_logger()
 
 
 class BaseSet(Saveable):
@@ -20,6 +33,13 @@ class BaseSet(Saveable):
     def __str__(self):
         return f"{self.num}: {self.name} ({self.year})"
 
+    def to_record(self) -> Record:
+        return self.num, self.name, self.year
+
+    @staticmethod
+    def from_record(record: Record) -> "BaseSet":
+        return BaseSet(*record)
+
     @property
     def link_lego(self) -> str:
         return f"{LEGO_SET_SHOP_URL.format(num=self.num.split('-')[0])}"
@@ -49,7 +69,12 @@ class BaseSet(Saveable):
         return (Path(IMMUTABLE_STORAGE_DIR) / "BaseSet").as_posix()
 
 
+register_record_type(BaseSet)
+
+
 class BaseIndex(Sized):
+    set_cls: Type[BaseSet] = BaseSet
+
     def __init__(self, sets: Sequence[BaseSet]):
         self.sets: Sequence[BaseSet] = sets
         self.size: int = len(sets)
@@ -75,6 +100,29 @@ class BaseIndex(Sized):
     def __contains__(self, set_num):
         return set_num in self._index
 
-    def save(self):
-        for lego_set in self.sets:
-            lego_set.save()
+    def save(self, name: str) -> None:
+        # A single segment file, instead of a file per set: read it back
+        # with load(name) or open_segment(name), not storage.saveable.load.
+        # Indexes of the same set class share a directory, so name has to
+        # tell them apart (e.g. the source file and version of the index).
+        write_segment(segment_path(self.set_cls.store_dir(), name), self.sets)
+
+    @classmethod
+    def open_segment(cls, name: str) -> Optional[Segment]:
+        # for random access to single sets
+        path: str = segment_path(cls.set_cls.store_dir(), name)
+        if not os.path.exists(path):
+            return None
+        try:
+            return Segment(path)
+        except ValueError:
+            log.warning(f"Ignoring {path}, of an older format.")
+            return None
+
+    @classmethod
+    def load(cls, name: str):
+        segment: Optional[Segment] = cls.open_segment(name)
+        if segment is None:
+            return None
+        with segment:
+            return cls(list(segment))
@@ -1,6 +1,15 @@
 import datetime
 from typing import Optional, Sequence
 
+from gray_merchant_of_billund.storage.record import (
+    Record,
+    cents,
+    from_cents,
+    register_record_type,
+    shared_object,
+    shared_record,
+)
+
 
 class BricklinkAggregatePrices:
     def __init__(
@@ -28,6 +37,35 @@ class BricklinkAggregatePrices:
             f"Max Price: {self.currency} {self.max_price}"
         )
 
+    def to_record(self) -> Record:
+        return (
+            self.total_qty,
+            cents(self.min_price),
+            cents(self.avg_price),
+            cents(self.qty_avg_price),
+            cents(self.max_price),
+            self.currency,
+        )
+
+    @staticmethod
+    def from_record(record: Record) -> "BricklinkAggregatePrices":
+        (
+            total_qty,
+            min_price,
+            avg_price,
+            qty_avg_price,
+            max_price,
+            currency,
+        ) = record
+        return BricklinkAggregatePrices(
+            total_qty,
+            from_cents(min_price),
+            from_cents(avg_price),
+            from_cents(qty_avg_price),
+            from_cents(max_price),
+            currency,
+        )
+
 
 class BricklinkAggregateSold(BricklinkAggregatePrices):
     def __init__(
@@ -48,6 +86,15 @@ class BricklinkAggregateSold(BricklinkAggregatePrices):
     def __str__(self):
         return f"Times Sold: {self.times_sold}\n" f"{super().__str__()}"
 
+    def to_record(self) -> Record:
+        return super().to_record() + (self.times_sold,)
+
+    @staticmethod
+    def from_record(record: Record) -> "BricklinkAggregateSold":
+        return BricklinkAggregateSold(
+            BricklinkAggregatePrices.from_record(record[:6]), record[6]
+        )
+
 
 class BricklinkAggregateSelling(BricklinkAggregatePrices):
     def __init__(
@@ -68,6 +115,15 @@ class BricklinkAggregateSelling(BricklinkAggregatePrices):
     def __str__(self):
         return f"Total Lots: {self.total_lots}\n" f"{super().__str__()}"
 
+    def to_record(self) -> Record:
+        return super().to_record() + (self.total_lots,)
+
+    @staticmethod
+    def from_record(record: Record) -> "BricklinkAggregateSelling":
+        return BricklinkAggregateSelling(
+            BricklinkAggregatePrices.from_record(record[:6]), record[6]
+        )
+
 
 class BricklinkMarketEntry:
     def __init__(
@@ -83,6 +139,14 @@ class BricklinkMarketEntry:
     def __str__(self):
         return f"{self.qty} {self.currency} {self.each}"
 
+    def to_record(self) -> Record:
+        return self.qty, cents(self.each), self.currency
+
+    @staticmethod
+    def from_record(record: Record) -> "BricklinkMarketEntry":
+        qty, each, currency = record
+        return BricklinkMarketEntry(qty, from_cents(each), currency)
+
 
 class BricklinkAggregateSoldMonth(BricklinkAggregateSold):
     def __init__(
@@ -107,6 +171,24 @@ class BricklinkAggregateSoldMonth(BricklinkAggregateSold):
             + f"\n\n{super().__str__()}"
         )
 
+    def to_record(self) -> Record:
+        return (
+            super().to_record(),
+            self.month,
+            self.year,
+            _entries_record(self.entries),
+        )
+
+    @staticmethod
+    def from_record(record: Record) -> "BricklinkAggregateSoldMonth":
+        sold, month, year, entries = record
+        return BricklinkAggregateSoldMonth(
+            BricklinkAggregateSold.from_record(sold),
+            month,
+            year,
+            _entries_object(entries),
+        )
+
 
 class BricklinkAggregateSellingCurrent(BricklinkAggregateSelling):
     def __init__(
@@ -130,6 +212,22 @@ class BricklinkAggregateSellingCurrent(BricklinkAggregateSelling):
             + f"\n\n{super().__str__()}"
         )
 
+    def to_record(self) -> Record:
+        return (
+            super().to_record(),
+            self.date,
+            _entries_record(self.entries),
+        )
+
+    @staticmethod
+    def from_record(record: Record) -> "BricklinkAggregateSellingCurrent":
+        selling, date, entries = record
+        return BricklinkAggregateSellingCurrent(
+            BricklinkAggregateSelling.from_record(selling),
+            date,
+            _entries_object(entries),
+        )
+
 
 class PriceGuide:
     def __init__(
@@ -171,3 +269,73 @@ class PriceGuide:
         self.details_current_used: Optional[
             BricklinkAggregateSellingCurrent
         ] = details_current_used
+
+    def to_record(self) -> Record:
+        return (
+            _optional_record(self.aggregate_last_6_months_new),
+            _optional_record(self.aggregate_last_6_months_used),
+            _optional_record(self.aggregate_current_new),
+            _optional_record(self.aggregate_current_used),
+            _months_record(self.details_last_6_months_new),
+            _months_record(self.details_last_6_months_used),
+            _optional_record(self.details_current_new),
+            _optional_record(self.details_current_used),
+        )
+
+    @staticmethod
+    def from_record(record: Record) -> "PriceGuide":
+        return PriceGuide(
+            _optional_object(BricklinkAggregateSold, record[0]),
+            _optional_object(BricklinkAggregateSold, record[1]),
+            _optional_object(BricklinkAggregateSelling, record[2]),
+            _optional_object(BricklinkAggregateSelling, record[3]),
+            _months_object(record[4]),
+            _months_object(record[5]),
+            _optional_object(BricklinkAggregateSellingCurrent, record[6]),
+            _optional_object(BricklinkAggregateSellingCurrent, record[7]),
+        )
+
+
+def _entries_record(entries: Sequence[BricklinkMarketEntry]) -> Record:
+    # the bulk of a price guide: BricklinkMarketEntry.to_record, inlined
+    return tuple(
+        (entry.qty, round(entry.each * 100), entry.currency)
+        for entry in entries
+    )
+
+
+def _entries_object(record: Record) -> Sequence[BricklinkMarketEntry]:
+    return [
+        BricklinkMarketEntry(qty, each / 100, currency)
+        for qty, each, currency in record
+    ]
+
+
+def _optional_record(item) -> Optional[Record]:
+    return None if item is None else item.to_record()
+
+
+def _optional_object(cls, record: Optional[Record]):
+    return None if record is None else cls.from_record(record)
+
+
+def _months_record(
+    months: Optional[Sequence[BricklinkAggregateSoldMonth]],
+) -> Optional[Record]:
+    if months is None:
+        return None
+    return tuple(shared_record(month) for month in months)
+
+
+def _months_object(
+    record: Optional[Record],
+) -> Optional[Sequence[BricklinkAggregateSoldMonth]]:
+    if record is None:
+        return None
+    return [
+        shared_object(BricklinkAggregateSoldMonth, month) for month in record
+    ]
+
+
+register_record_type(BricklinkAggregateSoldMonth)
+register_record_type(PriceGuide, nested=(BricklinkAggregateSoldMonth,))
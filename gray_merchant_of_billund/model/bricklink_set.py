@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import Dict, Generator, List, Sequence, Tuple
+from typing import Dict, Generator, List, Optional, Sequence, Tuple
 
 from gray_merchant_of_billund.constants.gmob import MUTABLE_STORAGE_DIR
 from gray_merchant_of_billund.model.bricklink_price import PriceGuide
@@ -8,6 +8,14 @@ from gray_merchant_of_billund.model.rebrickable_set import (
     RebrickableSet,
 )
 from gray_merchant_of_billund.storage.expirable import Expirable
+from gray_merchant_of_billund.storage.price_history import (
+    update_price_history,
+)
+from gray_merchant_of_billund.storage.record import (
+    Record,
+    nested_object,
+    register_record_type,
+)
 from gray_merchant_of_billund.utils.time import now
 
 
@@ -19,6 +27,8 @@ class BricklinkSet(RebrickableSet, Expirable):
         on_wanted: int,
         price_guide: PriceGuide,
         price_guide_box: PriceGuide,
+        # when its pages were fetched (default: now)
+        creation_date_ms: Optional[int] = None,
     ):
         super().__init__(
             rebrickable_lego_set,
@@ -29,7 +39,9 @@ class BricklinkSet(RebrickableSet, Expirable):
         self.on_wanted: int = on_wanted
         self.price_guide: PriceGuide = price_guide
         self.price_guide_box: PriceGuide = price_guide_box
-        self._now: int = now()
+        self._now: int = (
+            creation_date_ms if creation_date_ms is not None else now()
+        )
 
     def __str__(self):
         return (
@@ -38,6 +50,48 @@ class BricklinkSet(RebrickableSet, Expirable):
             f"Wanted: {self.on_wanted}"
         )
 
+    def to_record(self) -> Record:
+        return (
+            RebrickableSet.to_record(self),
+            self.for_sale,
+            self.on_wanted,
+            self.price_guide.to_record(),
+            # usually the very same object as price_guide
+            None
+            if self.price_guide_box is self.price_guide
+            else self.price_guide_box.to_record(),
+            self._now,
+        )
+
+    @staticmethod
+    def from_record(record: Record) -> "BricklinkSet":
+        (
+            rebrickable_set,
+            for_sale,
+            on_wanted,
+            price_guide,
+            price_guide_box,
+            creation_date_ms,
+        ) = record
+        bricklink_price_guide: PriceGuide = nested_object(
+            PriceGuide, price_guide
+        )
+        bricklink_set = BricklinkSet(
+            nested_object(RebrickableSet, rebrickable_set),
+            for_sale,
+            on_wanted,
+            bricklink_price_guide,
+            bricklink_price_guide
+            if price_guide_box is None
+            else nested_object(PriceGuide, price_guide_box),
+            creation_date_ms,
+        )
+        return bricklink_set
+
+    def save(self) -> None:
+        super().save()
+        update_price_history(self.num, self.price_guide)
+
     @staticmethod
     def store_dir() -> str:
         return (Path(MUTABLE_STORAGE_DIR) / "BricklinkSet").as_posix()
@@ -47,7 +101,12 @@ class BricklinkSet(RebrickableSet, Expirable):
         return self._now
 
 
+register_record_type(BricklinkSet, nested=(RebrickableSet, PriceGuide))
+
+
 class BricklinkIndex(RebrickableIndex):
+    set_cls = BricklinkSet
+
     def __init__(self, sets: Sequence[BricklinkSet]):
         super().__init__(sets)
         self.sets: Sequence[BricklinkSet] = sets
@@ -55,6 +114,12 @@ class BricklinkIndex(RebrickableIndex):
             lego_set.num: index for index, lego_set in enumerate(self.sets)
         }
 
+    def save(self, name: Optional[str] = None) -> None:
+        # sets are Expirable: every save is a new snapshot of each set, in
+        # the Expirable backend rather than in a segment
+        for lego_set in self.sets:
+            lego_set.save()
+
     def __iter__(self) -> Generator[BricklinkSet, None, None]:
         index: int = 0
         while index < self.size:
@@ -8,6 +8,11 @@ from gray_merchant_of_billund.model.rebrickable_set import (
     RebrickableSet,
 )
 from gray_merchant_of_billund.storage.expirable import Expirable
+from gray_merchant_of_billund.storage.record import (
+    Record,
+    nested_object,
+    register_record_type,
+)
 from gray_merchant_of_billund.utils.time import now
 
 
@@ -21,6 +26,8 @@ class BricksetSet(RebrickableSet, Expirable):
         rrp_raw: str,
         ppp_raw: str,
         dimensions: str,
+        # when its page was fetched (default: now)
+        creation_date_ms: Optional[int] = None,
     ):
         super().__init__(
             rebrickable_lego_set,
@@ -33,7 +40,9 @@ class BricksetSet(RebrickableSet, Expirable):
         self.rrp_raw: str = rrp_raw
         self.ppp_raw: str = ppp_raw
         self.dimensions: str = dimensions
-        self._now: int = now()
+        self._now: int = (
+            creation_date_ms if creation_date_ms is not None else now()
+        )
 
     @property
     def rrp_gbp(self) -> Optional[float]:
@@ -118,8 +127,34 @@ class BricksetSet(RebrickableSet, Expirable):
             f"Dimensions: {self.dimensions}"
         )
 
+    def to_record(self) -> Record:
+        return (
+            RebrickableSet.to_record(self),
+            self.theme,
+            self.num_minifigs,
+            self.designer,
+            self.rrp_raw,
+            self.ppp_raw,
+            self.dimensions,
+            self._now,
+        )
+
+    @staticmethod
+    def from_record(record: Record) -> "BricksetSet":
+        rebrickable_set, *fields, creation_date_ms = record
+        return BricksetSet(
+            nested_object(RebrickableSet, rebrickable_set),
+            *fields,
+            creation_date_ms=creation_date_ms,
+        )
+
+
+register_record_type(BricksetSet, nested=(RebrickableSet,))
+
 
 class BricksetIndex(RebrickableIndex):
+    set_cls = BricksetSet
+
     def __init__(self, sets: Sequence[BricksetSet]):
         super().__init__(sets)
         self.sets: Sequence[BricksetSet] = sets
@@ -127,6 +162,12 @@ class BricksetIndex(RebrickableIndex):
             lego_set.num: index for index, lego_set in enumerate(self.sets)
         }
 
+    def save(self, name: Optional[str] = None) -> None:
+        # sets are Expirable: every save is a new snapshot of each set, in
+        # the Expirable backend rather than in a segment
+        for lego_set in self.sets:
+            lego_set.save()
+
     def __iter__(self) -> Generator[BricksetSet, None, None]:
         index: int = 0
         while index < self.size:
@@ -3,6 +3,13 @@ from typing import Dict, Generator, Optional, Sequence
 
 from gray_merchant_of_billund.constants.gmob import IMMUTABLE_STORAGE_DIR
 from gray_merchant_of_billund.model.base_set import BaseIndex, BaseSet
+from gray_merchant_of_billund.storage.record import (
+    Record,
+    cents,
+    from_cents,
+    nested_object,
+    register_record_type,
+)
 
 
 class CollectionSet(BaseSet):
@@ -46,12 +53,40 @@ class CollectionSet(BaseSet):
             f"{'. ' + self.date_notes if self.date_notes else ''})"
         )
 
+    def to_record(self) -> Record:
+        return (
+            BaseSet.to_record(self),
+            cents(self.purchase_price),
+            self.price_notes,
+            self.acquired_date,
+            self.date_notes,
+            self.gift,
+            self.instructions,
+            self.acquired_location,
+            self.acquired_new,
+            self.other_notes,
+        )
+
+    @staticmethod
+    def from_record(record: Record) -> "CollectionSet":
+        base_set, purchase_price, *fields = record
+        return CollectionSet(
+            nested_object(BaseSet, base_set),
+            from_cents(purchase_price),
+            *fields,
+        )
+
     @staticmethod
     def store_dir() -> str:
         return (Path(IMMUTABLE_STORAGE_DIR) / "CollectionSet").as_posix()
 
 
+register_record_type(CollectionSet, nested=(BaseSet,))
+
+
 class CollectionIndex(BaseIndex):
+    set_cls = CollectionSet
+
     def __init__(self, sets: Sequence[CollectionSet]):
         super().__init__(sets)
         self.sets: Sequence[CollectionSet] = sets
@@ -32,5 +32,9 @@ class BricklinkQuotaError(BricklinkException):
     pass
 
 
+class BricklinkForbiddenError(BricklinkException):
+    pass
+
+
 class BricklinkLoginException(BricklinkException, ParseException):
     pass
@@ -3,6 +3,11 @@ from typing import Dict, Generator, Sequence
 
 from gray_merchant_of_billund.constants.gmob import IMMUTABLE_STORAGE_DIR
 from gray_merchant_of_billund.model.base_set import BaseIndex, BaseSet
+from gray_merchant_of_billund.storage.record import (
+    Record,
+    nested_object,
+    register_record_type,
+)
 
 
 class RebrickableSet(BaseSet):
@@ -23,6 +28,16 @@ class RebrickableSet(BaseSet):
     def __str__(self):
         return f"{super().__str__()} |{self.num_parts}|"
 
+    def to_record(self) -> Record:
+        return BaseSet.to_record(self), self.theme_id, self.num_parts
+
+    @staticmethod
+    def from_record(record: Record) -> "RebrickableSet":
+        base_set, theme_id, num_parts = record
+        return RebrickableSet(
+            nested_object(BaseSet, base_set), theme_id, num_parts
+        )
+
     @property
     def store_key(self) -> str:
         return self.num
@@ -32,7 +47,12 @@ class RebrickableSet(BaseSet):
         return (Path(IMMUTABLE_STORAGE_DIR) / "RebrickableSet").as_posix()
 
 
+register_record_type(RebrickableSet, nested=(BaseSet,))
+
+
 class RebrickableIndex(BaseIndex):
+    set_cls = RebrickableSet
+
     def __init__(self, sets: Sequence[RebrickableSet]):
         super().__init__(sets)
         self.sets: Sequence[RebrickableSet] = sets
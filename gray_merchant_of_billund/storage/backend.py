@@ -0,0 +1,732 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from abc import ABCMeta, abstractmethod
+from bisect import bisect_right
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import (
+    Dict,
+    Hashable,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+)
+
+from gray_merchant_of_billund.constants.gmob import (
+    COLD_STORAGE_DIR,
+    COLD_TIER_COMPRESSION,
+    EXPIRABLE_SQLITE_FILE,
+    EXPIRABLE_STORAGE_BACKEND,
+    HOT_TIER_SNAPSHOTS,
+)
+from gray_merchant_of_billund.storage.saveable import Saveable
+from gray_merchant_of_billund.storage.serializer import compressed
+from gray_merchant_of_billund.utils.log import get_logger
+from gray_merchant_of_billund.utils.path import posix_path
+from gray_merchant_of_billund.utils.time import pretty_str
+
+log = get_logger()
+
+
+class SnapshotStat(NamedTuple):
+    # where the snapshot lives, and a token that changes whenever it does
+    store_path: str
+    version: Hashable
+    size: int
+
+
+def _creation_date(file_name: str) -> Optional[int]:
+    # snapshot file names start with their creation date: "<ms>.pkl", or
+    # "<ms> (<date>).pkl". Anything else (latest.pkl, temporary files, editor
+    # backups) is not a snapshot.
+    if not file_name.endswith(".pkl"):
+        return None
+    head: str = file_name[: -len(".pkl")].split(" ", 1)[0]
+    return int(head) if head.isdigit() else None
+
+
+def _snapshot_paths(directory: str, file_names: List[str]) -> Dict[int, str]:
+    snapshot_paths: Dict[int, str] = {}
+    for file_name in file_names:
+        creation_date_ms: Optional[int] = _creation_date(file_name)
+        if creation_date_ms is not None:
+            snapshot_paths[creation_date_ms] = posix_path(directory, file_name)
+    return snapshot_paths
+
+
+class ExpirableBackend(metaclass=ABCMeta):
+    # Stores serialized Expirable snapshots keyed by
+    # (class, store_key, creation_date_ms).
+
+    @abstractmethod
+    def write(
+        self,
+        cls: Type[Saveable],
+        store_key: str,
+        creation_date_ms: int,
+        data: bytes,
+    ) -> None:
+        pass
+
+    @abstractmethod
+    def replace(
+        self,
+        cls: Type[Saveable],
+        store_key: str,
+        creation_date_ms: int,
+        data: bytes,
+    ) -> None:
+        # atomically rewrites an existing snapshot, leaving latest as it is
+        pass
+
+    @abstractmethod
+    def delete(
+        self, cls: Type[Saveable], store_key: str, creation_date_ms: int
+    ) -> None:
+        pass
+
+    @abstractmethod
+    def read(
+        self, cls: Type[Saveable], store_key: str, creation_date_ms: int
+    ) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def read_latest(
+        self, cls: Type[Saveable], store_key: str
+    ) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def stat_latest(
+        self, cls: Type[Saveable], store_key: str
+    ) -> Optional[SnapshotStat]:
+        pass
+
+    @abstractmethod
+    def creation_dates(self, cls: Type[Saveable], store_key: str) -> List[int]:
+        # sorted in ascending order
+        pass
+
+    @abstractmethod
+    def store_keys(self, cls: Type[Saveable]) -> List[str]:
+        pass
+
+    def manifest_dir(self, cls: Type[Saveable]) -> str:
+        # where the manifest of cls lives (see storage/manifest.py)
+        return cls.store_dir()
+
+    def creation_date_as_of(
+        self, cls: Type[Saveable], store_key: str, timestamp_ms: int
+    ) -> Optional[int]:
+        # the newest creation date not after timestamp_ms
+        creation_dates: List[int] = self.creation_dates(cls, store_key)
+        index: int = bisect_right(creation_dates, timestamp_ms)
+        return creation_dates[index - 1] if index else None
+
+
+LATEST_STORE_KEY = "latest"
+
+
+class PickleTreeBackend(ExpirableBackend):
+    # One pickle file per snapshot, plus a latest.pkl symlink per store key:
+    # <store_dir>/<store_key>/<creation_date_ms> (<pretty date>).pkl
+    def __init__(self, root: Optional[str] = None):
+        self.root: Optional[str] = root
+
+    def class_dir(self, cls: Type[Saveable]) -> str:
+        if self.root is None:
+            return cls.store_dir()
+        return posix_path(self.root, cls.__name__)
+
+    def key_dir(self, cls: Type[Saveable], store_key: str) -> str:
+        return posix_path(self.class_dir(cls), store_key)
+
+    def manifest_dir(self, cls: Type[Saveable]) -> str:
+        return self.class_dir(cls)
+
+    def snapshot_path(
+        self, cls: Type[Saveable], store_key: str, creation_date_ms: int
+    ) -> str:
+        return Saveable.build_store_path(
+            self.class_dir(cls),
+            f"{creation_date_ms} ({pretty_str(creation_date_ms)})",
+            store_sub_dir=store_key,
+        )
+
+    def latest_path(self, cls: Type[Saveable], store_key: str) -> str:
+        return Saveable.build_store_path(
+            self.key_dir(cls, store_key), LATEST_STORE_KEY
+        )
+
+    def write(
+        self,
+        cls: Type[Saveable],
+        store_key: str,
+        creation_date_ms: int,
+        data: bytes,
+    ) -> None:
+        store_path: str = self.snapshot_path(cls, store_key, creation_date_ms)
+        log.debug(f"Saving item to {store_path}...")
+        expirable_dir = Path(store_path).parent.as_posix()
+        os.makedirs(expirable_dir, exist_ok=True)
+        # readers never see a partial snapshot, nor a missing latest
+        tmp_suffix: str = f"{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(f"{store_path}.{tmp_suffix}", "wb") as out_f:
+            out_f.write(data)
+        os.replace(f"{store_path}.{tmp_suffix}", store_path)
+        log.debug(f"Saved item to {store_path}.")
+        # make a symlink for fast retrieval
+        latest = self.latest_path(cls, store_key)
+        log.debug(f"Making latest symlink to {latest}...")
+        os.symlink(store_path, f"{latest}.{tmp_suffix}")
+        os.replace(f"{latest}.{tmp_suffix}", latest)
+        log.debug(f"Made latest symlink to {latest}.")
+
+    def replace(
+        self,
+        cls: Type[Saveable],
+        store_key: str,
+        creation_date_ms: int,
+        data: bytes,
+    ) -> None:
+        store_path: Optional[str] = self.snapshot_paths(cls, store_key).get(
+            creation_date_ms
+        )
+        if store_path is None:
+            raise FileNotFoundError(
+                f"Missing item {store_key} at {creation_date_ms}."
+            )
+        log.debug(f"Replacing item {store_path}...")
+        tmp_path: str = (
+            f"{store_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        )
+        with open(tmp_path, "wb") as out_f:
+            out_f.write(data)
+        os.replace(tmp_path, store_path)
+        log.debug(f"Replaced item {store_path}.")
+
+    def delete(
+        self, cls: Type[Saveable], store_key: str, creation_date_ms: int
+    ) -> None:
+        store_path: Optional[str] = self.snapshot_paths(cls, store_key).get(
+            creation_date_ms
+        )
+        if store_path is None:
+            return
+        log.debug(f"Deleting item {store_path}...")
+        os.remove(store_path)
+        log.debug(f"Deleted item {store_path}.")
+
+    def read(
+        self, cls: Type[Saveable], store_key: str, creation_date_ms: int
+    ) -> Optional[bytes]:
+        data: Optional[bytes] = self._read_file(
+            self.snapshot_path(cls, store_key, creation_date_ms)
+        )
+        if data is not None:
+            return data
+        # the pretty date in the file name depends on the local timezone
+        store_path: Optional[str] = self.snapshot_paths(cls, store_key).get(
+            creation_date_ms
+        )
+        if store_path is None:
+            log.debug(f"Missing item {store_key} at {creation_date_ms}.")
+            return None
+        return self._read_file(store_path)
+
+    def read_latest(
+        self, cls: Type[Saveable], store_key: str
+    ) -> Optional[bytes]:
+        os.makedirs(self.class_dir(cls), exist_ok=True)
+        return self._read_file(self.latest_path(cls, store_key))
+
+    def stat_latest(
+        self, cls: Type[Saveable], store_key: str
+    ) -> Optional[SnapshotStat]:
+        latest: str = self.latest_path(cls, store_key)
+        try:
+            # follows the symlink: a new snapshot changes the inode
+            stat = os.stat(latest)
+        except FileNotFoundError:
+            return None
+        return SnapshotStat(
+            latest,
+            (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size),
+            stat.st_size,
+        )
+
+    def creation_dates(self, cls: Type[Saveable], store_key: str) -> List[int]:
+        return sorted(self.snapshot_paths(cls, store_key))
+
+    def store_keys(self, cls: Type[Saveable]) -> List[str]:
+        try:
+            return sorted(
+                entry.name
+                for entry in os.scandir(self.class_dir(cls))
+                if entry.is_dir()
+            )
+        except FileNotFoundError:
+            return []
+
+    def snapshot_paths(
+        self, cls: Type[Saveable], store_key: str
+    ) -> Dict[int, str]:
+        # snapshot file names start with their creation date: no need to
+        # unpickle anything to list them
+        store_sub_dir: str = self.key_dir(cls, store_key)
+        try:
+            file_names: List[str] = os.listdir(store_sub_dir)
+        except FileNotFoundError:
+            return {}
+        return _snapshot_paths(store_sub_dir, file_names)
+
+    @staticmethod
+    def _read_file(store_path: str) -> Optional[bytes]:
+        log.debug(f"Loading item from {store_path}...")
+        try:
+            with open(store_path, "rb") as in_f:
+                data: bytes = in_f.read()
+        except FileNotFoundError:
+            log.debug(f"Missing item {store_path}.")
+            return None
+        log.debug(f"Loaded item from {store_path}.")
+        return data
+
+
+class ShardedPickleTreeBackend(PickleTreeBackend):
+    # Like PickleTreeBackend, with store keys spread over 256 shards and
+    # snapshots partitioned by (UTC) month, so that no directory grows
+    # without bounds:
+    # <store_dir>/<shard>/<store_key>/<YYYY>/<MM>/<creation_date_ms>.pkl
+
+    @staticmethod
+    def shard(store_key: str) -> str:
+        return hashlib.sha256(store_key.encode()).hexdigest()[:2]
+
+    @staticmethod
+    def partition(creation_date_ms: int) -> Tuple[str, str]:
+        date = datetime.fromtimestamp(creation_date_ms / 1000, timezone.utc)
+        return f"{date.year:04d}", f"{date.month:02d}"
+
+    def key_dir(self, cls: Type[Saveable], store_key: str) -> str:
+        return posix_path(
+            self.class_dir(cls), self.shard(store_key), store_key
+        )
+
+    def snapshot_path(
+        self, cls: Type[Saveable], store_key: str, creation_date_ms: int
+    ) -> str:
+        return Saveable.build_store_path(
+            self.key_dir(cls, store_key),
+            str(creation_date_ms),
+            store_sub_dir=posix_path(*self.partition(creation_date_ms)),
+        )
+
+    def delete(
+        self, cls: Type[Saveable], store_key: str, creation_date_ms: int
+    ) -> None:
+        super().delete(cls, store_key, creation_date_ms)
+        month_dir: str = os.path.dirname(
+            self.snapshot_path(cls, store_key, creation_date_ms)
+        )
+        try:
+            os.rmdir(month_dir)
+        except OSError:
+            pass  # not empty
+
+    def creation_date_as_of(
+        self, cls: Type[Saveable], store_key: str, timestamp_ms: int
+    ) -> Optional[int]:
+        # only lists the months up to timestamp_ms, newest first, until one
+        # has a snapshot old enough
+        partition: Tuple[str, str] = self.partition(timestamp_ms)
+        for month in reversed(self._months(cls, store_key)):
+            if month > partition:
+                continue
+            creation_dates: List[int] = sorted(
+                self.month_snapshot_paths(cls, store_key, month)
+            )
+            index: int = bisect_right(creation_dates, timestamp_ms)
+            if index:
+                return creation_dates[index - 1]
+        return None
+
+    def store_keys(self, cls: Type[Saveable]) -> List[str]:
+        try:
+            shards: List[os.DirEntry] = [
+                entry
+                for entry in os.scandir(self.class_dir(cls))
+                if entry.is_dir() and len(entry.name) == 2
+            ]
+        except FileNotFoundError:
+            return []
+        return sorted(
+            entry.name
+            for shard in shards
+            for entry in os.scandir(shard.path)
+            if entry.is_dir()
+        )
+
+    def _months(
+        self, cls: Type[Saveable], store_key: str
+    ) -> List[Tuple[str, str]]:
+        key_dir: str = self.key_dir(cls, store_key)
+        try:
+            years: List[str] = [
+                entry.name for entry in os.scandir(key_dir) if entry.is_dir()
+            ]
+        except FileNotFoundError:
+            return []
+        return sorted(
+            (year, entry.name)
+            for year in years
+            for entry in os.scandir(posix_path(key_dir, year))
+            if entry.is_dir()
+        )
+
+    def month_snapshot_paths(
+        self, cls: Type[Saveable], store_key: str, month: Tuple[str, str]
+    ) -> Dict[int, str]:
+        month_dir: str = posix_path(self.key_dir(cls, store_key), *month)
+        try:
+            file_names: List[str] = os.listdir(month_dir)
+        except FileNotFoundError:
+            return {}
+        return _snapshot_paths(month_dir, file_names)
+
+    def snapshot_paths(
+        self, cls: Type[Saveable], store_key: str
+    ) -> Dict[int, str]:
+        snapshot_paths: Dict[int, str] = {}
+        for month in self._months(cls, store_key):
+            snapshot_paths.update(
+                self.month_snapshot_paths(cls, store_key, month)
+            )
+        return snapshot_paths
+
+
+class SQLiteBackend(ExpirableBackend):
+    # All snapshots of all classes in a single SQLite file. Every write and
+    # replace dates its row (written_ns), for stat_latest.
+    def __init__(self, db_file: str = EXPIRABLE_SQLITE_FILE):
+        self.db_file: str = db_file
+        self._local = threading.local()
+
+    def __getstate__(self):
+        # connections can't cross threads or processes
+        return {"db_file": self.db_file}
+
+    def manifest_dir(self, cls: Type[Saveable]) -> str:
+        return posix_path(os.path.dirname(self.db_file), cls.__name__)
+
+    def __setstate__(self, state):
+        self.__init__(state["db_file"])
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        connection: Optional[sqlite3.Connection] = getattr(
+            self._local, "connection", None
+        )
+        if connection is None:
+            os.makedirs(Path(self.db_file).parent, exist_ok=True)
+            connection = sqlite3.connect(self.db_file, timeout=60)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS snapshots ("
+                "cls TEXT NOT NULL, "
+                "store_key TEXT NOT NULL, "
+                "creation_date_ms INTEGER NOT NULL, "
+                "data BLOB NOT NULL, "
+                "written_ns INTEGER NOT NULL DEFAULT 0, "
+                "PRIMARY KEY (cls, store_key, creation_date_ms))"
+            )
+            columns: Set[str] = {
+                row[1]
+                for row in connection.execute("PRAGMA table_info(snapshots)")
+            }
+            if "written_ns" not in columns:  # files of older versions
+                connection.execute(
+                    "ALTER TABLE snapshots "
+                    "ADD COLUMN written_ns INTEGER NOT NULL DEFAULT 0"
+                )
+            connection.commit()
+            self._local.connection = connection
+        return connection
+
+    def write(
+        self,
+        cls: Type[Saveable],
+        store_key: str,
+        creation_date_ms: int,
+        data: bytes,
+    ) -> None:
+        log.debug(f"Saving item {store_key} to {self.db_file}...")
+        with self.connection as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?)",
+                (
+                    cls.__name__,
+                    store_key,
+                    creation_date_ms,
+                    data,
+                    time.time_ns(),
+                ),
+            )
+        log.debug(f"Saved item {store_key} to {self.db_file}.")
+
+    def replace(
+        self,
+        cls: Type[Saveable],
+        store_key: str,
+        creation_date_ms: int,
+        data: bytes,
+    ) -> None:
+        with self.connection as connection:
+            cursor = connection.execute(
+                "UPDATE snapshots SET data = ?, written_ns = ? "
+                "WHERE cls = ? AND store_key = ? AND creation_date_ms = ?",
+                (
+                    data,
+                    time.time_ns(),
+                    cls.__name__,
+                    store_key,
+                    creation_date_ms,
+                ),
+            )
+        if cursor.rowcount == 0:
+            raise FileNotFoundError(
+                f"Missing item {store_key} at {creation_date_ms}."
+            )
+
+    def delete(
+        self, cls: Type[Saveable], store_key: str, creation_date_ms: int
+    ) -> None:
+        with self.connection as connection:
+            connection.execute(
+                "DELETE FROM snapshots "
+                "WHERE cls = ? AND store_key = ? AND creation_date_ms = ?",
+                (cls.__name__, store_key, creation_date_ms),
+            )
+
+    def read(
+        self, cls: Type[Saveable], store_key: str, creation_date_ms: int
+    ) -> Optional[bytes]:
+        row = self.connection.execute(
+            "SELECT data FROM snapshots "
+            "WHERE cls = ? AND store_key = ? AND creation_date_ms = ?",
+            (cls.__name__, store_key, creation_date_ms),
+        ).fetchone()
+        return row[0] if row else None
+
+    def read_latest(
+        self, cls: Type[Saveable], store_key: str
+    ) -> Optional[bytes]:
+        log.debug(f"Loading item {store_key} from {self.db_file}...")
+        row = self.connection.execute(
+            "SELECT data FROM snapshots WHERE cls = ? AND store_key = ? "
+            "ORDER BY creation_date_ms DESC LIMIT 1",
+            (cls.__name__, store_key),
+        ).fetchone()
+        if row is None:
+            log.debug(f"Missing item {store_key} in {self.db_file}.")
+            return None
+        log.debug(f"Loaded item {store_key} from {self.db_file}.")
+        return row[0]
+
+    def stat_latest(
+        self, cls: Type[Saveable], store_key: str
+    ) -> Optional[SnapshotStat]:
+        # a replace keeps the creation date, and maybe the length
+        row = self.connection.execute(
+            "SELECT creation_date_ms, written_ns, length(data) FROM snapshots "
+            "WHERE cls = ? AND store_key = ? "
+            "ORDER BY creation_date_ms DESC LIMIT 1",
+            (cls.__name__, store_key),
+        ).fetchone()
+        if row is None:
+            return None
+        return SnapshotStat(
+            f"{self.db_file}/{cls.__name__}/{store_key}", tuple(row), row[2]
+        )
+
+    def creation_dates(self, cls: Type[Saveable], store_key: str) -> List[int]:
+        return [
+            row[0]
+            for row in self.connection.execute(
+                "SELECT creation_date_ms FROM snapshots "
+                "WHERE cls = ? AND store_key = ? ORDER BY creation_date_ms",
+                (cls.__name__, store_key),
+            )
+        ]
+
+    def creation_date_as_of(
+        self, cls: Type[Saveable], store_key: str, timestamp_ms: int
+    ) -> Optional[int]:
+        # a seek in the primary key index
+        row = self.connection.execute(
+            "SELECT MAX(creation_date_ms) FROM snapshots "
+            "WHERE cls = ? AND store_key = ? AND creation_date_ms <= ?",
+            (cls.__name__, store_key, timestamp_ms),
+        ).fetchone()
+        return row[0]
+
+    def store_keys(self, cls: Type[Saveable]) -> List[str]:
+        return [
+            row[0]
+            for row in self.connection.execute(
+                "SELECT DISTINCT store_key FROM snapshots WHERE cls = ? "
+                "ORDER BY store_key",
+                (cls.__name__,),
+            )
+        ]
+
+
+class TieredBackend(ExpirableBackend):
+    # The newest snapshots of every store key in a hot backend, older ones
+    # moved to a compressed cold backend by the next write of their store
+    # key, or by demote_all (e.g. tasks/compact_storage.py, for keys no
+    # longer scraped). Reads look in the hot tier first: a snapshot being
+    # moved is in both for a moment.
+    def __init__(
+        self,
+        hot: Optional[ExpirableBackend] = None,
+        cold: Optional[ExpirableBackend] = None,
+        hot_snapshots: int = HOT_TIER_SNAPSHOTS,
+    ):
+        self.hot: ExpirableBackend = hot or PickleTreeBackend()
+        self.cold: ExpirableBackend = cold or ShardedPickleTreeBackend(
+            COLD_STORAGE_DIR
+        )
+        self.hot_snapshots: int = max(hot_snapshots, 1)
+
+    def manifest_dir(self, cls: Type[Saveable]) -> str:
+        return self.hot.manifest_dir(cls)
+
+    def write(
+        self,
+        cls: Type[Saveable],
+        store_key: str,
+        creation_date_ms: int,
+        data: bytes,
+    ) -> None:
+        self.hot.write(cls, store_key, creation_date_ms, data)
+        self.demote(cls, store_key)
+
+    def demote(self, cls: Type[Saveable], store_key: str) -> int:
+        creation_dates: List[int] = self.hot.creation_dates(cls, store_key)
+        demoted: List[int] = creation_dates[: -self.hot_snapshots]
+        for creation_date_ms in demoted:
+            data: Optional[bytes] = self.hot.read(
+                cls, store_key, creation_date_ms
+            )
+            if data is None:
+                continue
+            # written before being deleted: never missing from both tiers
+            self.cold.write(
+                cls,
+                store_key,
+                creation_date_ms,
+                compressed(data, COLD_TIER_COMPRESSION),
+            )
+            self.hot.delete(cls, store_key, creation_date_ms)
+        if demoted:
+            log.debug(f"Moved {len(demoted)} {store_key} items to cold tier.")
+        return len(demoted)
+
+    def demote_all(self, cls: Type[Saveable]) -> int:
+        demoted: int = 0
+        for store_key in self.hot.store_keys(cls):
+            demoted += self.demote(cls, store_key)
+        return demoted
+
+    def replace(
+        self,
+        cls: Type[Saveable],
+        store_key: str,
+        creation_date_ms: int,
+        data: bytes,
+    ) -> None:
+        if creation_date_ms in self.hot.creation_dates(cls, store_key):
+            self.hot.replace(cls, store_key, creation_date_ms, data)
+        else:
+            self.cold.replace(
+                cls,
+                store_key,
+                creation_date_ms,
+                compressed(data, COLD_TIER_COMPRESSION),
+            )
+
+    def delete(
+        self, cls: Type[Saveable], store_key: str, creation_date_ms: int
+    ) -> None:
+        self.hot.delete(cls, store_key, creation_date_ms)
+        self.cold.delete(cls, store_key, creation_date_ms)
+
+    def read(
+        self, cls: Type[Saveable], store_key: str, creation_date_ms: int
+    ) -> Optional[bytes]:
+        data: Optional[bytes] = self.hot.read(cls, store_key, creation_date_ms)
+        if data is None:
+            data = self.cold.read(cls, store_key, creation_date_ms)
+        return data
+
+    def read_latest(
+        self, cls: Type[Saveable], store_key: str
+    ) -> Optional[bytes]:
+        return self.hot.read_latest(cls, store_key)
+
+    def stat_latest(
+        self, cls: Type[Saveable], store_key: str
+    ) -> Optional[SnapshotStat]:
+        return self.hot.stat_latest(cls, store_key)
+
+    def creation_dates(self, cls: Type[Saveable], store_key: str) -> List[int]:
+        return sorted(
+            set(self.hot.creation_dates(cls, store_key)).union(
+                self.cold.creation_dates(cls, store_key)
+            )
+        )
+
+    def creation_date_as_of(
+        self, cls: Type[Saveable], store_key: str, timestamp_ms: int
+    ) -> Optional[int]:
+        creation_date_ms: Optional[int] = self.hot.creation_date_as_of(
+            cls, store_key, timestamp_ms
+        )
+        if creation_date_ms is not None:
+            # hot snapshots are the newest
+            return creation_date_ms
+        return self.cold.creation_date_as_of(cls, store_key, timestamp_ms)
+
+    def store_keys(self, cls: Type[Saveable]) -> List[str]:
+        return sorted(
+            set(self.hot.store_keys(cls)).union(self.cold.store_keys(cls))
+        )
+
+
+BACKENDS: Dict[str, Type[ExpirableBackend]] = {
+    "pickle": PickleTreeBackend,
+    "sharded": ShardedPickleTreeBackend,
+    "sqlite": SQLiteBackend,
+    "tiered": TieredBackend,
+}
+_backend: Optional[ExpirableBackend] = None
+
+
+def get_backend() -> ExpirableBackend:
+    global _backend
+    if _backend is None:
+        _backend = BACKENDS[EXPIRABLE_STORAGE_BACKEND]()
+    return _backend
+
+
+def set_backend(backend: ExpirableBackend) -> None:
+    global _backend
+    _backend = backend
@@ -0,0 +1,179 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Generator, Iterable, Optional, Set
+
+from gray_merchant_of_billund.constants.gmob import (
+    BLOB_CACHE_MAX_ITEMS,
+    BLOB_CACHE_MAX_SIZE,
+    BLOB_STORAGE_DIR,
+)
+from gray_merchant_of_billund.storage.cache import LRUCache
+from gray_merchant_of_billund.utils.log import get_logger
+from gray_merchant_of_billund.utils.path import posix_path
+from gray_merchant_of_billund.utils.time import now
+
+log = get_logger()
+
+BLOB_PACK_FILE_NAME = "blobs.sqlite3"
+MAX_STORED_MS = 2**63 - 1  # the largest SQLite integer: any blob
+
+
+class BlobStore:
+    # Immutable blobs addressed by the SHA-256 of their content: storing
+    # the same content twice writes it once. Blobs are packed in a single
+    # SQLite file, so that loading a snapshot sharing many of them opens no
+    # file per blob. Blobs saved as loose files (<root>/<ab>/<digest>) by
+    # older versions are still read, and moved to the pack by pack().
+    # Every put dates the blob (stored_ms), so that sweeps spare the blobs
+    # of snapshots being written, see delete().
+    def __init__(self, root: str = BLOB_STORAGE_DIR):
+        self.root: str = root
+        self.pack_file: str = posix_path(root, BLOB_PACK_FILE_NAME)
+        self._cache = LRUCache(BLOB_CACHE_MAX_ITEMS, BLOB_CACHE_MAX_SIZE)
+        self._local = threading.local()
+
+    def __getstate__(self):
+        # connections can't cross threads or processes
+        return {"root": self.root}
+
+    def __setstate__(self, state):
+        self.__init__(state["root"])
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        connection: Optional[sqlite3.Connection] = getattr(
+            self._local, "connection", None
+        )
+        if connection is None:
+            os.makedirs(Path(self.pack_file).parent, exist_ok=True)
+            connection = sqlite3.connect(self.pack_file, timeout=60)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS blobs ("
+                "digest TEXT PRIMARY KEY, "
+                "data BLOB NOT NULL, "
+                "stored_ms INTEGER NOT NULL DEFAULT 0)"
+            )
+            columns: Set[str] = {
+                row[1]
+                for row in connection.execute("PRAGMA table_info(blobs)")
+            }
+            if "stored_ms" not in columns:  # packs of older versions
+                connection.execute(
+                    "ALTER TABLE blobs "
+                    "ADD COLUMN stored_ms INTEGER NOT NULL DEFAULT 0"
+                )
+            connection.commit()
+            self._local.connection = connection
+        return connection
+
+    def path(self, digest: str) -> str:
+        # of a loose blob
+        return posix_path(self.root, digest[:2], digest)
+
+    def put(self, data: bytes) -> str:
+        # always written: another process may have swept it meanwhile
+        digest: str = hashlib.sha256(data).hexdigest()
+        stored_ms: int = now()
+        with self.connection as connection:
+            cursor = connection.execute(
+                "INSERT OR IGNORE INTO blobs VALUES (?, ?, ?)",
+                (digest, data, stored_ms),
+            )
+            if not cursor.rowcount:
+                connection.execute(
+                    "UPDATE blobs SET stored_ms = ? WHERE digest = ?",
+                    (stored_ms, digest),
+                )
+        if cursor.rowcount:
+            log.debug(f"Saved blob {digest}.")
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        data: Optional[bytes] = self._cache.get(digest, digest)
+        if data is None:
+            row = self.connection.execute(
+                "SELECT data FROM blobs WHERE digest = ?", (digest,)
+            ).fetchone()
+            if row is not None:
+                data = row[0]
+            else:
+                with open(self.path(digest), "rb") as in_f:
+                    data = in_f.read()
+            self._cache.put(digest, digest, data, len(data))
+        return data
+
+    def digests(
+        self, stored_before_ms: int = MAX_STORED_MS
+    ) -> Generator[str, None, None]:
+        for (digest,) in self.connection.execute(
+            "SELECT digest FROM blobs WHERE stored_ms < ?", (stored_before_ms,)
+        ).fetchall():
+            yield digest
+        for digest in self._loose_digests():
+            if self._loose_stored_ms(digest) < stored_before_ms:
+                yield digest
+
+    def _loose_stored_ms(self, digest: str) -> int:
+        try:
+            return os.stat(self.path(digest)).st_mtime_ns // 10**6
+        except FileNotFoundError:
+            return 0
+
+    def _loose_digests(self) -> Generator[str, None, None]:
+        try:
+            shards = list(os.scandir(self.root))
+        except FileNotFoundError:
+            return
+        for shard in shards:
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if "." not in entry.name:
+                    yield entry.name
+
+    def pack(self) -> int:
+        # moves loose blobs into the pack, each written before being removed
+        packed: int = 0
+        for digest in list(self._loose_digests()):
+            path: str = self.path(digest)
+            with open(path, "rb") as in_f:
+                data: bytes = in_f.read()
+            with self.connection as connection:
+                connection.execute(
+                    "INSERT OR IGNORE INTO blobs VALUES (?, ?, ?)",
+                    (digest, data, self._loose_stored_ms(digest)),
+                )
+            os.remove(path)
+            packed += 1
+        if packed:
+            log.info(f"Packed {packed} loose blobs into {self.pack_file}.")
+        return packed
+
+    def delete(
+        self, digests: Iterable[str], stored_before_ms: int = MAX_STORED_MS
+    ) -> int:
+        # spares the blobs stored again since stored_before_ms: a snapshot
+        # being written may reference them
+        deleted: int = 0
+        for digest in digests:
+            self._cache.invalidate(digest)
+            with self.connection as connection:
+                deleted += connection.execute(
+                    "DELETE FROM blobs WHERE digest = ? AND stored_ms < ?",
+                    (digest, stored_before_ms),
+                ).rowcount
+            if self._loose_stored_ms(digest) >= stored_before_ms:
+                continue
+            try:
+                os.remove(self.path(digest))
+                deleted += 1
+            except FileNotFoundError:
+                pass
+        return deleted
+
+
+blob_store = BlobStore()
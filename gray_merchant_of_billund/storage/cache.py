@@ -0,0 +1,80 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, NamedTuple, Optional, Tuple
+
+
+class CacheStats(NamedTuple):
+    hits: int
+    misses: int
+    items: int
+    size: int
+
+
+class LRUCache:
+    # Bounded both in number of items and in total size. Every entry is
+    # stored with a version (e.g. a file inode and mtime): a lookup with a
+    # different version is a miss, and drops the outdated entry.
+    def __init__(self, max_items: int, max_size: int):
+        self.max_items: int = max_items
+        self.max_size: int = max_size
+        self.hits: int = 0
+        self.misses: int = 0
+        self.size: int = 0
+        self._entries: "OrderedDict[Hashable, Tuple[Hashable, Any, int]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, version: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                if entry is not None:
+                    self._pop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(
+        self, key: Hashable, version: Hashable, value: Any, size: int
+    ) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            if size > self.max_size:
+                return
+            self._entries[key] = (version, value, size)
+            self.size += size
+            while (
+                len(self._entries) > self.max_items
+                or self.size > self.max_size
+            ):
+                self._pop(next(iter(self._entries)))
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            self.hits = 0
+            self.misses = 0
+
+    @property
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                self.hits, self.misses, len(self._entries), self.size
+            )
+
+    def _pop(self, key: Hashable) -> None:
+        _, _, size = self._entries.pop(key)
+        self.size -= size
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,223 @@
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+    TypeVar,
+)
+
+from gray_merchant_of_billund.constants.gmob import BLOB_SWEEP_GRACE_PERIOD
+from gray_merchant_of_billund.model.bricklink_price import (
+    BricklinkAggregateSoldMonth,
+    PriceGuide,
+)
+from gray_merchant_of_billund.model.bricklink_set import BricklinkSet
+from gray_merchant_of_billund.storage.backend import (
+    ExpirableBackend,
+    get_backend,
+)
+from gray_merchant_of_billund.storage.blobs import BlobStore, blob_store
+from gray_merchant_of_billund.storage.expirable import Expirable
+from gray_merchant_of_billund.storage.price_history import MONTH_NUMBERS
+from gray_merchant_of_billund.storage.serializer import (
+    blob_references,
+    dumps,
+    loads,
+)
+from gray_merchant_of_billund.utils.log import get_logger
+from gray_merchant_of_billund.utils.time import DAY, MONTH, WEEK, now
+
+log = get_logger()
+TExpirable = TypeVar("TExpirable", bound=Expirable)
+# merges the snapshots being dropped (oldest first) into the one kept
+Merge = Callable[[TExpirable, Sequence[TExpirable]], None]
+
+
+class RetentionTier(NamedTuple):
+    # snapshots older than min_age_ms keep one snapshot per interval_ms
+    min_age_ms: int
+    interval_ms: int
+
+
+class CompactionStats(NamedTuple):
+    kept: int
+    merged: int
+    dropped: int
+
+
+# keep everything for 30 days, then one snapshot per week, then per month
+DEFAULT_RETENTION_POLICY: Sequence[RetentionTier] = (
+    RetentionTier(30 * DAY, WEEK),
+    RetentionTier(6 * MONTH, MONTH),
+)
+
+
+def retention_plan(
+    creation_dates: Sequence[int],
+    policy: Sequence[RetentionTier] = DEFAULT_RETENTION_POLICY,
+    now_ms: Optional[int] = None,
+) -> Dict[int, List[int]]:
+    # kept creation date -> the older creation dates it replaces. Buckets
+    # are aligned to the epoch, so that compacting again changes nothing,
+    # and the latest snapshot of each bucket is kept.
+    now_ms = now_ms or now()
+    tiers: List[RetentionTier] = sorted(policy, reverse=True)
+    buckets: Dict[Tuple[int, int], List[int]] = {}
+    for creation_date_ms in sorted(creation_dates):
+        tier: Optional[RetentionTier] = next(
+            (t for t in tiers if now_ms - creation_date_ms >= t.min_age_ms),
+            None,
+        )
+        if tier is None:
+            buckets[(0, creation_date_ms)] = [creation_date_ms]
+            continue
+        bucket = (tier.interval_ms, creation_date_ms // tier.interval_ms)
+        buckets.setdefault(bucket, []).append(creation_date_ms)
+    return {dates[-1]: dates[:-1] for dates in buckets.values()}
+
+
+def merge_sold_months(
+    bricklink_set: BricklinkSet, dropped: Sequence[BricklinkSet]
+) -> None:
+    # months only reported by dropped snapshots move to the kept one. Like
+    # the monthly recaps, the month sold the most times wins, and on ties
+    # the oldest snapshot's one.
+    price_guides: List[Tuple[PriceGuide, List[PriceGuide]]] = [
+        (
+            bricklink_set.price_guide,
+            [dropped_set.price_guide for dropped_set in dropped],
+        )
+    ]
+    if bricklink_set.price_guide_box is not bricklink_set.price_guide:
+        price_guides.append(
+            (
+                bricklink_set.price_guide_box,
+                [dropped_set.price_guide_box for dropped_set in dropped],
+            )
+        )
+    for price_guide, dropped_price_guides in price_guides:
+        price_guide.details_last_6_months_new = _merge_months(
+            [p.details_last_6_months_new for p in dropped_price_guides]
+            + [price_guide.details_last_6_months_new]
+        )
+        price_guide.details_last_6_months_used = _merge_months(
+            [p.details_last_6_months_used for p in dropped_price_guides]
+            + [price_guide.details_last_6_months_used]
+        )
+
+
+def _merge_months(
+    months_lists: Sequence[Optional[Sequence[BricklinkAggregateSoldMonth]]],
+) -> Optional[List[BricklinkAggregateSoldMonth]]:
+    if all(months is None for months in months_lists):
+        return None
+    best: Dict[Tuple[int, int], BricklinkAggregateSoldMonth] = {}
+    for months in months_lists:
+        for month in months or []:
+            key: Tuple[int, int] = (
+                int(month.year),
+                MONTH_NUMBERS[month.month],
+            )
+            if key not in best or month.times_sold > best[key].times_sold:
+                best[key] = month
+    # most recent first, like the Bricklink price guide page
+    return [best[key] for key in sorted(best, reverse=True)]
+
+
+MERGES: Dict[Type[Expirable], Merge] = {BricklinkSet: merge_sold_months}
+
+
+def compact(
+    cls: Type[TExpirable],
+    store_key: str,
+    policy: Sequence[RetentionTier] = DEFAULT_RETENTION_POLICY,
+    dry_run: bool = False,
+    backend: Optional[ExpirableBackend] = None,
+) -> CompactionStats:
+    # The latest snapshot is never rewritten nor deleted, and indexers only
+    # ever add newer ones: compacting is safe while they run. Kept snapshots
+    # are atomically rewritten before the ones merged into them are deleted,
+    # so an interrupted compaction loses nothing.
+    backend = backend or get_backend()
+    creation_dates: List[int] = backend.creation_dates(cls, store_key)[:-1]
+    merge: Optional[Merge] = MERGES.get(cls)
+    plan: Dict[int, List[int]] = retention_plan(creation_dates, policy)
+    merged: int = 0
+    dropped: int = 0
+    for kept_ms, dropped_dates in plan.items():
+        if not dropped_dates:
+            continue
+        if dry_run:
+            merged += 1
+            dropped += len(dropped_dates)
+            continue
+        if merge is not None:
+            kept: Optional[TExpirable] = _read(
+                backend, cls, store_key, kept_ms
+            )
+            if kept is None:
+                continue
+            merge(
+                kept,
+                [
+                    item
+                    for item in (
+                        _read(backend, cls, store_key, dropped_ms)
+                        for dropped_ms in dropped_dates
+                    )
+                    if item is not None
+                ],
+            )
+            backend.replace(cls, store_key, kept_ms, dumps(kept))
+        for dropped_ms in dropped_dates:
+            backend.delete(cls, store_key, dropped_ms)
+        merged += 1
+        dropped += len(dropped_dates)
+    stats = CompactionStats(len(plan) - merged, merged, dropped)
+    log.debug(f"Compacted {cls.__name__} {store_key}: {stats}.")
+    return stats
+
+
+def _read(
+    backend: ExpirableBackend,
+    cls: Type[TExpirable],
+    store_key: str,
+    creation_date_ms: int,
+) -> Optional[TExpirable]:
+    data: Optional[bytes] = backend.read(cls, store_key, creation_date_ms)
+    return loads(data) if data is not None else None
+
+
+def sweep_blobs(
+    classes: Iterable[Type[Expirable]],
+    dry_run: bool = False,
+    backend: Optional[ExpirableBackend] = None,
+    blobs: Optional[BlobStore] = None,
+) -> int:
+    # Deletes the blobs no snapshot of classes references anymore, e.g. the
+    # months of snapshots dropped by compact(). Safe while indexers are
+    # writing: a snapshot stores its blobs before being written, so only
+    # the blobs stored before the grace period are candidates, and the
+    # ones stored again meanwhile are spared by delete().
+    backend = backend or get_backend()
+    blobs = blobs or blob_store
+    stored_before_ms: int = now() - BLOB_SWEEP_GRACE_PERIOD * 1000
+    unreferenced: Set[str] = set(blobs.digests(stored_before_ms))
+    for cls in classes:
+        for store_key in backend.store_keys(cls):
+            for creation_date_ms in backend.creation_dates(cls, store_key):
+                data: Optional[bytes] = backend.read(
+                    cls, store_key, creation_date_ms
+                )
+                if data is not None:
+                    unreferenced -= blob_references(data)
+    if not dry_run:
+        blobs.delete(unreferenced, stored_before_ms)
+    log.debug(f"Swept {len(unreferenced)} unreferenced blobs.")
+    return len(unreferenced)
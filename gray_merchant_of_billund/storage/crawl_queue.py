@@ -0,0 +1,235 @@
+import os
+import sqlite3
+from enum import Enum
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from gray_merchant_of_billund.constants.gmob import (
+    CRAWL_MAX_ATTEMPTS,
+    CRAWL_QUEUE_FILE,
+    CRAWL_RETRY_TIMEOUT,
+)
+from gray_merchant_of_billund.utils.log import get_logger
+from gray_merchant_of_billund.utils.time import SECOND, now
+
+log = get_logger()
+
+# Durable work queues of store keys, one per crawl, in a single SQLite file.
+# Every state change is committed right away: a crawl killed at any point
+# resumes from the item it was working on. One crawler per queue.
+
+
+class CrawlState(Enum):
+    PENDING = "pending"
+    IN_PROGRESS = "in_progress"
+    DONE = "done"
+    FAILED = "failed"  # gave up after max_attempts
+
+
+class CrawlQueue:
+    def __init__(
+        self,
+        queue: str,
+        db_file: str = CRAWL_QUEUE_FILE,
+        max_attempts: int = CRAWL_MAX_ATTEMPTS,
+    ):
+        self.queue: str = queue
+        self.db_file: str = db_file
+        self.max_attempts: int = max_attempts
+        os.makedirs(Path(db_file).parent, exist_ok=True)
+        # autocommit: transactions are explicit
+        self.connection = sqlite3.connect(
+            db_file, timeout=60, isolation_level=None
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS items ("
+            "queue TEXT NOT NULL, "
+            "position INTEGER NOT NULL, "
+            "store_key TEXT NOT NULL, "
+            "state TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, "
+            "next_attempt_ms INTEGER NOT NULL DEFAULT 0, "
+            "last_error TEXT, "
+            "updated_ms INTEGER NOT NULL, "
+            "PRIMARY KEY (queue, store_key))"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS items_next ON items "
+            "(queue, state, next_attempt_ms, position)"
+        )
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self) -> "CrawlQueue":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def enqueue(self, store_keys: Iterable[str]) -> int:
+        # keys already queued keep their state and position
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            (position,) = self.connection.execute(
+                "SELECT COALESCE(MAX(position), -1) + 1 FROM items "
+                "WHERE queue = ?",
+                (self.queue,),
+            ).fetchone()
+            added: int = 0
+            for store_key in store_keys:
+                cursor = self.connection.execute(
+                    "INSERT OR IGNORE INTO items "
+                    "(queue, position, store_key, state, updated_ms) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (
+                        self.queue,
+                        position + added,
+                        store_key,
+                        CrawlState.PENDING.value,
+                        now(),
+                    ),
+                )
+                added += cursor.rowcount
+        return added
+
+    def resume(self) -> int:
+        # items left in progress by an interrupted crawl are retried first
+        with self.connection:
+            cursor = self.connection.execute(
+                "UPDATE items SET state = ?, next_attempt_ms = 0 "
+                "WHERE queue = ? AND state = ?",
+                (
+                    CrawlState.PENDING.value,
+                    self.queue,
+                    CrawlState.IN_PROGRESS.value,
+                ),
+            )
+        return cursor.rowcount
+
+    def claim(self) -> Optional[str]:
+        # the next pending item due, in queue order
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            row = self.connection.execute(
+                "SELECT store_key FROM items "
+                "WHERE queue = ? AND state = ? AND next_attempt_ms <= ? "
+                "ORDER BY next_attempt_ms, position LIMIT 1",
+                (self.queue, CrawlState.PENDING.value, now()),
+            ).fetchone()
+            if row is None:
+                return None
+            self._set(row[0], CrawlState.IN_PROGRESS)
+        return row[0]
+
+    def next_attempt_ms(self) -> Optional[int]:
+        # when the next pending item is due, if any
+        (next_attempt_ms,) = self.connection.execute(
+            "SELECT MIN(next_attempt_ms) FROM items "
+            "WHERE queue = ? AND state = ?",
+            (self.queue, CrawlState.PENDING.value),
+        ).fetchone()
+        return next_attempt_ms
+
+    def complete(self, store_key: str) -> None:
+        with self.connection:
+            self._set(store_key, CrawlState.DONE)
+
+    def fail(self, store_key: str, error: str) -> CrawlState:
+        # retried with an exponential backoff, until max_attempts
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            (attempts,) = self.connection.execute(
+                "SELECT attempts + 1 FROM items "
+                "WHERE queue = ? AND store_key = ?",
+                (self.queue, store_key),
+            ).fetchone()
+            state: CrawlState = (
+                CrawlState.FAILED
+                if attempts >= self.max_attempts
+                else CrawlState.PENDING
+            )
+            self._set(
+                store_key,
+                state,
+                attempts=attempts,
+                next_attempt_ms=now()
+                + CRAWL_RETRY_TIMEOUT * SECOND * 2 ** (attempts - 1),
+                last_error=error,
+            )
+        return state
+
+    def postpone(self, store_key: str, delay_ms: int) -> None:
+        # back to pending without an attempt: it wasn't the item's fault
+        with self.connection:
+            self._set(
+                store_key, CrawlState.PENDING, next_attempt_ms=now() + delay_ms
+            )
+
+    def requeue(self, store_keys: Iterable[str]) -> int:
+        # done items back to pending, e.g. once their data has expired
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            requeued: int = 0
+            for store_key in store_keys:
+                requeued += self.connection.execute(
+                    "UPDATE items SET state = ?, attempts = 0, "
+                    "next_attempt_ms = 0, updated_ms = ? "
+                    "WHERE queue = ? AND store_key = ? AND state = ?",
+                    (
+                        CrawlState.PENDING.value,
+                        now(),
+                        self.queue,
+                        store_key,
+                        CrawlState.DONE.value,
+                    ),
+                ).rowcount
+        return requeued
+
+    def store_keys(self, state: CrawlState) -> List[str]:
+        return [
+            row[0]
+            for row in self.connection.execute(
+                "SELECT store_key FROM items WHERE queue = ? AND state = ? "
+                "ORDER BY position",
+                (self.queue, state.value),
+            )
+        ]
+
+    def retry_failed(self) -> int:
+        with self.connection:
+            cursor = self.connection.execute(
+                "UPDATE items SET state = ?, attempts = 0, next_attempt_ms = 0 "
+                "WHERE queue = ? AND state = ?",
+                (
+                    CrawlState.PENDING.value,
+                    self.queue,
+                    CrawlState.FAILED.value,
+                ),
+            )
+        return cursor.rowcount
+
+    def clear(self) -> None:
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM items WHERE queue = ?", (self.queue,)
+            )
+
+    def counts(self) -> Dict[CrawlState, int]:
+        counts: Dict[CrawlState, int] = {state: 0 for state in CrawlState}
+        for state, count in self.connection.execute(
+            "SELECT state, COUNT(*) FROM items WHERE queue = ? GROUP BY state",
+            (self.queue,),
+        ):
+            counts[CrawlState(state)] = count
+        return counts
+
+    def _set(self, store_key: str, state: CrawlState, **columns) -> None:
+        columns["state"] = state.value
+        columns["updated_ms"] = now()
+        self.connection.execute(
+            f"UPDATE items SET {', '.join(f'{c} = ?' for c in columns)} "
+            "WHERE queue = ? AND store_key = ?",
+            (*columns.values(), self.queue, store_key),
+        )
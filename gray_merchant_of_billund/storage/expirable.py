@@ -1,20 +1,56 @@
-import errno
+import copy
 import os
-import pickle
 from abc import abstractmethod
-from glob import glob
-from pathlib import Path
-from typing import List, Optional, Type, TypeVar
+from collections import deque
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from functools import partial
+from typing import (
+    Callable,
+    Deque,
+    Generator,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+)
 
+from gray_merchant_of_billund.constants.gmob import (
+    EXPIRABLE_CACHE_MAX_ITEMS,
+    EXPIRABLE_CACHE_MAX_SIZE,
+)
+from gray_merchant_of_billund.storage.backend import (
+    ExpirableBackend,
+    SnapshotStat,
+    get_backend,
+)
+from gray_merchant_of_billund.storage.cache import CacheStats, LRUCache
+from gray_merchant_of_billund.storage.lock import key_lock
+from gray_merchant_of_billund.storage.manifest import (
+    ManifestEntry,
+    update_manifest,
+)
 from gray_merchant_of_billund.storage.saveable import Saveable
+from gray_merchant_of_billund.storage.serializer import dumps, loads
 from gray_merchant_of_billund.utils.log import get_logger
 from gray_merchant_of_billund.utils.time import now, pretty_str
 
 log = get_logger()
 TExpirable = TypeVar("TExpirable", bound="Expirable")
+# deserialized latest snapshots, keyed by store path
+load_cache = LRUCache(EXPIRABLE_CACHE_MAX_ITEMS, EXPIRABLE_CACHE_MAX_SIZE)
 
 
 class Expirable(Saveable):
+    # served past its time to live, while refreshed in the background
+    stale: bool = False
+
     @property
     @abstractmethod
     def creation_date_ms(self) -> int:
@@ -32,71 +68,184 @@ class Expirable(Saveable):
         )
 
     def save(self) -> None:
-        log.debug(f"Saving item to {self.store_path}...")
-        expirable_dir = Path(self.store_path).parent.as_posix()
-        os.makedirs(expirable_dir, exist_ok=True)
-        with open(self.store_path, "wb") as out_f:
-            pickle.dump(self, out_f)
-        log.debug(f"Saved item to {self.store_path}.")
-        # make a symlink for fast retrieval
-        latest = (Path(expirable_dir) / "latest.pkl").as_posix()
-        log.debug(f"Making latest symlink to {latest}...")
-        try:
-            os.remove(latest)
-        except OSError as exc:
-            if exc.errno != errno.ENOENT:
-                raise exc
-        os.symlink(self.store_path, latest)
-        log.debug(f"Made latest symlink to {latest}.")
+        data: bytes = dumps(self)
+        get_backend().write(
+            type(self), self.store_key, self.creation_date_ms, data
+        )
+        update_manifest(
+            type(self),
+            self.store_key,
+            ManifestEntry.of(self.creation_date_ms, data),
+        )
 
 
 def load(
     cls: Type[TExpirable], store_key: str, time_to_live_ms: Optional[int]
 ) -> Optional[TExpirable]:
-    store_path: str = Expirable.build_store_path(
-        cls.store_dir(),
-        "latest",
-        store_sub_dir=store_key,
+    backend = get_backend()
+    stat: Optional[SnapshotStat] = backend.stat_latest(cls, store_key)
+    if stat is None:
+        log.debug(f"Missing item {store_key}.")
+        return None
+    item: Optional[TExpirable] = load_cache.get(stat.store_path, stat.version)
+    if item is None:
+        data: Optional[bytes] = backend.read_latest(cls, store_key)
+        if data is None:
+            return None
+        try:
+            item = loads(data)
+        except Exception:
+            log.exception(f"Unable to load item {store_key}. Ignoring hit.")
+            return None
+        load_cache.put(stat.store_path, stat.version, item, len(data))
+    # Every caller gets its own copy of the cached item: setting attributes
+    # (e.g. correcting a field) doesn't leak into later loads. Nested
+    # objects (e.g. price guides) are still shared: don't mutate them.
+    item = copy.copy(item)
+    if (
+        time_to_live_ms is not None
+        and item
+        and item.is_expired(time_to_live_ms)
+    ):
+        log.debug(f"Expired cache for {item}. Ignoring hit.")
+        item = None
+    return item
+
+
+def load_or_build(
+    cls: Type[TExpirable],
+    store_key: str,
+    time_to_live_ms: Optional[int],
+    build: Callable[[], TExpirable],
+) -> Tuple[TExpirable, bool]:
+    # Single flight across processes: one builds and saves a missing or
+    # expired item, the others wait for it and load it. Returns the item,
+    # and whether it was built here.
+    with key_lock(cls, store_key):
+        item: Optional[TExpirable] = load(cls, store_key, time_to_live_ms)
+        if item is not None:
+            return item, False
+        item = build()
+        item.save()
+        return item, True
+
+
+def load_as_of(
+    cls: Type[TExpirable], store_key: str, timestamp_ms: int
+) -> Optional[TExpirable]:
+    # the snapshot that was the latest one at timestamp_ms
+    backend = get_backend()
+    creation_date_ms: Optional[int] = backend.creation_date_as_of(
+        cls, store_key, timestamp_ms
     )
-    log.debug(f"Loading item from {store_path}...")
-    os.makedirs(cls.store_dir(), exist_ok=True)
-    item: Optional[TExpirable] = None
-    try:
-        with open(store_path, "rb") as in_f:
-            item = pickle.load(in_f)
-            log.debug(f"Loaded item from {store_path}.")
-            if (
-                time_to_live_ms is not None
-                and item
-                and item.is_expired(time_to_live_ms)
-            ):
-                log.debug(f"Expired cache for {item}. Ignoring hit.")
-                item = None
-    except FileNotFoundError:
-        log.debug(f"Missing item {store_path}.")
-    finally:
-        return item
+    if creation_date_ms is None:
+        log.debug(
+            f"Missing item {store_key} as of {pretty_str(timestamp_ms)}."
+        )
+        return None
+    return _load_snapshot(backend, cls, store_key, creation_date_ms)
 
 
 def load_all(
     cls: Type[TExpirable],
     store_key: str,
 ) -> List[TExpirable]:
-    store_path: str = Expirable.build_store_path(
-        cls.store_dir(),
-        "*",
-        store_sub_dir=store_key,
+    backend = get_backend()
+    return [
+        item
+        for item in (
+            _load_snapshot(backend, cls, store_key, creation_date_ms)
+            for creation_date_ms in backend.creation_dates(cls, store_key)
+        )
+        if item is not None
+    ]
+
+
+def load_recent(
+    cls: Type[TExpirable], store_key: str, count: int
+) -> List[TExpirable]:
+    # the latest count snapshots, oldest first
+    backend = get_backend()
+    return [
+        item
+        for item in (
+            _load_snapshot(backend, cls, store_key, creation_date_ms)
+            for creation_date_ms in backend.creation_dates(cls, store_key)[
+                -count:
+            ]
+        )
+        if item is not None
+    ]
+
+
+def load_many(
+    cls: Type[TExpirable],
+    store_keys: Iterable[str],
+    max_workers: Optional[int] = None,
+    use_processes: bool = False,
+) -> Generator[TExpirable, None, None]:
+    # Yields every snapshot of every store key, ordered by creation date.
+    # Snapshots are listed without being deserialized, then deserialized on
+    # a pool, keeping only a bounded window of them ahead of the consumer.
+    backend = get_backend()
+    workers: int = max_workers or os.cpu_count() or 1
+    keys: List[str] = list(store_keys)
+    with ThreadPoolExecutor(workers) as lister:
+        keys_creation_dates: List[List[int]] = list(
+            lister.map(partial(backend.creation_dates, cls), keys)
+        )
+    snapshots: List[Tuple[int, str]] = sorted(
+        (creation_date_ms, store_key)
+        for store_key, creation_dates in zip(keys, keys_creation_dates)
+        for creation_date_ms in creation_dates
     )
-    log.debug(f"Loading items from {store_path}...")
-    os.makedirs(cls.store_dir(), exist_ok=True)
-    items: List[TExpirable] = []
-    for store_path in (
-        f for f in glob(store_path) if not f.endswith("latest.pkl")
-    ):
-        try:
-            with open(store_path, "rb") as in_f:
-                items.append(pickle.load(in_f))
-                log.debug(f"Loaded item from {store_path}.")
-        except FileNotFoundError:
-            log.debug(f"Missing item {store_path}.")
-    return items
+    executor: Executor = (
+        ProcessPoolExecutor(workers)
+        if use_processes
+        else ThreadPoolExecutor(workers)
+    )
+    with executor:
+        pending: Deque[Future] = deque()
+        for creation_date_ms, store_key in snapshots:
+            pending.append(
+                executor.submit(
+                    _load_snapshot, backend, cls, store_key, creation_date_ms
+                )
+            )
+            if len(pending) < 4 * workers:
+                continue
+            item: Optional[TExpirable] = pending.popleft().result()
+            if item is not None:
+                yield item
+        while pending:
+            item = pending.popleft().result()
+            if item is not None:
+                yield item
+
+
+def _load_snapshot(
+    backend: ExpirableBackend,
+    cls: Type[TExpirable],
+    store_key: str,
+    creation_date_ms: int,
+) -> Optional[TExpirable]:
+    # like load(): a snapshot that doesn't deserialize is skipped
+    data: Optional[bytes] = backend.read(cls, store_key, creation_date_ms)
+    if data is None:
+        return None
+    try:
+        return loads(data)
+    except Exception:
+        log.exception(
+            f"Unable to load item {store_key} at {creation_date_ms}. "
+            f"Skipping."
+        )
+        return None
+
+
+def load_cache_stats() -> CacheStats:
+    return load_cache.stats
+
+
+def clear_load_cache() -> None:
+    load_cache.clear()
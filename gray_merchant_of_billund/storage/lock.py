@@ -0,0 +1,39 @@
+import os
+from contextlib import contextmanager
+from typing import Generator, Type
+
+from gray_merchant_of_billund.constants.gmob import LOCK_DIR
+from gray_merchant_of_billund.storage.saveable import Saveable
+from gray_merchant_of_billund.utils.log import get_logger
+from gray_merchant_of_billund.utils.path import posix_path
+
+try:
+    import fcntl
+except ImportError:  # not on Windows: no cross-process locking there
+    fcntl = None  # type: ignore
+
+log = get_logger()
+
+# Advisory locks shared by every process using the same cache. flock()
+# locks belong to an open file, so they also exclude threads of the same
+# process. Lock files are never deleted: deleting one while another
+# process waits on it would let a third one lock a new file meanwhile.
+
+
+@contextmanager
+def file_lock(name: str) -> Generator[None, None, None]:
+    if fcntl is None:
+        yield
+        return
+    lock_path: str = posix_path(LOCK_DIR, f"{name}.lock")
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    with open(lock_path, "a") as lock_f:
+        fcntl.flock(lock_f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_f, fcntl.LOCK_UN)
+
+
+def key_lock(cls: Type[Saveable], store_key: str):
+    return file_lock(posix_path(cls.__name__, store_key))
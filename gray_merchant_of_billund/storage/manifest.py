@@ -0,0 +1,219 @@
+import json
+import os
+import zlib
+from collections import Counter
+from enum import Enum
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Type
+
+from gray_merchant_of_billund.storage.backend import (
+    ExpirableBackend,
+    get_backend,
+)
+from gray_merchant_of_billund.storage.lock import file_lock
+from gray_merchant_of_billund.storage.saveable import Saveable
+from gray_merchant_of_billund.utils.log import get_logger
+from gray_merchant_of_billund.utils.path import posix_path
+from gray_merchant_of_billund.utils.time import now
+
+log = get_logger()
+
+# A per-class store_key -> latest snapshot summary, so that TTL checks for a
+# whole index take one small read instead of unpickling every snapshot.
+# Saves append their entry to a log next to it, merged on read, and into
+# the manifest itself once the log has MANIFEST_LOG_MAX_ENTRIES entries.
+
+MANIFEST_FILE_NAME = "manifest.json"
+MANIFEST_LOG_FILE_NAME = "manifest.log"
+MANIFEST_LOG_MAX_ENTRIES = 1024
+
+
+class ExpiryStatus(Enum):
+    HIT = "hit"
+    EXPIRED = "expired"
+    MISS = "miss"
+
+
+class ManifestEntry(NamedTuple):
+    creation_date_ms: int
+    size: int
+    checksum: int
+
+    @staticmethod
+    def of(creation_date_ms: int, data: bytes) -> "ManifestEntry":
+        return ManifestEntry(creation_date_ms, len(data), zlib.crc32(data))
+
+    def is_expired(self, time_to_live_ms: int) -> bool:
+        return self.creation_date_ms + time_to_live_ms < now()
+
+
+Manifest = Dict[str, ManifestEntry]
+
+
+def manifest_path(
+    cls: Type[Saveable], backend: Optional[ExpirableBackend] = None
+) -> str:
+    return posix_path(
+        (backend or get_backend()).manifest_dir(cls), MANIFEST_FILE_NAME
+    )
+
+
+def manifest_log_path(
+    cls: Type[Saveable], backend: Optional[ExpirableBackend] = None
+) -> str:
+    return posix_path(
+        (backend or get_backend()).manifest_dir(cls), MANIFEST_LOG_FILE_NAME
+    )
+
+
+def manifest_lock(cls: Type[Saveable]):
+    return file_lock(f"{cls.__name__}.manifest")
+
+
+def read_manifest(
+    cls: Type[Saveable], backend: Optional[ExpirableBackend] = None
+) -> Optional[Manifest]:
+    # the manifest as last written, without the log
+    try:
+        with open(manifest_path(cls, backend), "r") as in_f:
+            raw: Dict[str, list] = json.load(in_f)
+    except FileNotFoundError:
+        return None
+    return {
+        store_key: ManifestEntry(*entry) for store_key, entry in raw.items()
+    }
+
+
+def read_manifest_log(
+    cls: Type[Saveable], backend: Optional[ExpirableBackend] = None
+) -> List[Tuple[str, ManifestEntry]]:
+    entries: List[Tuple[str, ManifestEntry]] = []
+    try:
+        with open(manifest_log_path(cls, backend), "r") as in_f:
+            for line in in_f:
+                try:
+                    store_key, *entry = json.loads(line)
+                except ValueError:
+                    continue  # cut short by a crash
+                entries.append((store_key, ManifestEntry(*entry)))
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def write_manifest(
+    cls: Type[Saveable],
+    manifest: Manifest,
+    backend: Optional[ExpirableBackend] = None,
+) -> None:
+    # replaces the manifest, and the log with it: hold manifest_lock(cls)
+    path: str = manifest_path(cls, backend)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path: str = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as out_f:
+        json.dump(
+            {store_key: list(entry) for store_key, entry in manifest.items()},
+            out_f,
+        )
+    os.replace(tmp_path, path)
+    try:
+        os.remove(manifest_log_path(cls, backend))
+    except FileNotFoundError:
+        pass
+
+
+def build_manifest(cls: Type[Saveable], backend: ExpirableBackend) -> Manifest:
+    log.info(f"Building {cls.__name__} manifest...")
+    manifest: Manifest = {}
+    for store_key in backend.store_keys(cls):
+        creation_dates = backend.creation_dates(cls, store_key)
+        data: Optional[bytes] = backend.read_latest(cls, store_key)
+        if not creation_dates or data is None:
+            continue
+        manifest[store_key] = ManifestEntry.of(creation_dates[-1], data)
+    log.info(f"Built {cls.__name__} manifest ({len(manifest)} items).")
+    return manifest
+
+
+def get_manifest(
+    cls: Type[Saveable], backend: Optional[ExpirableBackend] = None
+) -> Manifest:
+    backend = backend or get_backend()
+    # under the lock: never between a compaction and the removal of its log
+    with manifest_lock(cls):
+        manifest: Optional[Manifest] = read_manifest(cls, backend)
+        if manifest is None:
+            # snapshots saved before the manifest existed are indexed once
+            manifest = build_manifest(cls, backend)
+            write_manifest(cls, manifest, backend)
+            return manifest
+        entries: List[Tuple[str, ManifestEntry]] = read_manifest_log(
+            cls, backend
+        )
+        for store_key, entry in entries:
+            latest: Optional[ManifestEntry] = manifest.get(store_key)
+            # e.g. a snapshot rewritten in place replaces its entry
+            if (
+                latest is None
+                or latest.creation_date_ms <= entry.creation_date_ms
+            ):
+                manifest[store_key] = entry
+        if len(entries) >= MANIFEST_LOG_MAX_ENTRIES:
+            write_manifest(cls, manifest, backend)
+    return manifest
+
+
+def update_manifest(
+    cls: Type[Saveable], store_key: str, entry: ManifestEntry
+) -> None:
+    # an append: older entries than the latest one are dropped on read
+    path: str = manifest_log_path(cls)
+    with manifest_lock(cls):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a") as out_f:
+            out_f.write(json.dumps([store_key, *entry]) + "\n")
+
+
+def expiry_status(
+    manifest: Manifest, store_key: str, time_to_live_ms: Optional[int]
+) -> ExpiryStatus:
+    entry: Optional[ManifestEntry] = manifest.get(store_key)
+    if entry is None:
+        return ExpiryStatus.MISS
+    if time_to_live_ms is not None and entry.is_expired(time_to_live_ms):
+        return ExpiryStatus.EXPIRED
+    return ExpiryStatus.HIT
+
+
+def expiry_statuses(
+    cls: Type[Saveable],
+    store_keys: Iterable[str],
+    time_to_live_ms: Optional[int],
+) -> Dict[str, ExpiryStatus]:
+    manifest: Manifest = get_manifest(cls)
+    statuses: Dict[str, ExpiryStatus] = {
+        store_key: expiry_status(manifest, store_key, time_to_live_ms)
+        for store_key in store_keys
+    }
+    counter = Counter(status.value for status in statuses.values())
+    log.info(f"{cls.__name__} cache: {dict(counter)}")
+    return statuses
+
+
+def expiring_soon(
+    cls: Type[Saveable],
+    store_keys: Iterable[str],
+    time_to_live_ms: int,
+    horizon_ms: int,
+) -> List[str]:
+    # missing items and the ones expiring within horizon_ms, the ones that
+    # expire first first
+    manifest: Manifest = get_manifest(cls)
+    deadline_ms: int = now() + horizon_ms - time_to_live_ms
+    due: Dict[str, int] = {}
+    for store_key in store_keys:
+        entry: Optional[ManifestEntry] = manifest.get(store_key)
+        if entry is None:
+            due[store_key] = 0
+        elif entry.creation_date_ms < deadline_ms:
+            due[store_key] = entry.creation_date_ms
+    return sorted(due, key=due.__getitem__)
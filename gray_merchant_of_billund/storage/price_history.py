@@ -0,0 +1,337 @@
+import calendar
+import os
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from gray_merchant_of_billund.constants.gmob import (
+    PRICE_HISTORY_FILE,
+    PRICE_HISTORY_LOG_MAX_SIZE,
+)
+from gray_merchant_of_billund.model.bricklink_price import (
+    BricklinkAggregateSoldMonth,
+    PriceGuide,
+)
+from gray_merchant_of_billund.storage.lock import file_lock
+from gray_merchant_of_billund.utils.log import get_logger
+
+log = get_logger()
+
+# Materialized (set_num, year, month, condition) monthly sold aggregates,
+# stored as NumPy columns. For each month only the aggregate with the most
+# sales across all the snapshots of a set is kept. Saves append their rows
+# to a log next to the table, merged on read, and into the table once the
+# log outgrows PRICE_HISTORY_LOG_MAX_SIZE (or by build_price_history).
+COLUMNS: Dict[str, np.dtype] = {
+    "set_num": np.dtype("U32"),
+    "year": np.dtype("int16"),
+    "month": np.dtype("int8"),
+    "condition": np.dtype("U1"),
+    "times_sold": np.dtype("int32"),
+    "qty_avg_price": np.dtype("float64"),
+    "min_price": np.dtype("float64"),
+    "max_price": np.dtype("float64"),
+}
+NEW = "N"
+USED = "U"
+MONTH_NUMBERS: Dict[str, int] = {
+    name: number for number, name in enumerate(calendar.month_name) if name
+}
+
+Row = Tuple[str, int, int, str, int, float, float, float]
+RowKey = Tuple[str, int, int, str]
+
+
+class PriceHistoryMark(NamedTuple):
+    # the table (st_ino, st_mtime_ns) and the log size as a rebuild started
+    table_version: Optional[Tuple[int, int]]
+    log_size: int
+
+
+class PriceHistory:
+    def __init__(self, columns: Optional[Dict[str, np.ndarray]] = None):
+        self.columns: Dict[str, np.ndarray] = columns or {
+            name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.columns["set_num"])
+
+    def rows(self, mask: Optional[np.ndarray] = None) -> List[Row]:
+        columns = [
+            self.columns[name] if mask is None else self.columns[name][mask]
+            for name in COLUMNS
+        ]
+        return [
+            (
+                str(set_num),
+                int(year),
+                int(month),
+                str(condition),
+                int(times_sold),
+                float(qty_avg_price),
+                float(min_price),
+                float(max_price),
+            )
+            for (
+                set_num,
+                year,
+                month,
+                condition,
+                times_sold,
+                qty_avg_price,
+                min_price,
+                max_price,
+            ) in zip(*columns)
+        ]
+
+    def monthly_qty_avg_price(
+        self, set_num: str, condition: str
+    ) -> Dict[Tuple[int, int], float]:
+        mask = (self.columns["set_num"] == set_num) & (
+            self.columns["condition"] == condition
+        )
+        return {
+            (int(year), int(month)): float(price)
+            for year, month, price in zip(
+                self.columns["year"][mask],
+                self.columns["month"][mask],
+                self.columns["qty_avg_price"][mask],
+            )
+        }
+
+    def merge(self, set_num: str, rows: Sequence[Row]) -> "PriceHistory":
+        set_mask = self.columns["set_num"] == set_num
+        merged: List[Row] = _best_rows(self.rows(set_mask), rows)
+        return PriceHistory(
+            {
+                name: np.concatenate(
+                    [
+                        self.columns[name][~set_mask],
+                        np.array(
+                            [row[i] for row in merged], dtype=COLUMNS[name]
+                        ),
+                    ]
+                )
+                for i, name in enumerate(COLUMNS)
+            }
+        )
+
+    def merge_all(self, rows: Sequence[Row]) -> "PriceHistory":
+        # merge() for rows of any set, in a single pass
+        if not rows:
+            return self
+        return _price_history(_best_rows(self.rows(), rows))
+
+
+def _best_rows(*row_groups: Sequence[Row]) -> List[Row]:
+    best: Dict[RowKey, Row] = {}
+    for rows in row_groups:
+        for row in rows:
+            key: RowKey = row[:4]
+            # like max(): on ties, the first seen aggregate wins
+            if key not in best or row[4] > best[key][4]:
+                best[key] = row
+    return sorted(best.values())
+
+
+def _price_history(rows: Sequence[Row]) -> PriceHistory:
+    return PriceHistory(
+        {
+            name: np.array([row[i] for row in rows], dtype=COLUMNS[name])
+            for i, name in enumerate(COLUMNS)
+        }
+    )
+
+
+def price_guide_rows(set_num: str, price_guide: PriceGuide) -> List[Row]:
+    rows: List[Row] = []
+    for condition, months in (
+        (NEW, price_guide.details_last_6_months_new),
+        (USED, price_guide.details_last_6_months_used),
+    ):
+        for asm in months or []:
+            rows.append(_aggregate_sold_month_row(set_num, condition, asm))
+    return rows
+
+
+def _aggregate_sold_month_row(
+    set_num: str, condition: str, asm: BricklinkAggregateSoldMonth
+) -> Row:
+    return (
+        set_num,
+        int(asm.year),
+        MONTH_NUMBERS[asm.month],
+        condition,
+        asm.times_sold,
+        asm.qty_avg_price,
+        asm.min_price,
+        asm.max_price,
+    )
+
+
+def price_history_log_file(price_history_file: str) -> str:
+    return f"{os.path.splitext(price_history_file)[0]}.log"
+
+
+def read_price_history(
+    price_history_file: str = PRICE_HISTORY_FILE,
+) -> PriceHistory:
+    # the table, and the rows logged since it was last written
+    with file_lock(os.path.basename(price_history_file)):
+        return _read_table(price_history_file).merge_all(
+            _read_log(price_history_log_file(price_history_file))
+        )
+
+
+def _read_table(price_history_file: str) -> PriceHistory:
+    log.debug(f"Loading price history from {price_history_file}...")
+    try:
+        with np.load(price_history_file) as npz:
+            return PriceHistory({name: npz[name] for name in COLUMNS})
+    except FileNotFoundError:
+        log.debug(f"Missing price history {price_history_file}.")
+        return PriceHistory()
+
+
+def _read_log(log_file: str) -> List[Row]:
+    rows: List[Row] = []
+    try:
+        with open(log_file, encoding="utf-8") as in_f:
+            for line in in_f:
+                fields: List[str] = line.rstrip("\n").split("\t")
+                if len(fields) != len(COLUMNS):
+                    continue  # cut short by a crash
+                rows.append(
+                    (
+                        fields[0],
+                        int(fields[1]),
+                        int(fields[2]),
+                        fields[3],
+                        int(fields[4]),
+                        float(fields[5]),
+                        float(fields[6]),
+                        float(fields[7]),
+                    )
+                )
+    except FileNotFoundError:
+        pass
+    return rows
+
+
+def price_history_mark(
+    price_history_file: str = PRICE_HISTORY_FILE,
+) -> PriceHistoryMark:
+    # taken before rebuilding the table, for write_price_history
+    with file_lock(os.path.basename(price_history_file)):
+        return PriceHistoryMark(
+            _table_version(price_history_file),
+            _log_size(price_history_log_file(price_history_file)),
+        )
+
+
+def write_price_history(
+    price_history: PriceHistory,
+    price_history_file: str = PRICE_HISTORY_FILE,
+    since: Optional[PriceHistoryMark] = None,
+) -> None:
+    # Replaces the table, and the log with it. With since, price_history
+    # was rebuilt from the snapshots stored then: the rows saves logged
+    # after it are kept, and the ones a consolidation merged into the table
+    # meanwhile too.
+    with file_lock(os.path.basename(price_history_file)):
+        if since is None:
+            _write_table(price_history, price_history_file)
+            _remove_log(price_history_file)
+        elif _table_version(price_history_file) != since.table_version:
+            # consolidated meanwhile: the whole log is newer than since
+            _write_table(
+                price_history.merge_all(
+                    _read_table(price_history_file).rows()
+                ),
+                price_history_file,
+            )
+        else:
+            _write_table(price_history, price_history_file)
+            _drop_log_head(price_history_file, since.log_size)
+
+
+def _table_version(price_history_file: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(price_history_file)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def _log_size(log_file: str) -> int:
+    try:
+        return os.path.getsize(log_file)
+    except FileNotFoundError:
+        return 0
+
+
+def _drop_log_head(price_history_file: str, size: int) -> None:
+    # removes the first size bytes of the log: whole rows, appended first
+    log_file: str = price_history_log_file(price_history_file)
+    try:
+        with open(log_file, "rb") as in_f:
+            in_f.seek(size)
+            tail: bytes = in_f.read()
+    except FileNotFoundError:
+        return
+    if not tail:
+        _remove_log(price_history_file)
+        return
+    tmp_file: str = f"{log_file}.{os.getpid()}.tmp"
+    with open(tmp_file, "wb") as out_f:
+        out_f.write(tail)
+    os.replace(tmp_file, log_file)
+
+
+def _write_table(price_history: PriceHistory, price_history_file: str) -> None:
+    os.makedirs(os.path.dirname(price_history_file), exist_ok=True)
+    tmp_file: str = f"{price_history_file}.{os.getpid()}.tmp"
+    with open(tmp_file, "wb") as out_f:
+        np.savez(out_f, **price_history.columns)
+    os.replace(tmp_file, price_history_file)
+    log.debug(f"Saved price history to {price_history_file}.")
+
+
+def _remove_log(price_history_file: str) -> None:
+    try:
+        os.remove(price_history_log_file(price_history_file))
+    except FileNotFoundError:
+        pass
+
+
+def update_price_history(
+    set_num: str,
+    price_guide: PriceGuide,
+    price_history_file: str = PRICE_HISTORY_FILE,
+) -> None:
+    # appends the rows of a save to the log: consolidated in batches
+    rows: List[Row] = price_guide_rows(set_num, price_guide)
+    if not rows:
+        return
+    log_file: str = price_history_log_file(price_history_file)
+    with file_lock(os.path.basename(price_history_file)):
+        os.makedirs(os.path.dirname(log_file), exist_ok=True)
+        with open(log_file, "a", encoding="utf-8") as out_f:
+            out_f.writelines(
+                "\t".join(str(field) for field in row) + "\n" for row in rows
+            )
+            log_size: int = out_f.tell()
+        if log_size > PRICE_HISTORY_LOG_MAX_SIZE:
+            _consolidate(price_history_file)
+
+
+def _consolidate(price_history_file: str) -> None:
+    # merges the log into the table; the caller holds the lock
+    log_file: str = price_history_log_file(price_history_file)
+    _write_table(
+        _read_table(price_history_file).merge_all(_read_log(log_file)),
+        price_history_file,
+    )
+    _remove_log(price_history_file)
+    log.info(f"Consolidated price history into {price_history_file}.")
@@ -0,0 +1,165 @@
+import json
+import threading
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    Union,
+)
+
+# Model objects as records: nested sequences of ints, strs, bools and None,
+# encoded as JSON. Unlike pickles, records don't depend on the class layout:
+# every model converts itself with explicit to_record and from_record.
+#
+# Every record type has its own schema version. A record is saved with the
+# versions of its type and of the record types nested in it (see
+# nested_object), so a model changing its record only bumps its own
+# version, and registers an upgrade from the previous one: old records are
+# upgraded when loaded, and only rewritten when saved again. Shared
+# sub-records (see shared_record) are records of their own, versioned
+# independently of the records sharing them.
+
+RECORD_MAGIC = b"GMJ"
+
+Record = Union[tuple, list]
+RecordUpgrade = Callable[[Record], Record]
+
+
+record_types: Dict[str, type] = {}
+record_versions: Dict[str, int] = {}
+# record type -> the record types nested in its records
+record_nested_types: Dict[str, Tuple[str, ...]] = {}
+record_upgrades: Dict[Tuple[str, int], RecordUpgrade] = {}
+# how shared sub-records are stored, see shared_record(), and the versions
+# of the record being loaded, see nested_object()
+_sharing = threading.local()
+
+
+def cents(price: Optional[float]) -> Optional[int]:
+    # prices are scraped with 2 decimals
+    return None if price is None else round(price * 100)
+
+
+def from_cents(price: Optional[int]) -> Optional[float]:
+    return None if price is None else price / 100
+
+
+def register_record_type(
+    cls: type, version: int = 1, nested: Sequence[type] = ()
+) -> None:
+    # cls has a to_record method, and a from_record staticmethod
+    record_types[cls.__name__] = cls
+    record_versions[cls.__name__] = version
+    record_nested_types[cls.__name__] = tuple(
+        nested_cls.__name__ for nested_cls in nested
+    )
+
+
+def register_record_upgrade(
+    cls: type, from_version: int, upgrade: RecordUpgrade
+) -> None:
+    record_upgrades[(cls.__name__, from_version)] = upgrade
+
+
+def is_record_type(cls: type) -> bool:
+    return record_types.get(cls.__name__) is cls
+
+
+def record_schema(name: str) -> Dict[str, int]:
+    # the versions of a record type and of the ones nested in it
+    schema: Dict[str, int] = {}
+    pending = [name]
+    while pending:
+        current: str = pending.pop()
+        if current not in schema:
+            schema[current] = record_versions[current]
+            pending.extend(record_nested_types[current])
+    return schema
+
+
+def upgrade_record(name: str, version: int, record: Record) -> Record:
+    while version < record_versions[name]:
+        upgrade: Optional[RecordUpgrade] = record_upgrades.get((name, version))
+        if upgrade is not None:
+            record = upgrade(record)
+        version += 1
+    return record
+
+
+def dumps_record(
+    obj: Any, share: Optional[Callable[[Any], str]] = None
+) -> bytes:
+    # equal records are always encoded to equal bytes, as content
+    # addressing needs
+    name: str = type(obj).__name__
+    # shared sub-records are records themselves: restore the outer share
+    outer_share = getattr(_sharing, "share", None)
+    _sharing.share = share
+    try:
+        record: Record = obj.to_record()
+    finally:
+        _sharing.share = outer_share
+    return RECORD_MAGIC + json.dumps(
+        (name, record_schema(name), record),
+        ensure_ascii=False,
+        separators=(",", ":"),
+        sort_keys=True,
+    ).encode("utf-8")
+
+
+def loads_record(
+    data: bytes, unshare: Optional[Callable[[str], Any]] = None
+) -> Any:
+    schema: Dict[str, int]
+    name, schema, record = json.loads(
+        memoryview(data)[len(RECORD_MAGIC) :].tobytes()
+    )
+    for schema_name, version in schema.items():
+        if version > record_versions[schema_name]:
+            raise ValueError(
+                f"{schema_name} record version {version} is newer than "
+                f"{record_versions[schema_name]}."
+            )
+    outer_unshare = getattr(_sharing, "unshare", None)
+    outer_schema = getattr(_sharing, "schema", None)
+    _sharing.unshare = unshare
+    _sharing.schema = schema
+    try:
+        return record_types[name].from_record(
+            upgrade_record(name, schema[name], record)
+        )
+    finally:
+        _sharing.unshare = outer_unshare
+        _sharing.schema = outer_schema
+
+
+def nested_object(cls: Type[Any], record: Record) -> Any:
+    # for from_record: a record of another record type, upgraded from the
+    # version it was saved with
+    name: str = cls.__name__
+    schema: Optional[Dict[str, int]] = getattr(_sharing, "schema", None)
+    version: int = (
+        schema.get(name, record_versions[name])
+        if schema is not None
+        else record_versions[name]
+    )
+    return cls.from_record(upgrade_record(name, version, record))
+
+
+def shared_record(obj: Any) -> Any:
+    # sub-objects repeated across many records (e.g. a finished month of
+    # sales) may be stored elsewhere once, and referenced by a str key
+    share: Optional[Callable[[Any], str]] = getattr(_sharing, "share", None)
+    if share is not None:
+        return share(obj)
+    return obj.to_record()
+
+
+def shared_object(cls: Type[Any], record: Any) -> Any:
+    if isinstance(record, str):
+        return _sharing.unshare(record)
+    return nested_object(cls, record)
@@ -0,0 +1,124 @@
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional
+
+from gray_merchant_of_billund.constants.gmob import (
+    RESPONSE_CACHE_COMPRESSION,
+    RESPONSE_CACHE_COMPRESSION_LEVEL,
+    RESPONSE_CACHE_FILE,
+)
+from gray_merchant_of_billund.storage.serializer import (
+    NO_DICTIONARY,
+    available_codec,
+    compress,
+    decompress,
+)
+from gray_merchant_of_billund.utils.log import get_logger
+
+log = get_logger()
+# resolved once: available_codec warns when it falls back
+RESPONSE_CODEC: str = available_codec(RESPONSE_CACHE_COMPRESSION)
+
+# The latest raw response of each scraped URL, body compressed: enough to
+# revalidate it (ETag, Last-Modified), and to parse it again offline after
+# a parser fix, without scraping anything.
+
+
+class RawResponse(NamedTuple):
+    url: str
+    status_code: int
+    headers: Dict[str, str]  # lowercase names
+    content: bytes
+    # when the content was fetched, or last confirmed by a revalidation
+    fetched_ms: int
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers: Dict[str, str] = {}
+        if "etag" in self.headers:
+            headers["If-None-Match"] = self.headers["etag"]
+        if "last-modified" in self.headers:
+            headers["If-Modified-Since"] = self.headers["last-modified"]
+        return headers
+
+
+class ResponseCache:
+    def __init__(self, db_file: str = RESPONSE_CACHE_FILE):
+        self.db_file: str = db_file
+        self._local = threading.local()
+
+    def __getstate__(self):
+        # connections can't cross threads or processes
+        return {"db_file": self.db_file}
+
+    def __setstate__(self, state):
+        self.__init__(state["db_file"])
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        connection: Optional[sqlite3.Connection] = getattr(
+            self._local, "connection", None
+        )
+        if connection is None:
+            os.makedirs(Path(self.db_file).parent, exist_ok=True)
+            connection = sqlite3.connect(self.db_file, timeout=60)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "url TEXT PRIMARY KEY, "
+                "status_code INTEGER NOT NULL, "
+                "headers TEXT NOT NULL, "
+                "body BLOB NOT NULL, "
+                "fetched_ms INTEGER NOT NULL)"
+            )
+            connection.commit()
+            self._local.connection = connection
+        return connection
+
+    def get(self, url: str) -> Optional[RawResponse]:
+        row = self.connection.execute(
+            "SELECT status_code, headers, body, fetched_ms FROM responses "
+            "WHERE url = ?",
+            (url,),
+        ).fetchone()
+        if row is None:
+            return None
+        status_code, headers, body, fetched_ms = row
+        return RawResponse(
+            url, status_code, json.loads(headers), decompress(body), fetched_ms
+        )
+
+    def store(self, response: RawResponse) -> None:
+        body: bytes = compress(
+            response.content,
+            RESPONSE_CODEC,
+            NO_DICTIONARY,
+            RESPONSE_CACHE_COMPRESSION_LEVEL,
+        )
+        with self.connection as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (
+                    response.url,
+                    response.status_code,
+                    json.dumps(response.headers),
+                    body,
+                    response.fetched_ms,
+                ),
+            )
+
+    def revalidated(
+        self, response: RawResponse, fetched_ms: int
+    ) -> RawResponse:
+        # the server confirmed the cached content (304 Not Modified)
+        with self.connection as connection:
+            connection.execute(
+                "UPDATE responses SET fetched_ms = ? WHERE url = ?",
+                (fetched_ms, response.url),
+            )
+        return response._replace(fetched_ms=fetched_ms)
+
+
+response_cache = ResponseCache()
@@ -1,8 +1,8 @@
 import os
-import pickle
 from abc import ABCMeta, abstractmethod
 from typing import Optional, Type, TypeVar
 
+from gray_merchant_of_billund.storage.serializer import dumps, loads
 from gray_merchant_of_billund.utils.log import get_logger
 from gray_merchant_of_billund.utils.path import posix_path
 
@@ -33,7 +33,7 @@ class Saveable(metaclass=ABCMeta):
         log.debug(f"Saving item to {self.store_path}...")
         os.makedirs(self.store_dir(), exist_ok=True)
         with open(self.store_path, "wb") as out_f:
-            pickle.dump(self, out_f)
+            out_f.write(dumps(self))
         log.debug(f"Saved item to {self.store_path}.")
 
 
@@ -44,7 +44,7 @@ def load(cls: Type[TSaveable], store_key: str) -> Optional[TSaveable]:
     item: Optional[TSaveable] = None
     try:
         with open(store_path, "rb") as in_f:
-            item = pickle.load(in_f)
+            item = loads(in_f.read())
             log.debug(f"Loaded item from {store_path}.")
     except FileNotFoundError:
         log.debug(f"Missing item {store_path}.")
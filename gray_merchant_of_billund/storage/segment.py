@@ -0,0 +1,94 @@
+import json
+import mmap
+import os
+import struct
+from typing import Dict, Generator, Iterable, List, Optional, Tuple
+
+from gray_merchant_of_billund.storage.saveable import Saveable
+from gray_merchant_of_billund.storage.serializer import dumps, loads
+from gray_merchant_of_billund.utils.log import get_logger
+from gray_merchant_of_billund.utils.path import posix_path
+
+log = get_logger()
+
+# Many Saveables in a single file: their serialized items one after the
+# other, then a store_key -> (offset, size) table as JSON, then the table
+# offset.
+# Any item can be read without reading the others.
+SEGMENT_MAGIC = b"GMS\x02"
+TRAILER = struct.Struct(">Q")  # table offset
+SEGMENT_EXTENSION = "segment"
+
+
+def write_segment(path: str, items: Iterable[Saveable]) -> int:
+    log.debug(f"Saving segment {path}...")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table: Dict[str, Tuple[int, int]] = {}
+    tmp_path: str = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as out_f:
+        out_f.write(SEGMENT_MAGIC)
+        offset: int = len(SEGMENT_MAGIC)
+        for item in items:
+            data: bytes = dumps(item)
+            out_f.write(data)
+            table[item.store_key] = (offset, len(data))
+            offset += len(data)
+        out_f.write(json.dumps(table).encode("utf-8"))
+        out_f.write(TRAILER.pack(offset))
+    os.replace(tmp_path, path)
+    log.debug(f"Saved segment {path} ({len(table)} items).")
+    return len(table)
+
+
+class Segment:
+    def __init__(self, path: str):
+        self.path: str = path
+        with open(path, "rb") as in_f:
+            self._data = mmap.mmap(in_f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._data[: len(SEGMENT_MAGIC)] != SEGMENT_MAGIC:
+            self._data.close()
+            raise ValueError(f"{path} is not a segment of this version.")
+        (table_offset,) = TRAILER.unpack_from(
+            self._data, len(self._data) - TRAILER.size
+        )
+        self._table: Dict[str, Tuple[int, int]] = json.loads(
+            self._data[table_offset : len(self._data) - TRAILER.size]
+        )
+
+    def __enter__(self) -> "Segment":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._data.close()
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def __contains__(self, store_key: str) -> bool:
+        return store_key in self._table
+
+    def store_keys(self) -> List[str]:
+        return list(self._table)
+
+    def read(self, store_key: str) -> Optional[bytes]:
+        entry: Optional[Tuple[int, int]] = self._table.get(store_key)
+        if entry is None:
+            return None
+        offset, size = entry
+        return self._data[offset : offset + size]
+
+    def load(self, store_key: str) -> Optional[Saveable]:
+        data: Optional[bytes] = self.read(store_key)
+        return loads(data) if data is not None else None
+
+    def __iter__(self) -> Generator[Saveable, None, None]:
+        # in file order
+        for offset, size in self._table.values():
+            yield loads(self._data[offset : offset + size])
+
+
+def segment_path(store_dir: str, name: str) -> str:
+    return posix_path(store_dir, f"{name}.{SEGMENT_EXTENSION}")
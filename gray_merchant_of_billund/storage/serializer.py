@@ -0,0 +1,304 @@
+import io
+import os
+import pickle
+import struct
+import threading
+import zlib
+from functools import partial
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+from gray_merchant_of_billund.constants.gmob import (
+    COMPRESSION_DICTIONARY_DIR,
+    SNAPSHOT_COMPRESSION,
+    SNAPSHOT_COMPRESSION_LEVEL,
+    SNAPSHOT_DEDUPLICATION,
+    SNAPSHOT_FORMAT,
+)
+from gray_merchant_of_billund.model.bricklink_price import (
+    BricklinkAggregateSoldMonth,
+)
+from gray_merchant_of_billund.storage.blobs import blob_store
+from gray_merchant_of_billund.storage.record import (
+    RECORD_MAGIC,
+    dumps_record,
+    is_record_type,
+    loads_record,
+)
+from gray_merchant_of_billund.utils.log import get_logger
+from gray_merchant_of_billund.utils.path import posix_path
+
+try:
+    import zstandard  # type: ignore
+except ImportError:  # optional: zlib is always available
+    zstandard = None
+
+log = get_logger()
+
+# Serialized items are plain pickles or records, or either compressed and
+# framed by a header naming the codec and the dictionary they were
+# compressed with. Loading sniffs headers, so all can live side by side.
+HEADER = struct.Struct(">3sBI")  # magic, codec, dictionary id
+MAGIC = b"GMZ"
+CODECS: Dict[str, int] = {"zlib": 1, "zstd": 2}
+CODEC_NAMES: Dict[int, str] = {codec: name for name, codec in CODECS.items()}
+NO_DICTIONARY = 0
+CURRENT_DICTIONARY_FILE_NAME = "current.dict"
+ZLIB_DICTIONARY_SIZE = 32 * 2**10  # B, the largest zlib window
+ZSTD_DICTIONARY_SIZE = 112 * 2**10  # B
+BLOB_REFERENCE = "blob"
+DEDUPLICATED_TYPES = (BricklinkAggregateSoldMonth,)
+
+_dictionaries: Dict[int, bytes] = {}
+_zstd_dictionaries: Dict[int, Any] = {}
+_dictionaries_lock = threading.Lock()
+# read once per process: a dictionary trained meanwhile by another process
+# is used from its next start
+_current_dictionary_id: Optional[int] = None
+
+
+def dictionary_id(dictionary: bytes) -> int:
+    return zlib.crc32(dictionary) or 1
+
+
+def dictionary_path(dict_id: int) -> str:
+    return posix_path(COMPRESSION_DICTIONARY_DIR, f"{dict_id}.dict")
+
+
+def get_dictionary(dict_id: int) -> bytes:
+    with _dictionaries_lock:
+        if dict_id not in _dictionaries:
+            with open(dictionary_path(dict_id), "rb") as in_f:
+                _dictionaries[dict_id] = in_f.read()
+        return _dictionaries[dict_id]
+
+
+def get_zstd_dictionary(dict_id: int) -> Any:
+    if dict_id == NO_DICTIONARY:
+        return None
+    dictionary: bytes = get_dictionary(dict_id)
+    with _dictionaries_lock:
+        if dict_id not in _zstd_dictionaries:
+            zstd_dictionary = zstandard.ZstdCompressionDict(dictionary)
+            # otherwise every compressor digests the dictionary again
+            zstd_dictionary.precompute_compress(
+                level=SNAPSHOT_COMPRESSION_LEVEL
+            )
+            _zstd_dictionaries[dict_id] = zstd_dictionary
+        return _zstd_dictionaries[dict_id]
+
+
+def register_dictionary(dictionary: bytes) -> int:
+    dict_id: int = dictionary_id(dictionary)
+    with _dictionaries_lock:
+        _dictionaries[dict_id] = dictionary
+    return dict_id
+
+
+def current_dictionary_id() -> int:
+    global _current_dictionary_id
+    with _dictionaries_lock:
+        if _current_dictionary_id is None:
+            try:
+                with open(
+                    posix_path(
+                        COMPRESSION_DICTIONARY_DIR,
+                        CURRENT_DICTIONARY_FILE_NAME,
+                    )
+                ) as in_f:
+                    _current_dictionary_id = int(in_f.read())
+            except FileNotFoundError:
+                _current_dictionary_id = NO_DICTIONARY
+        return _current_dictionary_id
+
+
+def save_dictionary(dictionary: bytes) -> int:
+    # old dictionaries are kept: items compressed with them must still load
+    dict_id: int = register_dictionary(dictionary)
+    os.makedirs(COMPRESSION_DICTIONARY_DIR, exist_ok=True)
+    with open(dictionary_path(dict_id), "wb") as out_f:
+        out_f.write(dictionary)
+    current: str = posix_path(
+        COMPRESSION_DICTIONARY_DIR, CURRENT_DICTIONARY_FILE_NAME
+    )
+    with open(f"{current}.tmp", "w") as out_f:
+        out_f.write(str(dict_id))
+    os.replace(f"{current}.tmp", current)
+    global _current_dictionary_id
+    with _dictionaries_lock:
+        _current_dictionary_id = dict_id
+    log.info(f"Saved compression dictionary {dict_id}.")
+    return dict_id
+
+
+def train_dictionary(codec: str, samples: Sequence[bytes]) -> bytes:
+    if codec == "zstd":
+        return zstandard.train_dictionary(
+            ZSTD_DICTIONARY_SIZE, list(samples)
+        ).as_bytes()
+    # zlib has no trainer: a preset dictionary is just content, and strings
+    # nearer to its end are the cheapest to reference
+    dictionary: bytes = b""
+    for sample in samples:
+        dictionary = (dictionary + sample)[-ZLIB_DICTIONARY_SIZE:]
+        if len(dictionary) == ZLIB_DICTIONARY_SIZE:
+            break
+    return dictionary
+
+
+def compress(
+    data: bytes,
+    codec: str,
+    dict_id: int = NO_DICTIONARY,
+    level: int = SNAPSHOT_COMPRESSION_LEVEL,
+) -> bytes:
+    header: bytes = HEADER.pack(MAGIC, CODECS[codec], dict_id)
+    if codec == "zstd":
+        compressor = zstandard.ZstdCompressor(
+            level=level, dict_data=get_zstd_dictionary(dict_id)
+        )
+        return header + compressor.compress(data)
+    dictionary: Optional[bytes] = (
+        get_dictionary(dict_id) if dict_id != NO_DICTIONARY else None
+    )
+    if dictionary:
+        compressobj = zlib.compressobj(level, zdict=dictionary)
+    else:
+        compressobj = zlib.compressobj(level)
+    return header + compressobj.compress(data) + compressobj.flush()
+
+
+def decompress(data: bytes) -> bytes:
+    if not data.startswith(MAGIC):
+        return data
+    _, codec, dict_id = HEADER.unpack_from(data)
+    payload = memoryview(data)[HEADER.size :]
+    if CODEC_NAMES[codec] == "zstd":
+        decompressor = zstandard.ZstdDecompressor(
+            dict_data=get_zstd_dictionary(dict_id)
+        )
+        return decompressor.decompress(payload)
+    dictionary: Optional[bytes] = (
+        get_dictionary(dict_id) if dict_id != NO_DICTIONARY else None
+    )
+    if dictionary:
+        decompressobj = zlib.decompressobj(zdict=dictionary)
+    else:
+        decompressobj = zlib.decompressobj()
+    return decompressobj.decompress(payload) + decompressobj.flush()
+
+
+def _share(obj: Any, codec: Optional[str]) -> str:
+    data: bytes = (
+        dumps_record(obj) if is_record_type(type(obj)) else pickle.dumps(obj)
+    )
+    return blob_store.put(_encode(data, codec))
+
+
+def _unshare(digest: str) -> Any:
+    return loads(blob_store.get(digest))
+
+
+class _DeduplicatingPickler(pickle.Pickler):
+    # Sub-objects listed in DEDUPLICATED_TYPES are stored once in the blob
+    # store, and pickled as a reference to their content hash: e.g. a
+    # finished month of sales, repeated by every later snapshot.
+    def __init__(self, file: IO[bytes], codec: Optional[str]):
+        super().__init__(file)
+        self.codec: Optional[str] = codec
+
+    def persistent_id(self, obj: Any) -> Optional[Tuple[str, str]]:
+        if type(obj) not in DEDUPLICATED_TYPES:
+            return None
+        return BLOB_REFERENCE, _share(obj, self.codec)
+
+
+class _DeduplicatingUnpickler(pickle.Unpickler):
+    def __init__(
+        self, file: IO[bytes], unshare: Callable[[str], Any] = _unshare
+    ):
+        super().__init__(file)
+        self.unshare: Callable[[str], Any] = unshare
+
+    def persistent_load(self, pid: Tuple[str, str]) -> Any:
+        kind, digest = pid
+        if kind != BLOB_REFERENCE:
+            raise pickle.UnpicklingError(f"Unknown persistent id {kind}.")
+        return self.unshare(digest)
+
+
+def available_codec(codec: str) -> str:
+    if codec == "zstd" and zstandard is None:
+        log.warning("zstandard is not installed: falling back to zlib.")
+        return "zlib"
+    return codec
+
+
+def _encode(data: bytes, codec: Optional[str] = SNAPSHOT_COMPRESSION) -> bytes:
+    if codec is None:
+        return data
+    return compress(data, available_codec(codec), current_dictionary_id())
+
+
+def compressed(data: bytes, codec: str) -> bytes:
+    # serialized items as they are if already compressed, else compressed
+    if data.startswith(MAGIC):
+        return data
+    return _encode(data, codec)
+
+
+def dumps(
+    obj: Any,
+    codec: Optional[str] = SNAPSHOT_COMPRESSION,
+    deduplicate: bool = SNAPSHOT_DEDUPLICATION,
+    snapshot_format: str = SNAPSHOT_FORMAT,
+) -> bytes:
+    if snapshot_format == "record" and is_record_type(type(obj)):
+        return _encode(
+            dumps_record(
+                obj, partial(_share, codec=codec) if deduplicate else None
+            ),
+            codec,
+        )
+    if not deduplicate:
+        return _encode(pickle.dumps(obj), codec)
+    out_f = io.BytesIO()
+    _DeduplicatingPickler(out_f, codec).dump(obj)
+    return _encode(out_f.getvalue(), codec)
+
+
+def loads(data: bytes) -> Any:
+    raw: bytes = decompress(data)
+    if raw.startswith(RECORD_MAGIC):
+        return loads_record(raw, _unshare)
+    return _DeduplicatingUnpickler(io.BytesIO(raw)).load()
+
+
+def blob_references(data: bytes) -> Set[str]:
+    # the digests of the blobs a serialized item shares sub-objects with
+    references: Set[str] = set()
+
+    def unshare(digest: str) -> Any:
+        references.add(digest)
+        return _unshare(digest)
+
+    raw: bytes = decompress(data)
+    if raw.startswith(RECORD_MAGIC):
+        loads_record(raw, unshare)
+    else:
+        _DeduplicatingUnpickler(io.BytesIO(raw), unshare).load()
+    return references
+
+
+def raw_samples(items: Sequence[bytes]) -> List[bytes]:
+    # dictionaries are trained on uncompressed items
+    return [decompress(item) for item in items]
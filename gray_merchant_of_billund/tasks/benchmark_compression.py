@@ -0,0 +1,92 @@
+import argparse
+import pickle
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from gray_merchant_of_billund.storage.serializer import (
+    NO_DICTIONARY,
+    compress,
+    decompress,
+    register_dictionary,
+    train_dictionary,
+    zstandard,
+)
+from gray_merchant_of_billund.tasks.synthetic_sets import (
+    synthetic_bricklink_set,
+    synthetic_rebrickable_set,
+)
+from gray_merchant_of_billund.utils.time import DAY, now
+
+BLOCK_SIZE = 4096  # B, what a small file really takes on disk
+
+
+class Variant(NamedTuple):
+    codec: Optional[str]
+    dict_id: int
+
+
+def snapshots(num_snapshots: int, snapshots_per_set: int):
+    start_ms: int = now() - snapshots_per_set * DAY
+    for i in range(num_snapshots):
+        num, snapshot = divmod(i, snapshots_per_set)
+        yield pickle.dumps(
+            synthetic_bricklink_set(
+                synthetic_rebrickable_set(num), start_ms + snapshot * DAY
+            )
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure snapshot compression on synthetic snapshots."
+    )
+    parser.add_argument("--snapshots", type=int, default=100_000)
+    parser.add_argument("--snapshots-per-set", type=int, default=50)
+    parser.add_argument("--training-samples", type=int, default=1000)
+    args = parser.parse_args()
+
+    codecs: List[str] = ["zlib"] + (["zstd"] if zstandard else [])
+    training: List[bytes] = list(
+        snapshots(args.training_samples, args.snapshots_per_set)
+    )
+    variants: Dict[str, Variant] = {"pickle": Variant(None, NO_DICTIONARY)}
+    for codec in codecs:
+        variants[codec] = Variant(codec, NO_DICTIONARY)
+        variants[f"{codec}+dict"] = Variant(
+            codec, register_dictionary(train_dictionary(codec, training))
+        )
+
+    sizes: Dict[str, int] = {name: 0 for name in variants}
+    disk: Dict[str, int] = {name: 0 for name in variants}
+    dump_s: Dict[str, float] = {name: 0 for name in variants}
+    load_s: Dict[str, float] = {name: 0 for name in variants}
+    for data in snapshots(args.snapshots, args.snapshots_per_set):
+        for name, variant in variants.items():
+            start: float = time.perf_counter()
+            if variant.codec is not None:
+                stored = compress(data, variant.codec, variant.dict_id)
+            else:
+                stored = data
+            dump_s[name] += time.perf_counter() - start
+            start = time.perf_counter()
+            pickle.loads(decompress(stored))
+            load_s[name] += time.perf_counter() - start
+            sizes[name] += len(stored)
+            disk[name] += -(-len(stored) // BLOCK_SIZE) * BLOCK_SIZE
+
+    print(
+        f"{args.snapshots} snapshots\n"
+        f"{'variant':<10}|{'MB':>9}|{'disk MB':>9}|{'ratio':>6}"
+        f"|{'compress s':>11}|{'load s':>8}"
+    )
+    for name in variants:
+        print(
+            f"{name:<10}|{sizes[name] / 2 ** 20:>9.1f}"
+            f"|{disk[name] / 2 ** 20:>9.1f}"
+            f"|{sizes['pickle'] / sizes[name]:>6.2f}"
+            f"|{dump_s[name]:>11.2f}|{load_s[name]:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import argparse
+import time
+from typing import Callable, Dict, List
+
+from gray_merchant_of_billund.model.bricklink_set import BricklinkSet
+from gray_merchant_of_billund.storage.serializer import dumps, loads
+from gray_merchant_of_billund.tasks.synthetic_sets import (
+    synthetic_bricklink_set,
+    synthetic_rebrickable_set,
+)
+from gray_merchant_of_billund.utils.time import now
+
+
+def benchmark(
+    sets: List[BricklinkSet], dump: Callable[[BricklinkSet], bytes]
+) -> Dict[str, float]:
+    start: float = time.perf_counter()
+    data: List[bytes] = [dump(lego_set) for lego_set in sets]
+    dump_s: float = time.perf_counter() - start
+    start = time.perf_counter()
+    for item in data:
+        loads(item)
+    load_s: float = time.perf_counter() - start
+    return {
+        "MB": sum(len(item) for item in data) / 2**20,
+        "dump s": dump_s,
+        "load s": load_s,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare pickles and records of synthetic BricklinkSets."
+    )
+    parser.add_argument("--sets", type=int, default=10_000)
+    args = parser.parse_args()
+    creation_date_ms: int = now()
+    sets: List[BricklinkSet] = [
+        synthetic_bricklink_set(
+            synthetic_rebrickable_set(num), creation_date_ms
+        )
+        for num in range(args.sets)
+    ]
+    # uncompressed and self-contained: only the format differs
+    results: Dict[str, Dict[str, float]] = {
+        snapshot_format: benchmark(
+            sets,
+            lambda lego_set: dumps(
+                lego_set,
+                codec=None,
+                deduplicate=False,
+                snapshot_format=snapshot_format,
+            ),
+        )
+        for snapshot_format in ("pickle", "record")
+    }
+    print(
+        f"{args.sets} sets\n{'format':<8}|{'MB':>8}|{'dump s':>8}|{'load s':>8}"
+    )
+    for snapshot_format, result in results.items():
+        print(
+            f"{snapshot_format:<8}|{result['MB']:>8.1f}"
+            f"|{result['dump s']:>8.2f}|{result['load s']:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
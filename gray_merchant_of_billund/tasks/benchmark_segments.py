@@ -0,0 +1,102 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List
+
+from gray_merchant_of_billund.model.rebrickable_set import (
+    RebrickableIndex,
+    RebrickableSet,
+)
+from gray_merchant_of_billund.storage.saveable import Saveable
+from gray_merchant_of_billund.storage.segment import (
+    Segment,
+    segment_path,
+    write_segment,
+)
+from gray_merchant_of_billund.storage.serializer import dumps, loads
+from gray_merchant_of_billund.tasks.synthetic_sets import (
+    synthetic_rebrickable_set,
+)
+
+
+def benchmark_files(
+    store_dir: str, index: RebrickableIndex, nums: List[str]
+) -> Dict[str, float]:
+    # like Saveable.save and storage.saveable.load, under store_dir
+    start: float = time.perf_counter()
+    for lego_set in index:
+        os.makedirs(store_dir, exist_ok=True)
+        with open(
+            Saveable.build_store_path(store_dir, lego_set.store_key), "wb"
+        ) as out_f:
+            out_f.write(dumps(lego_set))
+    save_s: float = time.perf_counter() - start
+    start = time.perf_counter()
+    for lego_set in index:
+        with open(
+            Saveable.build_store_path(store_dir, lego_set.store_key), "rb"
+        ) as in_f:
+            loads(in_f.read())
+    load_s: float = time.perf_counter() - start
+    start = time.perf_counter()
+    for num in nums:
+        with open(Saveable.build_store_path(store_dir, num), "rb") as in_f:
+            loads(in_f.read())
+    random_s: float = time.perf_counter() - start
+    return {"save": save_s, "load": load_s, "random": random_s}
+
+
+def benchmark_segment(
+    store_dir: str, index: RebrickableIndex, nums: List[str]
+) -> Dict[str, float]:
+    path: str = segment_path(store_dir, "index")
+    start: float = time.perf_counter()
+    write_segment(path, index.sets)
+    save_s: float = time.perf_counter() - start
+    start = time.perf_counter()
+    with Segment(path) as segment:
+        RebrickableIndex(list(segment))
+    load_s: float = time.perf_counter() - start
+    start = time.perf_counter()
+    with Segment(path) as segment:
+        for num in nums:
+            segment.load(num)
+    random_s: float = time.perf_counter() - start
+    return {"save": save_s, "load": load_s, "random": random_s}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare a file per set with a single segment file."
+    )
+    parser.add_argument("--sets", type=int, default=20_000)
+    parser.add_argument("--random-reads", type=int, default=1000)
+    args = parser.parse_args()
+    sets: List[RebrickableSet] = [
+        synthetic_rebrickable_set(num) for num in range(args.sets)
+    ]
+    index = RebrickableIndex(sets)
+    nums: List[str] = [
+        lego_set.num
+        for lego_set in random.Random(0).choices(sets, k=args.random_reads)
+    ]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        results: Dict[str, Dict[str, float]] = {
+            "files": benchmark_files(f"{tmp_dir}/files", index, nums),
+            "segment": benchmark_segment(f"{tmp_dir}/segment", index, nums),
+        }
+    print(
+        f"{args.sets} sets, {args.random_reads} random reads\n"
+        f"{'layout':<8}|{'save s':>8}|{'load s':>8}|{'random s':>9}"
+    )
+    for layout, result in results.items():
+        print(
+            f"{layout:<8}|{result['save']:>8.2f}|{result['load']:>8.2f}"
+            f"|{result['random']:>9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import argparse
+import os
+import pickle
+import tempfile
+import time
+from typing import Dict, List
+
+from gray_merchant_of_billund.model.bricklink_set import BricklinkSet
+from gray_merchant_of_billund.storage.backend import (
+    ExpirableBackend,
+    PickleTreeBackend,
+    ShardedPickleTreeBackend,
+    SQLiteBackend,
+)
+from gray_merchant_of_billund.tasks.synthetic_sets import (
+    synthetic_bricklink_set,
+    synthetic_rebrickable_set,
+)
+from gray_merchant_of_billund.utils.path import posix_path
+from gray_merchant_of_billund.utils.time import DAY, now
+
+
+def disk_usage(path: str) -> Dict[str, int]:
+    files: int = 0
+    size: int = 0
+    for dir_path, _, file_names in os.walk(path):
+        for file_name in file_names:
+            files += 1
+            size += os.lstat(posix_path(dir_path, file_name)).st_size
+    return {"files": files, "bytes": size}
+
+
+def benchmark(
+    backend: ExpirableBackend, num_sets: int, num_snapshots: int
+) -> Dict[str, float]:
+    store_keys: List[str] = []
+    start_ms: int = now() - num_snapshots * DAY
+    write_start: float = time.perf_counter()
+    for num in range(num_sets):
+        rebrickable_set = synthetic_rebrickable_set(num)
+        store_keys.append(rebrickable_set.store_key)
+        for snapshot in range(num_snapshots):
+            bricklink_set = synthetic_bricklink_set(
+                rebrickable_set, start_ms + snapshot * DAY
+            )
+            backend.write(
+                BricklinkSet,
+                bricklink_set.store_key,
+                bricklink_set.creation_date_ms,
+                pickle.dumps(bricklink_set),
+            )
+    write_s: float = time.perf_counter() - write_start
+
+    latest_start: float = time.perf_counter()
+    for store_key in store_keys:
+        pickle.loads(backend.read_latest(BricklinkSet, store_key) or b"")
+    latest_s: float = time.perf_counter() - latest_start
+
+    all_start: float = time.perf_counter()
+    for store_key in store_keys:
+        for creation_date_ms in backend.creation_dates(
+            BricklinkSet, store_key
+        ):
+            pickle.loads(
+                backend.read(BricklinkSet, store_key, creation_date_ms) or b""
+            )
+    all_s: float = time.perf_counter() - all_start
+    return {"write": write_s, "load": latest_s, "load_all": all_s}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the Expirable storage backends."
+    )
+    parser.add_argument("--sets", type=int, default=500)
+    parser.add_argument("--snapshots", type=int, default=30)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        backends: Dict[str, ExpirableBackend] = {
+            "pickle": PickleTreeBackend(posix_path(tmp_dir, "pickle")),
+            "sharded": ShardedPickleTreeBackend(
+                posix_path(tmp_dir, "sharded")
+            ),
+            "sqlite": SQLiteBackend(
+                posix_path(tmp_dir, "sqlite", "expirable.sqlite3")
+            ),
+        }
+        print(
+            f"{args.sets} sets x {args.snapshots} snapshots\n"
+            f"{'backend':<8}|{'write s':>9}|{'load s':>9}|{'load_all s':>11}"
+            f"|{'files':>7}|{'MB':>8}"
+        )
+        for name, backend in backends.items():
+            timings = benchmark(backend, args.sets, args.snapshots)
+            usage = disk_usage(posix_path(tmp_dir, name))
+            print(
+                f"{name:<8}|{timings['write']:>9.2f}|{timings['load']:>9.2f}"
+                f"|{timings['load_all']:>11.2f}|{usage['files']:>7}"
+                f"|{usage['bytes'] / 2 ** 20:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
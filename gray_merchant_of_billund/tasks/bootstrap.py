@@ -4,7 +4,9 @@ from gray_merchant_of_billund.constants.gmob import (
     BOOTSTRAP_FILE,
     RESOURCES_DIR,
 )
-from gray_merchant_of_billund.indexer.brickset_indexer import _get_brickset_set
+from gray_merchant_of_billund.indexer.brickset_indexer import (
+    get_brickset_sets,
+)
 from gray_merchant_of_billund.model.brickset_set import BricksetSet
 from gray_merchant_of_billund.model.rebrickable_set import RebrickableIndex
 from gray_merchant_of_billund.utils.path import posix_path
@@ -20,6 +22,10 @@ def bootstrap():
             continue
         sets.append(line.replace("\n", ""))
     rebrickable_index: RebrickableIndex = get_rebrickable_index()
+    set_nums: List[str] = [f"{lego_set}-1" for lego_set in sets]
+    brickset_sets: List[BricksetSet] = get_brickset_sets(
+        [rebrickable_index[set_num] for set_num in set_nums], save=False
+    )
     with open(posix_path(RESOURCES_DIR, "autogen.txt"), "w") as out_f:
         out_f.write(
             "# SET #   |"
@@ -34,11 +40,7 @@ def bootstrap():
             "NEW|"
             "OTHER NOTES\n"
         )
-        for lego_set in sets:
-            set_num: str = f"{lego_set}-1"
-            brickset_set: BricksetSet = _get_brickset_set(
-                rebrickable_index[set_num]
-            )
+        for set_num, brickset_set in zip(set_nums, brickset_sets):
             set_name: str = rebrickable_index[set_num].name
             set_year: str = rebrickable_index[set_num].year
             full_name: str = f"{set_name} ({set_year})"
@@ -0,0 +1,46 @@
+from typing import List
+
+from gray_merchant_of_billund.model.bricklink_set import BricklinkSet
+from gray_merchant_of_billund.storage.backend import get_backend
+from gray_merchant_of_billund.storage.expirable import load_all
+from gray_merchant_of_billund.storage.price_history import (
+    PriceHistory,
+    PriceHistoryMark,
+    Row,
+    price_guide_rows,
+    price_history_mark,
+    write_price_history,
+)
+from gray_merchant_of_billund.utils.log import get_logger
+
+log = get_logger()
+
+
+def build_price_history() -> PriceHistory:
+    # rebuilds the whole table from the stored BricklinkSet snapshots, e.g.
+    # for snapshots saved before the table existed: see
+    # rebuild_price_history to write it
+    rows: List[Row] = []
+    store_keys: List[str] = get_backend().store_keys(BricklinkSet)
+    for store_key in store_keys:
+        for bricklink_set in load_all(BricklinkSet, store_key):
+            rows.extend(
+                price_guide_rows(bricklink_set.num, bricklink_set.price_guide)
+            )
+    price_history: PriceHistory = PriceHistory().merge_all(rows)
+    log.info(f"Indexed {len(price_history)} months of {len(store_keys)} sets.")
+    return price_history
+
+
+def rebuild_price_history() -> None:
+    # saves may go on meanwhile: the rows they log are kept
+    since: PriceHistoryMark = price_history_mark()
+    write_price_history(build_price_history(), since=since)
+
+
+def main():
+    rebuild_price_history()
+
+
+if __name__ == "__main__":
+    main()
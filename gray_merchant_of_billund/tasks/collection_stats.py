@@ -1,18 +1,23 @@
+import argparse
 import logging
 from collections import defaultdict
+from typing import Optional
 
-from gray_merchant_of_billund.indexer.bricklink_indexer import (
-    get_bricklink_index,
-)
-from gray_merchant_of_billund.indexer.brickset_indexer import (
-    get_brickset_index,
+from gray_merchant_of_billund.indexer.expirable_indexer import (
+    Indexes,
+    build_indexes,
+    log_progress,
 )
 from gray_merchant_of_billund.model.bricklink_set import BricklinkIndex
 from gray_merchant_of_billund.model.brickset_set import BricksetIndex
 from gray_merchant_of_billund.model.collection_set import CollectionIndex
 from gray_merchant_of_billund.model.rebrickable_set import RebrickableIndex
 from gray_merchant_of_billund.utils.log import get_logger
-from gray_merchant_of_billund.utils.time import MONTH
+from gray_merchant_of_billund.utils.time import (
+    MONTH,
+    from_iso_str,
+    pretty_str,
+)
 from gray_merchant_of_billund.utils.utils_resources import (
     get_personal_collection,
     get_personal_index,
@@ -22,7 +27,9 @@ from gray_merchant_of_billund.utils.utils_resources import (
 log = get_logger(stdout_level=logging.DEBUG)
 
 
-def collection_stats():
+def collection_stats(
+    as_of: Optional[int] = None, stale_while_revalidate: bool = False
+):
     separator = "-" * 25
 
     my_collection: CollectionIndex = get_personal_collection(
@@ -34,9 +41,20 @@ def collection_stats():
         rebrickable_index,
     )
     cache = MONTH
-    bricklink_index: BricklinkIndex = get_bricklink_index(my_index, cache)
-    # bricklink_index: BricklinkIndex = get_bricklink_index(my_index)
-    brickset_index: BricksetIndex = get_brickset_index(my_index)
+    bricklink_index: BricklinkIndex
+    brickset_index: BricksetIndex
+    # Both websites at once. With stale_while_revalidate, expired sets are
+    # reported as stale, and refreshed in the background meanwhile: the
+    # refreshes not done at exit are left to the next run. With as_of, it's one
+    # snapshot lookup per set, and no requests.
+    indexes: Indexes = build_indexes(
+        my_index,
+        bricklink_time_to_live_ms=cache,
+        as_of=as_of,
+        stale_while_revalidate=stale_while_revalidate,
+        on_item=log_progress(len(my_index)),
+    )
+    bricklink_index, brickset_index = indexes
     correct_brickset_index(brickset_index)
 
     num_gifts: int = len([s for s in my_collection if s.gift])
@@ -307,6 +325,15 @@ def collection_stats():
             print(f"{lego_set.num}: {lego_set.name} ({lego_set.year})")
     print(separator)
 
+    if indexes.stale_sets:
+        print(f"Stale sets, being refreshed ({len(indexes.stale_sets)}):")
+        for stale_set in indexes.stale_sets:
+            print(
+                f"{type(stale_set).__name__} {stale_set.store_key}: "
+                f"{pretty_str(stale_set.creation_date_ms)}"
+            )
+        print(separator)
+
     # print(f"Missing € RRP:")
     # for lego_set in brickset_index:
     #     if lego_set.rrp_eur is None:
@@ -320,5 +347,26 @@ def correct_brickset_index(brickset_index: BricksetIndex):
             brickset_index[free_set].rrp_raw = "£0 / $0 / 0€"
 
 
+def main():
+    parser = argparse.ArgumentParser(
+        description="Print statistics about the personal collection."
+    )
+    parser.add_argument(
+        "--as-of",
+        type=from_iso_str,
+        help="a past date (e.g. 2021-03-01): use the data stored back then",
+    )
+    parser.add_argument(
+        "--stale-while-revalidate",
+        action="store_true",
+        help="report expired data right away, marked as stale, and "
+        "refresh it in the background meanwhile",
+    )
+    args = parser.parse_args()
+    if args.as_of is not None and args.stale_while_revalidate:
+        parser.error("--as-of never fetches: nothing to revalidate")
+    collection_stats(args.as_of, args.stale_while_revalidate)
+
+
 if __name__ == "__main__":
-    collection_stats()
+    main()
@@ -0,0 +1,79 @@
+import argparse
+from typing import List, Sequence, Type
+
+from gray_merchant_of_billund.model.bricklink_set import BricklinkSet
+from gray_merchant_of_billund.model.brickset_set import BricksetSet
+from gray_merchant_of_billund.storage.backend import (
+    TieredBackend,
+    get_backend,
+)
+from gray_merchant_of_billund.storage.blobs import blob_store
+from gray_merchant_of_billund.storage.compaction import (
+    DEFAULT_RETENTION_POLICY,
+    CompactionStats,
+    RetentionTier,
+    compact,
+    sweep_blobs,
+)
+from gray_merchant_of_billund.storage.expirable import Expirable
+from gray_merchant_of_billund.utils.log import get_logger
+from gray_merchant_of_billund.utils.time import DAY
+
+log = get_logger()
+
+EXPIRABLE_CLASSES: Sequence[Type[Expirable]] = (BricklinkSet, BricksetSet)
+
+
+def retention_tier(tier: str) -> RetentionTier:
+    # <min age days>:<interval days>, e.g. 30:7
+    min_age_days, interval_days = tier.split(":")
+    return RetentionTier(
+        int(float(min_age_days) * DAY), int(float(interval_days) * DAY)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Downsample old Expirable snapshots, keeping the sales "
+        "data of the dropped ones, then delete the blobs they alone shared."
+    )
+    parser.add_argument(
+        "--tier",
+        type=retention_tier,
+        action="append",
+        help="MIN_AGE_DAYS:INTERVAL_DAYS, can be repeated "
+        "(default: 30:7 and 180:30)",
+    )
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    policy: Sequence[RetentionTier] = args.tier or DEFAULT_RETENTION_POLICY
+    backend = get_backend()
+    for cls in EXPIRABLE_CLASSES:
+        if isinstance(backend, TieredBackend) and not args.dry_run:
+            # keys not saved lately still have old snapshots in the hot tier
+            demoted: int = backend.demote_all(cls)
+            log.info(f"Moved {demoted} {cls.__name__} items to cold tier.")
+        store_keys: List[str] = backend.store_keys(cls)
+        log.info(f"Compacting {len(store_keys)} {cls.__name__} items...")
+        total = CompactionStats(0, 0, 0)
+        for store_key in store_keys:
+            stats: CompactionStats = compact(
+                cls, store_key, policy, dry_run=args.dry_run
+            )
+            total = CompactionStats(*map(sum, zip(total, stats)))
+        log.info(
+            f"{'Would compact' if args.dry_run else 'Compacted'} "
+            f"{cls.__name__}: {total.dropped} snapshots dropped, merged into "
+            f"{total.merged}; {total.kept} left as they were."
+        )
+    if not args.dry_run:
+        blob_store.pack()
+    swept: int = sweep_blobs(EXPIRABLE_CLASSES, dry_run=args.dry_run)
+    log.info(
+        f"{'Would delete' if args.dry_run else 'Deleted'} {swept} "
+        f"unreferenced blobs."
+    )
+
+
+if __name__ == "__main__":
+    main()
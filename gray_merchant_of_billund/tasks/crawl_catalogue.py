@@ -0,0 +1,50 @@
+import argparse
+from typing import Optional
+
+from gray_merchant_of_billund.indexer.crawler import CRAWL_SOURCES, crawl
+from gray_merchant_of_billund.storage.crawl_queue import CrawlQueue
+from gray_merchant_of_billund.utils.log import get_logger
+from gray_merchant_of_billund.utils.time import DAY
+from gray_merchant_of_billund.utils.utils_resources import (
+    get_rebrickable_index,
+)
+
+log = get_logger()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Crawl a website for every set of the Rebrickable "
+        "catalogue. Interrupted crawls resume where they stopped."
+    )
+    parser.add_argument("source", choices=sorted(CRAWL_SOURCES))
+    parser.add_argument(
+        "--ttl-days",
+        type=float,
+        help="also fetch sets stored longer ago, crawled before or not "
+        "(default: only missing sets)",
+    )
+    parser.add_argument(
+        "--retry-failed",
+        action="store_true",
+        help="retry the sets given up on by previous crawls",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="forget the progress of previous crawls",
+    )
+    args = parser.parse_args()
+    time_to_live_ms: Optional[int] = (
+        int(args.ttl_days * DAY) if args.ttl_days is not None else None
+    )
+    with CrawlQueue(args.source) as queue:
+        if args.restart:
+            queue.clear()
+        if args.retry_failed:
+            log.info(f"Retrying {queue.retry_failed()} failed sets.")
+        crawl(args.source, get_rebrickable_index(), time_to_live_ms, queue)
+
+
+if __name__ == "__main__":
+    main()
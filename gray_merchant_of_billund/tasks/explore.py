@@ -1,9 +1,7 @@
 from gray_merchant_of_billund.constants.gmob import RESOURCES_DIR
-from gray_merchant_of_billund.indexer.bricklink_indexer import (
-    get_bricklink_index,
-)
-from gray_merchant_of_billund.indexer.brickset_indexer import (
-    get_brickset_index,
+from gray_merchant_of_billund.indexer.expirable_indexer import (
+    build_indexes,
+    log_progress,
 )
 from gray_merchant_of_billund.model.bricklink_set import BricklinkIndex
 from gray_merchant_of_billund.model.brickset_set import BricksetIndex
@@ -55,7 +53,11 @@ def explore():
         print(f"{top_set.num}: {top_set.name}: {top_set.num_parts} parts")
     print(separator)
 
-    bricklink_index: BricklinkIndex = get_bricklink_index(my_index)
+    bricklink_index: BricklinkIndex
+    brickset_index: BricksetIndex
+    bricklink_index, brickset_index = build_indexes(
+        my_index, on_item=log_progress(len(my_index))
+    )
     print(bricklink_index)
     print(separator)
 
@@ -69,7 +71,6 @@ def explore():
         print(f"{top_set.num}: {top_set.name}: {top_set.on_wanted} wanted")
     print(separator)
 
-    brickset_index: BricksetIndex = get_brickset_index(my_index)
     print(brickset_index)
     print(separator)
 
@@ -111,7 +112,6 @@ def explore():
         print(f"{lego_set.num}: {lego_set.name}: {lego_set.year}")
     print(separator)
 
-    bricklink_index: BricklinkIndex = get_bricklink_index(my_index)
     for lego_set in bricklink_index:
         print(f"{lego_set.num}: {lego_set.name}: {lego_set.link_bricklink}")
     print(separator)
@@ -0,0 +1,107 @@
+import argparse
+import os
+from typing import Dict, List, Optional, Sequence, Type
+
+from gray_merchant_of_billund.model.bricklink_set import BricklinkSet
+from gray_merchant_of_billund.model.brickset_set import BricksetSet
+from gray_merchant_of_billund.storage.backend import (
+    BACKENDS,
+    ExpirableBackend,
+    PickleTreeBackend,
+    ShardedPickleTreeBackend,
+)
+from gray_merchant_of_billund.storage.expirable import Expirable
+from gray_merchant_of_billund.utils.log import get_logger
+
+log = get_logger()
+
+EXPIRABLE_CLASSES: Sequence[Type[Expirable]] = (BricklinkSet, BricksetSet)
+
+
+def migrate(
+    source: ExpirableBackend,
+    destination: ExpirableBackend,
+    classes: Sequence[Type[Expirable]] = EXPIRABLE_CLASSES,
+) -> int:
+    migrated: int = 0
+    for cls in classes:
+        store_keys = source.store_keys(cls)
+        log.info(f"Migrating {len(store_keys)} {cls.__name__} items...")
+        for store_key in store_keys:
+            # oldest first, so that the last write is the latest snapshot
+            for creation_date_ms in source.creation_dates(cls, store_key):
+                data = source.read(cls, store_key, creation_date_ms)
+                if data is None:
+                    continue
+                destination.write(cls, store_key, creation_date_ms, data)
+                migrated += 1
+    log.info(f"Migrated {migrated} snapshots.")
+    return migrated
+
+
+def shard_in_place(
+    classes: Sequence[Type[Expirable]] = EXPIRABLE_CLASSES,
+    root: Optional[str] = None,
+) -> int:
+    # Moves pickle tree snapshots to the sharded layout with renames, so
+    # nothing is copied. Can be interrupted and run again; indexers should
+    # not run meanwhile, as they would write to the old layout.
+    source = PickleTreeBackend(root)
+    destination = ShardedPickleTreeBackend(root)
+    migrated: int = 0
+    for cls in classes:
+        store_keys: List[str] = source.store_keys(cls)
+        log.info(f"Sharding {len(store_keys)} {cls.__name__} items...")
+        for store_key in store_keys:
+            snapshot_paths: Dict[int, str] = source.snapshot_paths(
+                cls, store_key
+            )
+            if not snapshot_paths:
+                continue  # a shard, or an emptied store key
+            for creation_date_ms, store_path in snapshot_paths.items():
+                sharded_path: str = destination.snapshot_path(
+                    cls, store_key, creation_date_ms
+                )
+                os.makedirs(os.path.dirname(sharded_path), exist_ok=True)
+                os.rename(store_path, sharded_path)
+                migrated += 1
+            latest: str = destination.latest_path(cls, store_key)
+            latest_ms: int = destination.creation_dates(cls, store_key)[-1]
+            tmp_latest: str = f"{latest}.{os.getpid()}.tmp"
+            os.symlink(
+                destination.snapshot_path(cls, store_key, latest_ms),
+                tmp_latest,
+            )
+            os.replace(tmp_latest, latest)
+            try:
+                os.remove(source.latest_path(cls, store_key))
+            except FileNotFoundError:
+                pass
+            try:
+                os.rmdir(source.key_dir(cls, store_key))
+            except OSError as exc:
+                log.warning(f"Could not clean up {store_key}: {exc}")
+    log.info(f"Sharded {migrated} snapshots.")
+    return migrated
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Copy every Expirable snapshot between storage backends."
+    )
+    parser.add_argument("--source", choices=BACKENDS, default="pickle")
+    parser.add_argument("--destination", choices=BACKENDS, default="sqlite")
+    parser.add_argument(
+        "--in-place",
+        action="store_true",
+        help="move snapshots from the pickle to the sharded layout",
+    )
+    args = parser.parse_args()
+    if args.in_place:
+        shard_in_place()
+        return
+    migrate(BACKENDS[args.source](), BACKENDS[args.destination]())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import argparse
+import threading
+from functools import partial
+from typing import Callable, List
+
+from gray_merchant_of_billund.constants.gmob import (
+    REFRESHER_REQUESTS_PER_HOUR,
+)
+from gray_merchant_of_billund.indexer.expirable_indexer import (
+    BricklinkIndexer,
+    BricksetIndexer,
+)
+from gray_merchant_of_billund.indexer.refresh_scheduler import (
+    RefreshScheduler,
+)
+from gray_merchant_of_billund.indexer.refresher import (
+    RefreshTarget,
+    refresh_expiring,
+    run_refreshers,
+)
+from gray_merchant_of_billund.model.collection_set import CollectionIndex
+from gray_merchant_of_billund.model.rebrickable_set import RebrickableIndex
+from gray_merchant_of_billund.utils.time import DAY
+from gray_merchant_of_billund.utils.utils_resources import (
+    get_personal_collection,
+    get_personal_index,
+    get_rebrickable_index,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Keep the personal collection data warm: refresh it in "
+        "the background before it expires."
+    )
+    parser.add_argument(
+        "--bricklink-ttl-days",
+        type=float,
+        default=30,
+        help="the TTL used by the reports (default: 30)",
+    )
+    parser.add_argument(
+        "--brickset-ttl-days",
+        type=float,
+        help="the TTL used by the reports (default: never refresh)",
+    )
+    parser.add_argument(
+        "--horizon-days",
+        type=float,
+        default=3,
+        help="refresh items expiring within this time (default: 3)",
+    )
+    parser.add_argument(
+        "--volatility-aware",
+        action="store_true",
+        help="refresh each Bricklink set at its own pace, judging by how "
+        "much its prices and lots for sale changed between its snapshots, "
+        "the most volatile and valuable ones first",
+    )
+    parser.add_argument(
+        "--requests-per-hour",
+        type=int,
+        default=REFRESHER_REQUESTS_PER_HOUR,
+        help="per website (default: %(default)s)",
+    )
+    args = parser.parse_args()
+    my_collection: CollectionIndex = get_personal_collection()
+    my_index: RebrickableIndex = get_personal_index(
+        my_collection,
+        get_rebrickable_index(),
+    )
+    horizon_ms: int = int(args.horizon_days * DAY)
+    targets: List[RefreshTarget] = []
+    refreshers: List[Callable[[threading.Event], None]] = []
+    if args.volatility_aware:
+        refreshers.append(
+            partial(RefreshScheduler(my_index).run, args.requests_per_hour)
+        )
+    else:
+        targets.append(
+            RefreshTarget(BricklinkIndexer, int(args.bricklink_ttl_days * DAY))
+        )
+    if args.brickset_ttl_days is not None:
+        targets.append(
+            RefreshTarget(BricksetIndexer, int(args.brickset_ttl_days * DAY))
+        )
+    for target in targets:
+        refreshers.append(
+            partial(
+                refresh_expiring,
+                target,
+                my_index,
+                horizon_ms,
+                args.requests_per_hour,
+            )
+        )
+    run_refreshers(refreshers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import argparse
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Optional
+
+from gray_merchant_of_billund.indexer.reparser import REPARSE_SOURCES, reparse
+from gray_merchant_of_billund.model.rebrickable_set import (
+    RebrickableIndex,
+    RebrickableSet,
+)
+from gray_merchant_of_billund.tasks.build_price_history import (
+    rebuild_price_history,
+)
+from gray_merchant_of_billund.utils.log import get_logger
+from gray_merchant_of_billund.utils.utils_resources import (
+    get_rebrickable_index,
+)
+
+log = get_logger()
+
+
+def _reparse(source_name: str, lego_set: RebrickableSet) -> Optional[bool]:
+    # a parser bug on a page shouldn't stop the others
+    try:
+        return reparse(source_name, lego_set)
+    except Exception:
+        log.exception(f"Unable to reparse {source_name} {lego_set.num}.")
+        return None
+
+
+def reparse_all(
+    source_name: str, index: RebrickableIndex, workers: int
+) -> Counter:
+    # the parent process opens no database: workers open their own ones
+    started: float = time.monotonic()
+    with ProcessPoolExecutor(workers) as executor:
+        results: Counter = Counter(
+            executor.map(partial(_reparse, source_name), index, chunksize=16)
+        )
+    elapsed_s: float = max(time.monotonic() - started, 1e-3)
+    log.info(
+        f"Reparsed {results[True]} {source_name} sets in {elapsed_s:.1f} s "
+        f"({results[True] / elapsed_s:.1f} sets/s): {results[False]} not "
+        f"cached, {results[None]} failed."
+    )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Rebuild the stored sets from the cached pages, without "
+        "any request: e.g. after fixing a parser."
+    )
+    parser.add_argument("source", choices=sorted(REPARSE_SOURCES))
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="parsing processes (default: one per CPU)",
+    )
+    args = parser.parse_args()
+    results: Counter = reparse_all(
+        args.source, get_rebrickable_index(), args.workers
+    )
+    if args.source == "bricklink" and results[True]:
+        rebuild_price_history()
+
+
+if __name__ == "__main__":
+    main()
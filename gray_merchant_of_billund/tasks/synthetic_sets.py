@@ -0,0 +1,147 @@
+import calendar
+import random
+from datetime import datetime
+from typing import List, Optional
+
+from gray_merchant_of_billund.model.base_set import BaseSet
+from gray_merchant_of_billund.model.bricklink_price import (
+    BricklinkAggregatePrices,
+    BricklinkAggregateSelling,
+    BricklinkAggregateSellingCurrent,
+    BricklinkAggregateSold,
+    BricklinkAggregateSoldMonth,
+    BricklinkMarketEntry,
+    PriceGuide,
+)
+from gray_merchant_of_billund.model.bricklink_set import BricklinkSet
+from gray_merchant_of_billund.model.rebrickable_set import RebrickableSet
+
+# Fake, but realistically shaped, data for storage benchmarks.
+
+CURRENCY = "EUR"
+
+
+def synthetic_rebrickable_set(num: int) -> RebrickableSet:
+    return RebrickableSet(
+        BaseSet(f"{num}-1", f"Synthetic Set {num}", str(1980 + num % 40)),
+        str(num % 700),
+        50 + num % 3000,
+    )
+
+
+def synthetic_bricklink_set(
+    rebrickable_set: RebrickableSet,
+    creation_date_ms: int,
+    rng: Optional[random.Random] = None,
+) -> BricklinkSet:
+    rng = rng or random.Random(rebrickable_set.num)
+    base_price: float = 5 + rebrickable_set.num_parts / 10
+    price_guide = _synthetic_price_guide(base_price, creation_date_ms, rng)
+    return BricklinkSet(
+        rebrickable_set,
+        rng.randint(0, 500),
+        rng.randint(0, 2000),
+        price_guide,
+        price_guide,
+        creation_date_ms,
+    )
+
+
+def _synthetic_price_guide(
+    base_price: float, creation_date_ms: int, rng: random.Random
+) -> PriceGuide:
+    return PriceGuide(
+        _synthetic_sold(base_price, rng),
+        _synthetic_sold(base_price / 2, rng),
+        _synthetic_selling(base_price, rng),
+        _synthetic_selling(base_price / 2, rng),
+        _synthetic_sold_months(base_price, creation_date_ms, rng),
+        _synthetic_sold_months(base_price / 2, creation_date_ms, rng),
+        _synthetic_selling_current(base_price, creation_date_ms, rng),
+        _synthetic_selling_current(base_price / 2, creation_date_ms, rng),
+    )
+
+
+def _synthetic_prices(
+    base_price: float, rng: random.Random
+) -> BricklinkAggregatePrices:
+    min_price: float = round(base_price * rng.uniform(0.5, 0.9), 2)
+    max_price: float = round(base_price * rng.uniform(1.1, 2.5), 2)
+    avg_price: float = round((min_price + max_price) / 2, 2)
+    return BricklinkAggregatePrices(
+        rng.randint(1, 200),
+        min_price,
+        avg_price,
+        round(avg_price * rng.uniform(0.9, 1.1), 2),
+        max_price,
+        CURRENCY,
+    )
+
+
+def _synthetic_sold(
+    base_price: float, rng: random.Random
+) -> BricklinkAggregateSold:
+    return BricklinkAggregateSold(
+        _synthetic_prices(base_price, rng), rng.randint(1, 100)
+    )
+
+
+def _synthetic_selling(
+    base_price: float, rng: random.Random
+) -> BricklinkAggregateSelling:
+    return BricklinkAggregateSelling(
+        _synthetic_prices(base_price, rng), rng.randint(1, 100)
+    )
+
+
+def _synthetic_entries(
+    base_price: float, rng: random.Random, n: int
+) -> List[BricklinkMarketEntry]:
+    return [
+        BricklinkMarketEntry(
+            rng.randint(1, 3),
+            round(base_price * rng.uniform(0.5, 2.5), 2),
+            CURRENCY,
+        )
+        for _ in range(n)
+    ]
+
+
+def _synthetic_sold_months(
+    base_price: float, creation_date_ms: int, rng: random.Random
+) -> List[BricklinkAggregateSoldMonth]:
+    # the last 6 months, like the Bricklink price guide page; past months
+    # only depend on the set and the month, so consecutive snapshots share
+    # them exactly as real ones do
+    creation_date = datetime.fromtimestamp(creation_date_ms / 1000.0)
+    months: List[BricklinkAggregateSoldMonth] = []
+    for offset in range(6):
+        month_index: int = creation_date.year * 12 + creation_date.month - 1
+        month_index -= offset
+        year, month = divmod(month_index, 12)
+        month_rng = (
+            rng
+            if offset == 0
+            else random.Random(f"{base_price}-{year}-{month}")
+        )
+        months.append(
+            BricklinkAggregateSoldMonth(
+                _synthetic_sold(base_price, month_rng),
+                calendar.month_name[month + 1],
+                str(year),
+                _synthetic_entries(
+                    base_price, month_rng, month_rng.randint(1, 20)
+                ),
+            )
+        )
+    return months
+
+
+def _synthetic_selling_current(
+    base_price: float, creation_date_ms: int, rng: random.Random
+) -> BricklinkAggregateSellingCurrent:
+    return BricklinkAggregateSellingCurrent(
+        _synthetic_selling(base_price, rng),
+        creation_date_ms,
+        _synthetic_entries(base_price, rng, rng.randint(5, 40)),
+    )
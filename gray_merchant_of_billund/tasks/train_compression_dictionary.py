@@ -0,0 +1,52 @@
+import argparse
+from typing import List, Optional
+
+from gray_merchant_of_billund.constants.gmob import SNAPSHOT_COMPRESSION
+from gray_merchant_of_billund.model.bricklink_set import BricklinkSet
+from gray_merchant_of_billund.storage.backend import get_backend
+from gray_merchant_of_billund.storage.serializer import (
+    CODECS,
+    available_codec,
+    raw_samples,
+    save_dictionary,
+    train_dictionary,
+)
+from gray_merchant_of_billund.utils.log import get_logger
+
+log = get_logger()
+
+
+def train(codec: str, max_samples: int) -> int:
+    backend = get_backend()
+    samples: List[bytes] = []
+    for store_key in backend.store_keys(BricklinkSet):
+        data: Optional[bytes] = backend.read_latest(BricklinkSet, store_key)
+        if data is not None:
+            samples.append(data)
+        if len(samples) >= max_samples:
+            break
+    log.info(f"Training {codec} dictionary on {len(samples)} snapshots...")
+    return save_dictionary(train_dictionary(codec, raw_samples(samples)))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Train the snapshot compression dictionary on the "
+        "stored BricklinkSet snapshots."
+    )
+    parser.add_argument(
+        "--codec",
+        choices=CODECS,
+        default=available_codec(SNAPSHOT_COMPRESSION or "zstd"),
+        help="default: the snapshot codec, zstd if none (zlib without "
+        "zstandard)",
+    )
+    parser.add_argument("--samples", type=int, default=2000)
+    args = parser.parse_args()
+    if available_codec(args.codec) != args.codec:
+        parser.error(f"{args.codec} needs zstandard: pip install .[zstd]")
+    train(args.codec, args.samples)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,6 @@
-import calendar
 import math
 import os
-from collections import defaultdict
 from datetime import date
-from typing import List
 
 import matplotlib
 import matplotlib.dates as mdates
@@ -16,11 +13,15 @@ from gray_merchant_of_billund.indexer.brickset_indexer import (
     get_brickset_index,
 )
 from gray_merchant_of_billund.model.base_set import BaseSet
-from gray_merchant_of_billund.model.bricklink_set import BricklinkSet
 from gray_merchant_of_billund.model.brickset_set import BricksetIndex
 from gray_merchant_of_billund.model.collection_set import CollectionIndex
 from gray_merchant_of_billund.model.rebrickable_set import RebrickableIndex
-from gray_merchant_of_billund.storage.expirable import load_all
+from gray_merchant_of_billund.storage.price_history import (
+    NEW,
+    USED,
+    PriceHistory,
+    read_price_history,
+)
 from gray_merchant_of_billund.utils.utils_resources import (
     get_personal_collection,
     get_personal_index,
@@ -28,65 +29,19 @@ from gray_merchant_of_billund.utils.utils_resources import (
 )
 
 
-def get_aggregate_sold_monthly_recap(set_num, dates, years):
-    base_set = BaseSet(set_num, "UNKNOWN_NAME", "UNKNOWN_YEAR")
-    bricklink_sets: List[BricklinkSet] = load_all(BricklinkSet, base_set.num)
-    if len(bricklink_sets) < 1:
+def get_aggregate_sold_monthly_recap(
+    base_set: BaseSet, dates, years, price_history: PriceHistory
+):
+    prices_used = price_history.monthly_qty_avg_price(base_set.num, USED)
+    prices_new = price_history.monthly_qty_avg_price(base_set.num, NEW)
+    if not prices_used and not prices_new:
         raise ValueError(f"No data for set {base_set.num}")
-    base_set.name = bricklink_sets[0].name
-    base_set.year = bricklink_sets[0].year
-    aggregate_sold_month_by_year_month_used = defaultdict(
-        lambda: defaultdict(list)
-    )
-    aggregate_sold_month_by_year_month_new = defaultdict(
-        lambda: defaultdict(list)
-    )
-    for set_snapshot in bricklink_sets:
-        if set_snapshot.price_guide.details_last_6_months_used:
-            # not sure how/why it's possible, but it's possible: deal with it
-            for asm in set_snapshot.price_guide.details_last_6_months_used:
-                aggregate_sold_month_by_year_month_used[asm.year][
-                    asm.month
-                ].append(asm)
-        if set_snapshot.price_guide.details_last_6_months_new:
-            # not sure how/why it's possible, but it's possible: deal with it
-            for asm in set_snapshot.price_guide.details_last_6_months_new:
-                aggregate_sold_month_by_year_month_new[asm.year][
-                    asm.month
-                ].append(asm)
-
-    month_names = list(calendar.month_name)[1:]
-    best_aggregate_sold_month_by_year_month_used = defaultdict(
-        lambda: defaultdict(list)
-    )
-    best_aggregate_sold_month_by_year_month_new = defaultdict(
-        lambda: defaultdict(list)
-    )
     values_used = []
     values_new = []
     for year in years:
-        year = str(year)
-        for month in month_names:
-            asms_used = aggregate_sold_month_by_year_month_used[year][month]
-            asms_new = aggregate_sold_month_by_year_month_new[year][month]
-            best_aggregate_sold_month_by_year_month_used[year][month] = []
-            best_aggregate_sold_month_by_year_month_new[year][month] = []
-            value = None
-            if len(asms_used) > 0:
-                best_asm = max(asms_used, key=lambda x: x.times_sold)
-                best_aggregate_sold_month_by_year_month_used[year][
-                    month
-                ] = best_asm
-                value = best_asm.qty_avg_price
-            values_used.append(value)
-            value = None
-            if len(asms_new) > 0:
-                best_asm = max(asms_new, key=lambda x: x.times_sold)
-                best_aggregate_sold_month_by_year_month_new[year][
-                    month
-                ] = best_asm
-                value = best_asm.qty_avg_price
-            values_new.append(value)
+        for month in range(1, 13):
+            values_used.append(prices_used.get((year, month)))
+            values_new.append(prices_new.get((year, month)))
 
     df = pd.DataFrame(
         {
@@ -96,7 +51,7 @@ def get_aggregate_sold_monthly_recap(set_num, dates, years):
     )
     df = df.set_index(dates)
     # print(df)
-    return base_set, df
+    return df
 
 
 def plot_asms(
@@ -176,6 +131,7 @@ def main():
     )
     start_year = current_year - 5  # only plot latest 10 years
     brickset_index: BricksetIndex = get_brickset_index(my_index)
+    price_history: PriceHistory = read_price_history()
     for s in my_collection:
         dates = pd.date_range(
             start=f"{start_year}-01-01",
@@ -185,7 +141,11 @@ def main():
         years = range(start_year, current_year + 1)
         my_set = s
         s = my_set.num
-        base_set, df = get_aggregate_sold_monthly_recap(s, dates, years)
+        named_set = my_index[s] if s in my_index else my_set
+        base_set = BaseSet(s, named_set.name, named_set.year)
+        df = get_aggregate_sold_monthly_recap(
+            base_set, dates, years, price_history
+        )
         _, month, year = my_set.acquired_date.split("/")
         try:
             rounded_date = [
@@ -0,0 +1,52 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, NamedTuple, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class _Call(NamedTuple):
+    future: Future
+    done_at: Optional[float]  # time.monotonic(), None while in flight
+
+
+class SingleFlight:
+    # Calls with the same key share a single call: concurrent ones wait for
+    # the one in flight, later ones get its result until window_s after it
+    # returned. Errors are shared by concurrent calls only. Thread-safe.
+    def __init__(self, window_s: float):
+        self.window_s: float = window_s
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        with self._lock:
+            self._evict()
+            call: Optional[_Call] = self._calls.get(key)
+            owner: bool = call is None
+            if call is None:
+                call = _Call(Future(), None)
+                self._calls[key] = call
+        if not owner:
+            return call.future.result()
+        try:
+            result: T = fn()
+        except BaseException as exc:
+            with self._lock:
+                del self._calls[key]
+            call.future.set_exception(exc)
+            raise
+        with self._lock:
+            self._calls[key] = call._replace(done_at=time.monotonic())
+        call.future.set_result(result)
+        return result
+
+    def _evict(self) -> None:
+        deadline: float = time.monotonic() - self.window_s
+        for key in [
+            key
+            for key, call in self._calls.items()
+            if call.done_at is not None and call.done_at <= deadline
+        ]:
+            del self._calls[key]
@@ -16,6 +16,11 @@ def now() -> int:
     return int(round(time.time() * 1000))
 
 
+def from_iso_str(date_str: str) -> int:
+    # e.g. 2021-03-01, or 2021-03-01T12:00, in local time
+    return int(round(datetime.fromisoformat(date_str).timestamp() * 1000))
+
+
 def pretty_str(now_ms: int, date_format=DEFAULT_DATE_FORMAT) -> str:
     now_dt = datetime.fromtimestamp(now_ms / 1000.0)
     return now_dt.strftime(date_format)
@@ -0,0 +1,186 @@
+import asyncio
+import time
+from functools import partial
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from requests import ConnectionError, HTTPError, RequestException
+
+from gray_merchant_of_billund.constants.gmob import (
+    ASYNC_BACKOFF_MAX,
+    ASYNC_FETCH_MAX_ATTEMPTS,
+    HTTP_POOL_MAXSIZE,
+    HTTP_POOL_SIZES,
+)
+from gray_merchant_of_billund.storage.response_cache import (
+    RawResponse,
+    response_cache,
+)
+from gray_merchant_of_billund.utils.log import get_logger
+from gray_merchant_of_billund.utils.time import now
+from gray_merchant_of_billund.utils.utils_request import get_shared_session
+
+try:
+    import httpx  # type: ignore
+except ImportError:  # optional (the httpx extra): requests on threads
+    httpx = None
+
+log = get_logger()
+
+TRANSPORT_ERRORS: Tuple[type, ...] = (RequestException,) + (
+    (httpx.TransportError,) if httpx is not None else ()
+)
+MIN_BACKOFF = 1  # s
+
+
+class HostThrottle:
+    # At most concurrency requests at a time to a host, and a pause shared
+    # by all of them: doubled by each 429 or 5xx response (or as long as
+    # its Retry-After), halved by each success.
+    def __init__(self, concurrency: int):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.backoff_s: float = 0
+        self.resume_at: float = 0  # time.monotonic()
+
+    async def wait(self) -> None:
+        delay_s: float = self.resume_at - time.monotonic()
+        while delay_s > 0:
+            await asyncio.sleep(delay_s)
+            delay_s = self.resume_at - time.monotonic()
+
+    def throttled(self, retry_after_s: Optional[float] = None) -> None:
+        self.backoff_s = min(
+            max(2 * self.backoff_s, MIN_BACKOFF), ASYNC_BACKOFF_MAX
+        )
+        self.resume_at = max(
+            self.resume_at,
+            time.monotonic() + max(self.backoff_s, retry_after_s or 0),
+        )
+
+    def succeeded(self) -> None:
+        self.backoff_s /= 2
+
+
+class AsyncFetcher:
+    # GETs pages concurrently, through httpx if installed. Use it as an
+    # async context manager.
+    def __init__(self, timeout=(3 * 20, 120)):
+        self.timeout = timeout  # (connection_timeout, read_timeout)
+        self.throttles: Dict[str, HostThrottle] = {}
+        self.client = None
+
+    async def __aenter__(self) -> "AsyncFetcher":
+        if httpx is not None:
+            self.client = httpx.AsyncClient(
+                timeout=httpx.Timeout(
+                    self.timeout[1], connect=self.timeout[0]
+                ),
+                limits=httpx.Limits(
+                    max_keepalive_connections=max(HTTP_POOL_SIZES.values())
+                ),
+                follow_redirects=True,
+            )
+        return self
+
+    async def __aexit__(self, *_) -> None:
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def throttle(self, url: str) -> HostThrottle:
+        host: str = urlsplit(url).netloc
+        if host not in self.throttles:
+            concurrency: int = next(
+                (
+                    pool_size
+                    for prefix, pool_size in HTTP_POOL_SIZES.items()
+                    if url.startswith(prefix)
+                ),
+                HTTP_POOL_MAXSIZE,
+            )
+            self.throttles[host] = HostThrottle(concurrency)
+        return self.throttles[host]
+
+    async def get(
+        self,
+        url: str,
+        headers: Dict[str, str],
+        cache_if: Optional[Callable[[bytes], bool]] = None,
+    ) -> RawResponse:
+        # Like execute_http_request: raises ConnectionError once out of
+        # attempts, and HTTPError on other 4xx responses. The response
+        # cache too, with cache_if.
+        loop = asyncio.get_running_loop()
+        cached: Optional[RawResponse] = (
+            await loop.run_in_executor(None, response_cache.get, url)
+            if cache_if is not None
+            else None
+        )
+        if cached is not None:
+            headers = {**headers, **cached.conditional_headers()}
+        throttle: HostThrottle = self.throttle(url)
+        error: str = ""
+        for _ in range(ASYNC_FETCH_MAX_ATTEMPTS):
+            await throttle.wait()
+            async with throttle.semaphore:
+                fetched_ms: int = now()
+                try:
+                    status, response_headers, content = await self._get(
+                        url, headers
+                    )
+                except TRANSPORT_ERRORS as exc:
+                    error = f"{type(exc).__name__}: {exc}"
+                    throttle.throttled()
+                    continue
+            if status == 429 or status >= 500:
+                error = f"HTTP {status}"
+                log.debug(f"{error} from {url}. Backing off...")
+                throttle.throttled(
+                    _retry_after_s(response_headers.get("retry-after"))
+                )
+                continue
+            if status >= 400:
+                raise HTTPError(f"HTTP {status} from {url}")
+            throttle.succeeded()
+            if cached is not None and status == 304:
+                return await loop.run_in_executor(
+                    None, response_cache.revalidated, cached, fetched_ms
+                )
+            response = RawResponse(
+                url, status, response_headers, content, fetched_ms
+            )
+            if cache_if is not None and cache_if(content):
+                await loop.run_in_executor(
+                    None, response_cache.store, response
+                )
+            return response
+        raise ConnectionError(f"Giving up on {url} ({error}).")
+
+    async def _get(
+        self, url: str, headers: Dict[str, str]
+    ) -> Tuple[int, Dict[str, str], bytes]:
+        if self.client is not None:
+            response = await self.client.get(url, headers=headers)
+        else:
+            response = await asyncio.get_running_loop().run_in_executor(
+                None,
+                partial(
+                    get_shared_session().get,
+                    url,
+                    headers=headers,
+                    timeout=self.timeout,
+                ),
+            )
+        return (
+            response.status_code,
+            {name.lower(): value for name, value in response.headers.items()},
+            response.content,
+        )
+
+
+def _retry_after_s(retry_after: Optional[str]) -> Optional[float]:
+    # only the delay-seconds form
+    try:
+        return float(retry_after) if retry_after is not None else None
+    except ValueError:
+        return None
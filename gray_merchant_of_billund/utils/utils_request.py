@@ -1,12 +1,23 @@
-from functools import wraps
+import threading
+import time
+from functools import partial, wraps
+from typing import Callable, Dict, Optional
 
 from requests import ConnectionError, Session
+from requests.adapters import HTTPAdapter
 from retrying import retry  # type: ignore
 from stem import Signal
 from stem.control import Controller
+from urllib3.util.retry import Retry
 
 from gray_merchant_of_billund.constants.gmob import (
     BRICKLINK_LOGIN_ENDPOINT,
+    HTTP_COALESCING_WINDOW,
+    HTTP_CONNECT_RETRIES,
+    HTTP_POOL_MAXSIZE,
+    HTTP_POOL_SIZES,
+    HTTP_RATE_LIMITS,
+    HTTP_RATE_RECOVERY,
     TOR_CONTROLLER_PORT,
 )
 from gray_merchant_of_billund.model.exception import BricklinkLoginException
@@ -15,6 +26,91 @@ from gray_merchant_of_billund.secrets import (
     BRICKLINK_USERNAME,
     TOR_PASSWORD,
 )
+from gray_merchant_of_billund.storage.response_cache import (
+    RawResponse,
+    response_cache,
+)
+from gray_merchant_of_billund.utils.log import get_logger
+from gray_merchant_of_billund.utils.single_flight import SingleFlight
+from gray_merchant_of_billund.utils.time import now
+
+log = get_logger()
+
+
+class TokenBucket:
+    # Up to burst requests right away, then rate requests per second. Each
+    # penalty (e.g. a soft-ban) halves the rate, down to min_rate, and each
+    # success brings back HTTP_RATE_RECOVERY of the full rate. Shared by
+    # the threads of a process.
+    def __init__(self, rate: float, burst: float, min_rate: float):
+        self.max_rate: float = rate
+        self.rate: float = rate
+        self.burst: float = burst
+        self.min_rate: float = min_rate
+        self.tokens: float = burst
+        self.updated: float = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        current: float = time.monotonic()
+        self.tokens = min(
+            self.tokens + (current - self.updated) * self.rate, self.burst
+        )
+        self.updated = current
+
+    def acquire(self) -> float:
+        # blocks until a request may be made, returns the time waited (s)
+        waited: float = 0
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait: float = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def penalize(self) -> None:
+        with self._lock:
+            self._refill()
+            self.rate = max(self.rate / 2, self.min_rate)
+            # no burst after a penalty: the next request waits 1 / rate
+            self.tokens = min(self.tokens, 0)
+
+    def reward(self) -> None:
+        with self._lock:
+            self._refill()
+            self.rate = min(
+                self.rate + HTTP_RATE_RECOVERY * self.max_rate, self.max_rate
+            )
+
+
+rate_limiters: Dict[str, TokenBucket] = {
+    prefix: TokenBucket(*limits) for prefix, limits in HTTP_RATE_LIMITS.items()
+}
+
+
+def get_rate_limiter(url: str) -> Optional[TokenBucket]:
+    return next(
+        (
+            limiter
+            for prefix, limiter in rate_limiters.items()
+            if url.startswith(prefix)
+        ),
+        None,
+    )
+
+
+def penalize_host(url: str) -> None:
+    # e.g. on a soft-ban, which comes as a successful response
+    limiter: Optional[TokenBucket] = get_rate_limiter(url)
+    if limiter is not None:
+        limiter.penalize()
+        log.warning(
+            f"Slowing down to {limiter.rate * 60:.2f} requests/min "
+            f"for {url}..."
+        )
 
 
 def _retry_on_connection_error(exc):
@@ -40,22 +136,146 @@ def _http_request_retry(http_request):
 
 
 @_http_request_retry
-def execute_http_request(request_fn, url, timeout=(3 * 20, 120), headers={}):
-    # Assumes the request_fn is from requests module.
+def execute_http_request(
+    request_fn,
+    url,
+    timeout=(3 * 20, 120),
+    headers={},
+    cache_if: Optional[Callable[[bytes], bool]] = None,
+) -> RawResponse:
+    # Assumes the request_fn is from requests module, or a Session method
+    # (e.g. get_shared_session().get).
     # Timeout is a tuple (connection_timeout, read_timeout).
     # Further details here:
     # https://3.python-requests.org/user/quickstart/#timeouts
     # Caller should catch ConnectionError and HTTPError, or more broadly
     # requests.exceptions.RequestException
+    # Hosts in HTTP_RATE_LIMITS are rate limited, every attempt included.
+    # Returns a RawResponse. With cache_if, the ones whose content passes
+    # cache_if (e.g. not a soft-ban page) go to the response cache, and the
+    # next requests of url revalidate them. Only those, and revalidations,
+    # speed a rate limited host back up: a soft-ban comes as a 200.
+    cached: Optional[RawResponse] = (
+        response_cache.get(url) if cache_if is not None else None
+    )
+    if cached is not None:
+        headers = {**headers, **cached.conditional_headers()}
+    limiter: Optional[TokenBucket] = get_rate_limiter(url)
+    if limiter is not None:
+        limiter.acquire()
+    fetched_ms: int = now()
     response = request_fn(url, timeout=timeout, headers=headers)
+    if limiter is not None and response.status_code == 429:
+        penalize_host(url)
+    if cached is not None and response.status_code == 304:
+        if limiter is not None:
+            limiter.reward()
+        return response_cache.revalidated(cached, fetched_ms)
     response.raise_for_status()
-    return response
+    raw_response = RawResponse(
+        url,
+        response.status_code,
+        {name.lower(): value for name, value in response.headers.items()},
+        response.content,
+        fetched_ms,
+    )
+    if cache_if is not None and cache_if(raw_response.content):
+        if limiter is not None:
+            limiter.reward()
+        response_cache.store(raw_response)
+    return raw_response
+
+
+http_requests = SingleFlight(HTTP_COALESCING_WINDOW)
+
+
+def execute_coalesced_http_request(
+    request_fn,
+    url,
+    timeout=(3 * 20, 120),
+    headers={},
+    cache_if: Optional[Callable[[bytes], bool]] = None,
+) -> RawResponse:
+    # execute_http_request, for GETs only: the same requests of url (same
+    # headers and cache_if) within HTTP_COALESCING_WINDOW share the
+    # response of a single one
+    return http_requests.do(
+        (url, tuple(sorted(headers.items())), cache_if),
+        partial(
+            execute_http_request, request_fn, url, timeout, headers, cache_if
+        ),
+    )
 
 
 def get_unathenticated_session():
     return Session()
 
 
+# the connection pools, shared by the sessions of all threads
+_shared_adapters: Optional[Dict[str, HTTPAdapter]] = None
+_shared_adapters_lock = threading.Lock()
+# (the shared adapters it mounts, the session) of each thread
+_thread_sessions = threading.local()
+
+
+def _pooled_adapter(pool_maxsize: int) -> HTTPAdapter:
+    # Failed connections are retried right away a couple of times: what
+    # still fails raises ConnectionError, for _http_request_retry. Nothing
+    # else is retried here, not to multiply its retries.
+    return HTTPAdapter(
+        pool_maxsize=pool_maxsize,
+        max_retries=Retry(
+            total=HTTP_CONNECT_RETRIES,
+            read=False,
+            status=False,
+            redirect=False,
+            backoff_factor=0.1,
+        ),
+    )
+
+
+def get_shared_adapters() -> Dict[str, HTTPAdapter]:
+    # mount prefix -> adapter, with connection pools sized per host
+    global _shared_adapters
+    with _shared_adapters_lock:
+        if _shared_adapters is None:
+            adapter = _pooled_adapter(HTTP_POOL_MAXSIZE)
+            adapters: Dict[str, HTTPAdapter] = {
+                "http://": adapter,
+                "https://": adapter,
+            }
+            for prefix, pool_maxsize in HTTP_POOL_SIZES.items():
+                adapters[prefix] = _pooled_adapter(pool_maxsize)
+            _shared_adapters = adapters
+        return _shared_adapters
+
+
+def get_shared_session() -> Session:
+    # A session per thread, all of them mounting the same adapters: each
+    # page after the first one of a host skips the TCP and TLS handshakes,
+    # whichever thread fetches it. The urllib3 connection pools are
+    # thread-safe, while a Session and its cookie jar are not: cookies are
+    # never shared between threads.
+    adapters: Dict[str, HTTPAdapter] = get_shared_adapters()
+    mounted, session = getattr(_thread_sessions, "session", (None, None))
+    if mounted is not adapters:
+        session = Session()
+        for prefix, adapter in adapters.items():
+            session.mount(prefix, adapter)
+        _thread_sessions.session = adapters, session
+    return session
+
+
+def close_shared_session() -> None:
+    # closes the connection pools: every thread then gets a new session
+    global _shared_adapters
+    with _shared_adapters_lock:
+        if _shared_adapters is not None:
+            for adapter in set(_shared_adapters.values()):
+                adapter.close()
+            _shared_adapters = None
+
+
 def get_bricklink_authenticated_session():
     headers = {
         "user-agent": "Mozilla/5.0 (X11; Linux x86_64) "
@@ -1,4 +1,6 @@
+import glob
 import gzip
+import os
 from typing import List, Optional, Sequence
 
 from gray_merchant_of_billund.constants.gmob import (
@@ -16,6 +18,7 @@ from gray_merchant_of_billund.model.rebrickable_set import (
     RebrickableIndex,
     RebrickableSet,
 )
+from gray_merchant_of_billund.storage.segment import segment_path
 from gray_merchant_of_billund.utils.log import get_logger
 
 log = get_logger()
@@ -100,6 +103,28 @@ def get_personal_collection(
 
 def get_rebrickable_index(
     rebrickable_sets_csv_file: str = REBRICKABLE_SETS_CSV_FILE,
+) -> RebrickableIndex:
+    # the CSV file is parsed once per version of it, then loaded from a
+    # segment named after it
+    stat = os.stat(rebrickable_sets_csv_file)
+    prefix: str = os.path.basename(rebrickable_sets_csv_file).split(".")[0]
+    name: str = f"{prefix}-{stat.st_mtime_ns}-{stat.st_size}"
+    rebrickable_index: Optional[RebrickableIndex] = RebrickableIndex.load(name)
+    if rebrickable_index is not None:
+        return rebrickable_index
+    rebrickable_index = read_rebrickable_index(rebrickable_sets_csv_file)
+    rebrickable_index.save(name)
+    log.debug(f"Saved Rebrickable index {name}.")
+    for path in glob.glob(
+        segment_path(RebrickableSet.store_dir(), f"{prefix}-*")
+    ):
+        if path != segment_path(RebrickableSet.store_dir(), name):
+            os.remove(path)
+    return rebrickable_index
+
+
+def read_rebrickable_index(
+    rebrickable_sets_csv_file: str = REBRICKABLE_SETS_CSV_FILE,
 ) -> RebrickableIndex:
     with gzip.open(rebrickable_sets_csv_file, "rb") as f:
         file_content = f.read().decode("utf-8")
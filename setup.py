@@ -51,6 +51,8 @@ setup(
     install_requires=read_requirements('requirements.txt'),
     extras_require={
         "dev": read_requirements('requirements-dev.txt'),
+        "zstd": ['zstandard'],
+        "httpx": ['httpx'],
     },
     include_package_data=True,
     package_data={